@@ -7,17 +7,14 @@ import os
 import sys
 import logging
 import argparse
-import random
-import string
-import datetime
 from pathlib import Path
-import uuid
 
 # Add parent directory to sys.path
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(parent_dir)
 
-from src.dicom.dicom_modifier import modify_dicom_tags, build_dicom_modifier, cleanup_temp_files
+from src.dicom.dicom_modifier import modify_dicom_tags, modify_dicom_files, build_dicom_modifier
+from src.dicom.anonymize import anonymization_tags
 from src.utils.dcm4che_validator import validate_dcm4che_setup
 
 def setup_logging():
@@ -33,26 +30,6 @@ def validate_setup():
     print(report)
     return is_valid
 
-def generate_random_id(length=8):
-    """Generate a random ID with specified length"""
-    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=length))
-
-def generate_random_name():
-    """Generate a random patient name in DICOM format (LAST^FIRST)"""
-    last_names = ["SMITH", "JONES", "WILLIAMS", "BROWN", "TAYLOR", "ANONYMOUS", "TEST", "DOE"]
-    first_names = ["JOHN", "JANE", "MICHAEL", "ROBERT", "SARAH", "MARY", "JAMES", "TEST"]
-    
-    last = random.choice(last_names)
-    first = random.choice(first_names)
-    return f"{last}^{first}"
-
-def generate_random_date():
-    """Generate a random date in YYYYMMDD format within the past 5 years"""
-    today = datetime.date.today()
-    random_days = random.randint(0, 365 * 5)  # Up to 5 years in the past
-    random_date = today - datetime.timedelta(days=random_days)
-    return random_date.strftime("%Y%m%d")
-
 def anonymize_dicom(input_file, output_file=None, randomize=False):
     """
     Anonymize a DICOM file
@@ -77,29 +54,7 @@ def anonymize_dicom(input_file, output_file=None, randomize=False):
         output_file = os.path.join(dir_path, f"{base_name}_anonymized{ext}")
     
     # Define anonymization tags
-    dicom_tags = {}
-    
-    if randomize:
-        # Use random values
-        dicom_tags["00100010"] = generate_random_name()
-        dicom_tags["00100020"] = generate_random_id()
-        dicom_tags["00100030"] = generate_random_date()
-        dicom_tags["00100040"] = random.choice(["M", "F", "O"])
-        dicom_tags["00081030"] = f"ANONYMOUS STUDY {generate_random_id(4)}"
-        # Generate a new SOP Instance UID
-        dicom_tags["00080018"] = f"1.2.826.0.1.3680043.8.498.{uuid.uuid4().int % 10000000}.{uuid.uuid4().int % 10000000}.{uuid.uuid4().int % 10000000}"
-    else:
-        # Use fixed values
-        dicom_tags["00100010"] = "ANONYMOUS^PATIENT"
-        dicom_tags["00100020"] = "ANONYMOUS"
-        dicom_tags["00100030"] = ""  # Remove birth date
-        dicom_tags["00100040"] = "O"  # Other
-        dicom_tags["00081030"] = "ANONYMOUS STUDY"
-    
-    # Additional tags to remove/anonymize
-    dicom_tags["00081070"] = ""  # Operator's Name
-    dicom_tags["00081090"] = ""  # Manufacturer's Model Name
-    dicom_tags["00080090"] = "ANONYMOUS^DOCTOR"  # Referring Physician
+    dicom_tags = anonymization_tags(randomize)
     
     print(f"Anonymizing DICOM file: {input_file}")
     print(f"Output file: {output_file}")
@@ -107,23 +62,13 @@ def anonymize_dicom(input_file, output_file=None, randomize=False):
     for tag, value in dicom_tags.items():
         print(f"  {tag}: {value}")
     
-    # Create a temporary modified file
-    temp_file = modify_dicom_tags(input_file, dicom_tags)
-    
-    if not temp_file:
+    # Write straight to the output file, so the pixel data is copied once
+    if not modify_dicom_tags(input_file, dicom_tags, output_file=output_file):
         print("Failed to modify DICOM tags.")
         return None
     
-    # Move the temporary file to the desired output location
-    try:
-        import shutil
-        shutil.copy2(temp_file, output_file)
-        cleanup_temp_files(temp_file)
-        print(f"Anonymized file saved to: {output_file}")
-        return output_file
-    except Exception as e:
-        print(f"Error copying temporary file: {str(e)}")
-        return temp_file
+    print(f"Anonymized file saved to: {output_file}")
+    return output_file
     
 def anonymize_folder(input_folder, output_folder=None, randomize=False):
     """
@@ -163,26 +108,26 @@ def anonymize_folder(input_folder, output_folder=None, randomize=False):
     
     print(f"Found {len(dicom_files)} DICOM files.")
     
-    # Anonymize each file
-    success_count = 0
-    for i, file_path in enumerate(dicom_files, 1):
-        try:
-            # Generate output path
-            rel_path = os.path.relpath(file_path, input_folder)
-            output_path = os.path.join(output_folder, rel_path)
-            
-            # Create output directory if needed
+    def jobs():
+        for file_path in dicom_files:
+            # Mirror the folder structure in the output folder
+            output_path = os.path.join(output_folder, os.path.relpath(file_path, input_folder))
             os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            
-            print(f"[{i}/{len(dicom_files)}] Processing: {rel_path}")
-            
-            # Anonymize the file
-            anonymized_file = anonymize_dicom(file_path, output_path, randomize)
-            
-            if anonymized_file:
-                success_count += 1
-        except Exception as e:
-            print(f"Error processing {file_path}: {str(e)}")
+            yield file_path, output_path, anonymization_tags(randomize)
+    
+    completed = [0]
+    
+    def report(file_path, result):
+        completed[0] += 1
+        rel_path = os.path.relpath(file_path, input_folder)
+        if result["success"]:
+            print(f"[{completed[0]}/{len(dicom_files)}] Anonymized: {rel_path}")
+        else:
+            print(f"[{completed[0]}/{len(dicom_files)}] Error processing {rel_path}: {result['error']}")
+    
+    # Files are written straight to the output folder, in this process or by one DicomModifier JVM
+    results = modify_dicom_files(jobs(), on_result=report)
+    success_count = sum(1 for result in results.values() if result["success"])
     
     print(f"Anonymization complete. {success_count}/{len(dicom_files)} files processed successfully.")
     return success_count
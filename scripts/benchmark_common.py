@@ -0,0 +1,123 @@
+"""
+Corpus generation and reporting shared by the benchmark scripts
+"""
+import os
+import sys
+import json
+import random
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+CT_IMAGE_STORAGE = "1.2.840.10008.5.1.4.1.1.2"
+INSTANCES_PER_STUDY = 50
+
+def generate_corpus(directory, count, rows, seed=1):
+    """
+    Write a reproducible corpus of 16 bit CT images, INSTANCES_PER_STUDY per study.
+
+    The same count, rows and seed always give the same UIDs and pixel data, and an
+    existing corpus with the expected number of files is reused.
+
+    Returns:
+        list: Paths of the generated files
+    """
+    from pydicom.dataset import Dataset, FileMetaDataset
+    from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+
+    paths = [os.path.join(directory, f"img{index:06d}.dcm") for index in range(count)]
+    if all(os.path.exists(path) for path in paths):
+        return paths
+    os.makedirs(directory, exist_ok=True)
+
+    rng = random.Random(seed)
+    for index, path in enumerate(paths):
+        study = index // INSTANCES_PER_STUDY
+        ds = Dataset()
+        ds.file_meta = FileMetaDataset()
+        ds.file_meta.MediaStorageSOPClassUID = CT_IMAGE_STORAGE
+        ds.file_meta.MediaStorageSOPInstanceUID = generate_uid(entropy_srcs=[str(seed), "instance", str(index)])
+        ds.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+        ds.SOPClassUID = CT_IMAGE_STORAGE
+        ds.SOPInstanceUID = ds.file_meta.MediaStorageSOPInstanceUID
+        ds.StudyInstanceUID = generate_uid(entropy_srcs=[str(seed), "study", str(study)])
+        ds.SeriesInstanceUID = generate_uid(entropy_srcs=[str(seed), "series", str(study)])
+        ds.PatientID = f"BENCH{study:04d}"
+        ds.PatientName = f"BENCHMARK^{study:04d}"
+        ds.Modality = "CT"
+        ds.InstanceNumber = index % INSTANCES_PER_STUDY + 1
+        ds.Rows = rows
+        ds.Columns = rows
+        ds.SamplesPerPixel = 1
+        ds.PhotometricInterpretation = "MONOCHROME2"
+        ds.BitsAllocated = 16
+        ds.BitsStored = 12
+        ds.HighBit = 11
+        ds.PixelRepresentation = 0
+        ds.PixelData = rng.randbytes(rows * rows * 2)
+        ds.save_as(path, enforce_file_format=True)
+    return paths
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def latency_summary(values):
+    """Percentiles of a list of latencies in milliseconds, or None if there are none"""
+    if not values:
+        return None
+    return {
+        "p50": round(_percentile(values, 0.5), 1),
+        "p95": round(_percentile(values, 0.95), 1),
+        "p99": round(_percentile(values, 0.99), 1),
+        "max": round(max(values), 1)
+    }
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of its waited-for children (the JVMs), in MB"""
+    if resource is None:
+        return None, None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    unit = 1024 * 1024 if sys.platform == "darwin" else 1024
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(self_rss / unit, 1), round(children_rss / unit, 1)
+
+def median_run(runs):
+    """The run with the median wall-clock time"""
+    ordered = sorted(runs, key=lambda run: run["throughput"]["seconds"])
+    return ordered[len(ordered) // 2]
+
+def compare_with_baseline(report, baseline_path):
+    """Print the change in instances/s and p95 latency of each path against an earlier report"""
+    with open(baseline_path, "r") as f:
+        baseline = {entry["path"]: entry for entry in json.load(f)["results"] if "throughput" in entry}
+    print(f"\nCompared with {baseline_path}:")
+    print(f"{'Path':<24} {'inst/s before':>14} {'inst/s now':>11} {'change':>8} {'p95 before':>11} {'p95 now':>9}")
+    for entry in report["results"]:
+        before = baseline.get(entry["path"])
+        if not before or "throughput" not in entry:
+            continue
+        old, new = before["throughput"]["instances_per_s"] or 0, entry["throughput"]["instances_per_s"] or 0
+        change = f"{100 * (new - old) / old:+.1f}%" if old else "n/a"
+        old_p95 = (before.get("latency_ms") or {}).get("p95")
+        new_p95 = (entry.get("latency_ms") or {}).get("p95")
+        print(f"{entry['path']:<24} {old:>14.1f} {new:>11.1f} {change:>8} {str(old_p95):>11} {str(new_p95):>9}")
+
+def print_path_result(entry):
+    """Print the measurements of one send path"""
+    latency = entry["latency_ms"] or {}
+    print(f"{entry['path']}: {entry['succeeded']}/{entry['files']} sent, "
+          f"{entry['throughput']['instances_per_s']} instances/s, {entry['throughput']['mb_per_s']} MB/s, "
+          f"p50/p95/p99 {latency.get('p50')}/{latency.get('p95')}/{latency.get('p99')} ms, "
+          f"peak RSS {entry['peak_rss_mb']} MB (children {entry['peak_child_rss_mb']} MB)")
+    for error in entry["errors"]:
+        print(f"  error: {error}")
+
+def write_report(report, path):
+    """Write a report as JSON"""
+    with open(path, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"\nReport written to {path}")
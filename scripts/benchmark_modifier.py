@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+
+"""
+Benchmark of the Java and Python tag modifier backends on the edits the GUI makes before sending
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+
+# Add parent directory to sys.path
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from pydicom.uid import generate_uid
+
+from src.dicom.jvm import get_java_version
+from src.dicom.dicom_modifier import modify_dicom_tags, cleanup_temp_files
+from src.utils.file_helpers import find_dicom_files_in_folder
+from scripts.benchmark_common import generate_corpus, latency_summary
+
+BACKENDS = ["java", "python"]
+
+def setup_logging(verbose=False):
+    """Set up logging configuration"""
+    logging.basicConfig(
+        level=logging.INFO if verbose else logging.WARNING,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+def gui_edits():
+    """The edit set the GUI builds when patient details and new UIDs are requested"""
+    return {
+        "00100020": "BENCHMARK_ID",
+        "00100010": "BENCHMARK^MODIFIER",
+        "0020000D": generate_uid(),
+        "0020000E": generate_uid(),
+        "00080018": generate_uid()
+    }
+
+def pixel_data_offset(file_path):
+    """Offset of the pixel data element, where the bytes that must pass through unchanged start"""
+    import pydicom
+
+    with open(file_path, "rb") as f:
+        pydicom.dcmread(f, stop_before_pixels=True)
+        return f.tell()
+
+def same_tail(input_file, output_file):
+    """Check that the pixel data and what follows it are identical in both files"""
+    input_offset, output_offset = pixel_data_offset(input_file), pixel_data_offset(output_file)
+    if os.path.getsize(input_file) - input_offset != os.path.getsize(output_file) - output_offset:
+        return False
+    with open(input_file, "rb") as a, open(output_file, "rb") as b:
+        a.seek(input_offset)
+        b.seek(output_offset)
+        while True:
+            chunk = a.read(1024 * 1024)
+            if chunk != b.read(1024 * 1024):
+                return False
+            if not chunk:
+                return True
+
+def check_output(input_file, output_file, dicom_tags):
+    """
+    Verify a modified file: the edited values are set and the pixel data is untouched.
+
+    Returns:
+        str: Description of the first problem found, or "" if the file is correct
+    """
+    import pydicom
+
+    ds = pydicom.dcmread(output_file, stop_before_pixels=True)
+    for tag_name, tag_value in dicom_tags.items():
+        element = ds.get(int(tag_name, 16))
+        if element is None or str(element.value) != tag_value:
+            return f"{tag_name} is {element.value if element is not None else 'missing'}, expected {tag_value}"
+    if not same_tail(input_file, output_file):
+        return "pixel data differs from the input"
+    return ""
+
+def run_backend(backend, file_paths, verify):
+    """
+    Modify every file with one backend, one call per file as the send paths do.
+
+    Returns:
+        dict: Measurements of the run
+    """
+    latencies = []
+    errors = []
+    start = time.perf_counter()
+    for file_path in file_paths:
+        dicom_tags = gui_edits()
+        call_start = time.perf_counter()
+        output = modify_dicom_tags(file_path, dicom_tags, backend=backend)
+        latencies.append((time.perf_counter() - call_start) * 1000)
+        if not output:
+            errors.append(f"{file_path}: modification failed")
+            continue
+        if verify:
+            problem = check_output(file_path, output, dicom_tags)
+            if problem:
+                errors.append(f"{file_path}: {problem}")
+        cleanup_temp_files(output)
+    seconds = time.perf_counter() - start
+    return {
+        "backend": backend,
+        "files": len(file_paths),
+        "failed": len(errors),
+        "seconds": round(seconds, 3),
+        "files_per_s": round(len(file_paths) / seconds, 1) if seconds else None,
+        "latency_ms": latency_summary(latencies),
+        "errors": errors[:5]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Java and Python tag modifier backends")
+    parser.add_argument("--folder", help="Folder of DICOM files to modify (default: generate a corpus)")
+    parser.add_argument("--count", type=int, default=50, help="Files in the generated corpus (default: 50)")
+    parser.add_argument("--rows", type=int, default=512, help="Rows and columns of the generated images (default: 512)")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS, help="Backends to run (default: both)")
+    parser.add_argument("--no-verify", action="store_true", help="Do not check the modified files")
+    parser.add_argument("--json", help="Write the report to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show log output")
+
+    args = parser.parse_args()
+
+    setup_logging(args.verbose)
+
+    if args.folder:
+        file_paths = sorted(find_dicom_files_in_folder(args.folder))
+    else:
+        corpus_dir = os.path.join(tempfile.gettempdir(), f"send_benchmark_{args.count}x{args.rows}")
+        print(f"Preparing {args.count} files of {args.rows}x{args.rows} in {corpus_dir}...")
+        file_paths = generate_corpus(corpus_dir, args.count, args.rows)
+    if not file_paths:
+        print("Error: No DICOM files found")
+        return 1
+
+    java_major, java_version = get_java_version()
+    report = {"java": java_version or None, "files": len(file_paths), "results": []}
+    for backend in args.backends:
+        if backend == "java" and java_major == 0:
+            report["results"].append({"backend": backend, "skipped": "java was not found on the PATH"})
+            print(f"{backend}: skipped, java was not found on the PATH")
+            continue
+        entry = run_backend(backend, file_paths, not args.no_verify)
+        report["results"].append(entry)
+        latency = entry["latency_ms"] or {}
+        print(f"{backend}: {entry['files'] - entry['failed']}/{entry['files']} modified, {entry['files_per_s']} files/s, "
+              f"p50/p95/p99 {latency.get('p50')}/{latency.get('p95')}/{latency.get('p99')} ms")
+        for error in entry["errors"]:
+            print(f"  error: {error}")
+
+    measured = {entry["backend"]: entry for entry in report["results"] if "seconds" in entry}
+    if len(measured) == 2 and measured["python"]["seconds"]:
+        print(f"\nPython backend is {measured['java']['seconds'] / measured['python']['seconds']:.1f}x "
+              f"as fast as DicomModifier on these edits")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=4)
+    return 1 if any(entry.get("failed") for entry in report["results"]) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
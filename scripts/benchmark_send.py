@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+
+"""
+Loopback throughput benchmark of every send path against a local stand-in SCP
+"""
+import os
+import sys
+import json
+import time
+import logging
+import platform
+import argparse
+import tempfile
+import subprocess
+
+# Add parent directory to sys.path
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from src import __version__
+from src.dicom.storescu_output import throughput, store_result_from_output
+from src.dicom.jvm import get_java_version
+from src.utils.file_helpers import find_dicom_files_in_folder
+from src.utils.local_scp import start_storescp, start_python_scp, stop_storescp
+from scripts.benchmark_common import (
+    generate_corpus, latency_summary, peak_rss_mb, median_run, compare_with_baseline, print_path_result, write_report
+)
+
+# Send paths and whether they need Java
+SEND_PATHS = {
+    "dcm4che": True,
+    "dcm4che_alt": True,
+    "dcm4che_batch": True,
+    "multiple_dcm4che": True,
+    "multiple_dcm4che_alt": True,
+    "multiple_dcm4che_batch": True,
+    "storescu_batches": True,
+    "concurrent_dcm4che": True,
+    "daemon": True,
+    "native": False,
+    "concurrent_native": False,
+    "streaming_native": False
+}
+
+# Paths that send one file per call; their latency is the wall time of the call
+SINGLE_FILE_PATHS = ("dcm4che", "dcm4che_alt", "dcm4che_batch")
+
+def setup_logging(verbose=False):
+    """Set up logging configuration"""
+    logging.basicConfig(
+        level=logging.INFO if verbose else logging.WARNING,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+def send_with_path(path, file_paths, host, port, ae_title, batch_size, associations):
+    """
+    Send the files with one send path.
+
+    Returns:
+        tuple: (results by file, list of per-file latencies in ms or None to use transfer_ms)
+    """
+    if path in SINGLE_FILE_PATHS:
+        from src.dicom import dcm4che
+        send = {
+            "dcm4che": dcm4che.send_dicom_using_dcm4che,
+            "dcm4che_alt": dcm4che.send_dicom_using_dcm4che_alt,
+            "dcm4che_batch": dcm4che.send_dicom_using_dcm4che_batch
+        }[path]
+        results = {}
+        latencies = []
+        for file_path in file_paths:
+            start = time.perf_counter()
+            result = send(file_path, host, port, ae_title)
+            latencies.append((time.perf_counter() - start) * 1000)
+            results[file_path] = store_result_from_output(file_path, result.stdout, result.stderr, result.returncode)
+        return results, latencies
+
+    if path == "multiple_dcm4che":
+        from src.dicom.dcm4che import send_multiple_dicom_using_dcm4che
+        return send_multiple_dicom_using_dcm4che(file_paths, host, port, ae_title), None
+    if path == "multiple_dcm4che_alt":
+        from src.dicom.dcm4che import send_multiple_dicom_using_dcm4che_alt
+        return send_multiple_dicom_using_dcm4che_alt(file_paths, host, port, ae_title), None
+    if path == "multiple_dcm4che_batch":
+        from src.dicom.dcm4che import send_multiple_dicom_using_dcm4che_batch
+        return send_multiple_dicom_using_dcm4che_batch(file_paths, host, port, ae_title), None
+    if path == "storescu_batches":
+        from src.dicom.storescu_batch import send_multiple_dicom_in_batches
+        return send_multiple_dicom_in_batches(file_paths, host, port, ae_title, batch_size=batch_size), None
+    if path == "daemon":
+        from src.dicom.send_daemon_pool import send_multiple_dicom_using_daemon
+        return send_multiple_dicom_using_daemon(file_paths, host, port, ae_title, batch_size=batch_size), None
+    if path == "native":
+        from src.dicom.native.sender import send_multiple_dicom_native
+        return send_multiple_dicom_native(file_paths, host, port, ae_title, batch_size=batch_size), None
+    if path in ("concurrent_dcm4che", "concurrent_native"):
+        from src.dicom.concurrent_send import send_multiple_dicom_concurrently
+        return send_multiple_dicom_concurrently(
+            file_paths, host, port, ae_title, batch_size=batch_size,
+            max_associations=associations, backend=path.split("_")[1]
+        ), None
+    if path == "streaming_native":
+        from src.dicom.result_stream import iter_send_results
+        records = iter_send_results(file_paths, host, port, ae_title, batch_size=batch_size,
+                                    max_associations=associations, backend="native")
+        return {record["file"]: record for record in records}, None
+    raise ValueError(f"Unknown send path: {path}")
+
+def run_path(path, file_paths, host, port, ae_title, batch_size, associations):
+    """
+    Benchmark one send path in this process.
+
+    Returns:
+        dict: Measurements of the run
+    """
+    start = time.perf_counter()
+    results, latencies = send_with_path(path, file_paths, host, port, ae_title, batch_size, associations)
+    seconds = time.perf_counter() - start
+
+    succeeded = [(file_path, result) for file_path, result in results.items() if result.get("success")]
+    sent_bytes = sum(result.get("bytes") or os.path.getsize(file_path) for file_path, result in succeeded)
+    latency_source = "call"
+    if latencies is None:
+        latencies = [result["transfer_ms"] for _, result in succeeded if result.get("transfer_ms") is not None]
+        latency_source = "transfer_ms"
+    self_rss, children_rss = peak_rss_mb()
+    errors = sorted({result.get("error", "") for result in results.values() if not result.get("success")})
+    return {
+        "path": path,
+        "files": len(file_paths),
+        "succeeded": len(succeeded),
+        "failed": len(results) - len(succeeded),
+        "throughput": throughput(len(succeeded), sent_bytes, seconds),
+        "latency_ms": latency_summary(latencies),
+        "latency_source": latency_source,
+        "peak_rss_mb": self_rss,
+        "peak_child_rss_mb": children_rss,
+        "errors": errors[:5]
+    }
+
+def run_path_in_subprocess(path, args, corpus_dir, port):
+    """Run one path in a fresh interpreter so that its peak RSS is not mixed with other paths"""
+    cmd = [sys.executable, os.path.abspath(__file__), "--run-path", path, "--folder", corpus_dir,
+           "--ip", "127.0.0.1", "--port", str(port), "--ae-title", args.ae_title,
+           "--batch-size", str(args.batch_size), "--associations", str(args.associations)]
+    completed = subprocess.run(cmd, capture_output=True, text=True, timeout=args.timeout)
+    lines = completed.stdout.strip().splitlines()
+    if completed.returncode != 0 or not lines:
+        return {"path": path, "error": (completed.stderr or completed.stdout).strip()[-2000:]}
+    return json.loads(lines[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every send path against a local loopback SCP")
+    parser.add_argument("--folder", help="Folder of DICOM files to send (default: generate a corpus)")
+    parser.add_argument("--count", type=int, default=200, help="Files in the generated corpus (default: 200)")
+    parser.add_argument("--rows", type=int, default=512, help="Rows and columns of the generated images (default: 512)")
+    parser.add_argument("--corpus-dir", help="Where to keep the generated corpus (default: the temp directory)")
+    parser.add_argument("--scp", choices=["python", "dcm4che"], default="python",
+                        help="Local SCP to start: the Python loopback SCP that discards data, or dcm4che storescp (default: python)")
+    parser.add_argument("--ip", help="Send to this server instead of starting a local SCP")
+    parser.add_argument("--port", type=int, default=11199, help="SCP port (default: 11199)")
+    parser.add_argument("--ae-title", default="STORESCP", help="SCP AE Title (default: STORESCP)")
+    parser.add_argument("--paths", nargs="+", choices=list(SEND_PATHS), help="Send paths to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per path; the median run is reported (default: 1)")
+    parser.add_argument("--batch-size", type=int, default=100, help="Files per association (default: 100)")
+    parser.add_argument("--associations", type=int, default=4, help="Parallel associations for the concurrent paths (default: 4)")
+    parser.add_argument("--timeout", type=int, default=3600, help="Seconds allowed per run (default: 3600)")
+    parser.add_argument("--json", default="send_benchmark.json", help="Write the report to this file (default: send_benchmark.json)")
+    parser.add_argument("--baseline", help="Earlier report to compare against")
+    parser.add_argument("--run-path", choices=list(SEND_PATHS), help=argparse.SUPPRESS)
+    parser.add_argument("--verbose", action="store_true", help="Show log output")
+
+    args = parser.parse_args()
+
+    setup_logging(args.verbose)
+
+    if args.run_path:
+        file_paths = sorted(find_dicom_files_in_folder(args.folder))
+        print(json.dumps(run_path(args.run_path, file_paths, args.ip, args.port, args.ae_title,
+                                  args.batch_size, args.associations)))
+        return 0
+
+    if args.folder:
+        corpus_dir = args.folder
+        file_paths = find_dicom_files_in_folder(corpus_dir)
+    else:
+        corpus_dir = args.corpus_dir or os.path.join(tempfile.gettempdir(), f"send_benchmark_{args.count}x{args.rows}")
+        print(f"Preparing {args.count} files of {args.rows}x{args.rows} in {corpus_dir}...")
+        file_paths = generate_corpus(corpus_dir, args.count, args.rows)
+    if not file_paths:
+        print(f"Error: No DICOM files found in {corpus_dir}")
+        return 1
+    corpus_bytes = sum(os.path.getsize(file_path) for file_path in file_paths)
+
+    java_major, java_version = get_java_version()
+    paths = args.paths or list(SEND_PATHS)
+    scp_process = None
+    if not args.ip:
+        if args.scp == "dcm4che" and java_major == 0:
+            print("Error: dcm4che storescp needs java on the PATH")
+            return 1
+        if args.scp == "dcm4che":
+            scp_process = start_storescp(args.port, args.ae_title, tempfile.mkdtemp(prefix="storescp_"))
+        else:
+            scp_process = start_python_scp(args.port, args.ae_title)
+
+    report = {
+        "version": __version__,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "java": java_version or None,
+        "scp": f"{args.ip}:{args.port}" if args.ip else args.scp,
+        "corpus": {"files": len(file_paths), "bytes": corpus_bytes, "folder": corpus_dir},
+        "batch_size": args.batch_size,
+        "associations": args.associations,
+        "results": []
+    }
+    try:
+        for path in paths:
+            if SEND_PATHS[path] and java_major == 0:
+                report["results"].append({"path": path, "skipped": "java was not found on the PATH"})
+                print(f"{path}: skipped, java was not found on the PATH")
+                continue
+            runs = [run_path_in_subprocess(path, args, corpus_dir, args.port) for _ in range(max(1, args.repeat))]
+            failed = [run for run in runs if "throughput" not in run]
+            entry = failed[0] if failed else dict(median_run(runs), runs=len(runs))
+            report["results"].append(entry)
+            if failed:
+                print(f"{path}: failed: {entry['error'][-300:]}")
+                continue
+            print_path_result(entry)
+    finally:
+        if scp_process:
+            stop_storescp(scp_process)
+
+    write_report(report, args.json)
+    if args.baseline:
+        compare_with_baseline(report, args.baseline)
+    return 1 if any("error" in entry or entry.get("failed") for entry in report["results"]) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
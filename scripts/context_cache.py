@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+"""
+Show or clear the cached presentation context negotiation results stored beside config.json
+"""
+import os
+import sys
+import time
+import argparse
+
+# Add parent directory to sys.path
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from src.utils.config import ConfigManager
+
+def show_cache(config_manager, destination=None):
+    """Print the cached results, optionally for a single destination"""
+    cache = config_manager.load_context_cache()
+    print(f"Presentation context cache: {config_manager.get_context_cache_path()}")
+    if destination:
+        cache = {destination: cache.get(destination, {})}
+    if not any(cache.values()):
+        print("The cache is empty.")
+        return
+    now = time.time()
+    for key, sop_classes in cache.items():
+        print(f"\n{key}")
+        for sop_class_uid, transfer_syntaxes in sop_classes.items():
+            for transfer_syntax_uid, entry in transfer_syntaxes.items():
+                age = int(now - entry.get("checked", 0))
+                print(f"  {sop_class_uid} / {transfer_syntax_uid}: {entry['result']} ({age} s ago)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Show or clear the presentation context cache")
+    action_group = parser.add_mutually_exclusive_group(required=True)
+    action_group.add_argument("--show", action="store_true", help="Show cached negotiation results")
+    action_group.add_argument("--clear", action="store_true", help="Clear cached negotiation results")
+    parser.add_argument("--destination", help="Only this destination, as AE@host:port")
+
+    args = parser.parse_args()
+
+    config_manager = ConfigManager()
+    if args.show:
+        show_cache(config_manager, args.destination)
+    else:
+        cleared = config_manager.clear_context_cache(args.destination)
+        print(f"Cleared cached results for {cleared} destination(s).")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+"""
+Probe one or more DICOM destinations with C-ECHO, concurrently and on a schedule
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+
+# Add parent directory to sys.path
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from src.utils.config import ConfigManager
+from src.dicom.backends import SEND_BACKENDS, NATIVE_BACKEND
+from src.dicom.health import (
+    HealthMonitor, LatencyHistory, parse_destination,
+    DEFAULT_HEALTH_CHECK_INTERVAL, DEFAULT_LATENCY_HISTORY_SIZE
+)
+
+def setup_logging():
+    """Set up logging configuration"""
+    logging.basicConfig(
+        level=logging.ERROR,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+def format_ms(value):
+    return "-" if value is None else f"{value:.1f}"
+
+def print_round(results):
+    """Print the results of one probe round"""
+    for result in results:
+        if result["success"]:
+            print(f"{result['destination']:<40} OK    association {format_ms(result['association_ms'])} ms, "
+                  f"echo {format_ms(result['echo_ms'])} ms")
+        else:
+            print(f"{result['destination']:<40} FAIL  {result['error']}")
+
+def print_summary(history):
+    """Print the latency history summary of every destination"""
+    print(f"\n{'Destination':<40} {'State':<9} {'Probes':>6} {'Fail':>5} {'Echo p50':>9} {'Echo p95':>9} {'Assoc p50':>10}")
+    for summary in history.summaries():
+        echo = summary["echo_ms"] or {}
+        association = summary["association_ms"] or {}
+        print(f"{summary['destination']:<40} {summary['state']:<9} {summary['probes']:>6} {summary['failures']:>5} "
+              f"{format_ms(echo.get('p50')):>9} {format_ms(echo.get('p95')):>9} {format_ms(association.get('p50')):>10}")
+
+def main():
+    config_manager = ConfigManager()
+
+    parser = argparse.ArgumentParser(description="Probe DICOM destinations with C-ECHO")
+    parser.add_argument("--dest", action="append", default=[],
+                        help="Destination as AE@host:port, may be repeated (default: health_check_destinations from config)")
+    parser.add_argument("--backend", choices=SEND_BACKENDS, default=NATIVE_BACKEND,
+                        help="Backend used for the echo (default: native)")
+    parser.add_argument("--interval", type=float,
+                        default=config_manager.get_value("health_check_interval", DEFAULT_HEALTH_CHECK_INTERVAL),
+                        help="Seconds between probe rounds (default: health_check_interval from config)")
+    parser.add_argument("--rounds", type=int, default=1, help="Number of probe rounds, 0 to run until interrupted (default: 1)")
+    parser.add_argument("--history", type=int, default=DEFAULT_LATENCY_HISTORY_SIZE,
+                        help=f"Probe results kept per destination (default: {DEFAULT_LATENCY_HISTORY_SIZE})")
+    parser.add_argument("--json", help="Write the latency summary as JSON to this file")
+
+    args = parser.parse_args()
+
+    setup_logging()
+
+    names = args.dest or config_manager.get_value("health_check_destinations", []) or [
+        f"{config_manager.get_value('default_ae_title')}@{config_manager.get_value('default_ip')}:"
+        f"{config_manager.get_value('default_port')}"
+    ]
+    try:
+        destinations = [parse_destination(name) for name in names]
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+
+    monitor = HealthMonitor(destinations, args.backend, args.interval, LatencyHistory(args.history))
+    completed = 0
+    try:
+        while args.rounds == 0 or completed < args.rounds:
+            if completed:
+                monitor.stop_event.wait(args.interval)
+            print_round(monitor.probe_once())
+            completed += 1
+    except KeyboardInterrupt:
+        print("\nInterrupted.")
+
+    print_summary(monitor.history)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(monitor.history.summaries(), f, indent=4)
+
+    return 0 if all(s["state"] != "down" for s in monitor.history.summaries()) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
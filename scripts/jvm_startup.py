@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+"""
+Create class data sharing archives for StoreSCU and DicomModifier and report the JVM startup time they save
+"""
+import os
+import sys
+import json
+import shutil
+import logging
+import argparse
+import tempfile
+
+# Add parent directory to sys.path
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from src.dicom.jvm import (
+    get_java_version, get_cds_dir, measure_startup, run_java, clear_archives, MIN_DYNAMIC_CDS_VERSION
+)
+from src.dicom.storescu_batch import get_storescu_classpath
+from src.dicom.dicom_modifier import get_dicom_modifier_classpath
+from src.dicom.health import parse_destination
+
+def setup_logging():
+    """Set up logging configuration"""
+    logging.basicConfig(
+        level=logging.WARNING,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+def tool_commands(destination, sample_file, output_dir):
+    """
+    Build a representative command for each tool.
+
+    StoreSCU runs a C-ECHO against the destination; DicomModifier rewrites one tag of
+    the sample file. Tools that cannot be run (no sample file, modifier not built) are left out.
+    """
+    host, port, ae_title = destination
+    commands = {
+        "storescu": ["java", "-cp", get_storescu_classpath(), "org.dcm4che3.tool.storescu.StoreSCU",
+                     "-b", "DICOM_SENDER", "-c", f"{ae_title}@{host}:{port}"]
+    }
+    classpath = get_dicom_modifier_classpath()
+    if sample_file and classpath:
+        commands["dicom-modifier"] = ["java", "-cp", classpath, "DicomModifier", sample_file,
+                                      os.path.join(output_dir, "modified.dcm"), "00100020=CDS_TRAINING"]
+    return commands
+
+def main():
+    parser = argparse.ArgumentParser(description="Speed up dcm4che JVM startup with class data sharing")
+    action_group = parser.add_mutually_exclusive_group(required=True)
+    action_group.add_argument("--generate", action="store_true", help="Create the archives with one training run per tool")
+    action_group.add_argument("--report", action="store_true", help="Measure the startup time saved per tool")
+    action_group.add_argument("--clear", action="store_true", help="Delete the archives")
+    parser.add_argument("--dest", default="STORESCP@127.0.0.1:11112",
+                        help="Destination StoreSCU echoes during training and measurement (default: STORESCP@127.0.0.1:11112)")
+    parser.add_argument("--file", help="Sample DICOM file for DicomModifier (without it DicomModifier is skipped)")
+    parser.add_argument("--runs", type=int, default=5, help="Launches per variant when reporting (default: 5)")
+    parser.add_argument("--json", help="Write the report as JSON to this file")
+
+    args = parser.parse_args()
+
+    setup_logging()
+
+    if args.clear:
+        print(f"Removed {clear_archives()} archive(s) from {get_cds_dir()}")
+        return 0
+
+    major, version = get_java_version()
+    if major == 0:
+        print("Error: java was not found on the PATH")
+        return 1
+    print(f"Java {version}; archives in {get_cds_dir()}")
+    if major < MIN_DYNAMIC_CDS_VERSION:
+        print(f"Class data sharing archives need Java {MIN_DYNAMIC_CDS_VERSION}+; only the launch flags apply")
+
+    try:
+        destination = parse_destination(args.dest)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+
+    output_dir = tempfile.mkdtemp(prefix="cds_training_")
+    try:
+        commands = tool_commands(destination, args.file, output_dir)
+        if args.generate:
+            for tool, cmd in commands.items():
+                run_java(tool, cmd, capture_output=True)
+                print(f"{tool}: training run done")
+            return 0
+
+        reports = [measure_startup(tool, cmd, args.runs) for tool, cmd in commands.items()]
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    print(f"\n{'Tool':<16} {'Plain ms':>9} {'Tuned ms':>9} {'Saved ms':>9} {'Saved':>7}")
+    for report in reports:
+        print(f"{report['tool']:<16} {report['baseline_ms']:>9.1f} {report['optimized_ms']:>9.1f} "
+              f"{report['saved_ms']:>9.1f} {report['saved_percent']:>6.1f}%")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"java_version": version, "reports": reports}, f, indent=4)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
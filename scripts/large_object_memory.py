@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+
+"""
+Check that header parsing and sending of large objects use bounded memory, whatever the object size
+"""
+import os
+import sys
+import json
+import struct
+import asyncio
+import logging
+import argparse
+import tempfile
+import subprocess
+
+# Add parent directory to sys.path
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from src.dicom.jvm import get_java_version
+from src.utils.local_scp import start_python_scp, stop_storescp
+
+# Operations that must stay bounded, and the control that must not
+BOUNDED_OPERATIONS = ["header", "grouping_keys", "native_read", "native_sendfile", "dicom_modifier"]
+CONTROL_OPERATION = "pydicom_full_read"
+
+def setup_logging():
+    """Set up logging configuration"""
+    logging.basicConfig(
+        level=logging.WARNING,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+def make_sparse_object(path, pixel_bytes):
+    """
+    Write a multi-frame object whose pixel data is a sparse hole of pixel_bytes bytes.
+
+    The file takes almost no disk space but reads back as pixel_bytes of zeros.
+    """
+    from pydicom.dataset import Dataset, FileMetaDataset
+    from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+
+    frame_bytes = 2048 * 2048 * 2
+    frames = max(1, pixel_bytes // frame_bytes)
+    pixel_bytes = frames * frame_bytes
+
+    ds = Dataset()
+    ds.file_meta = FileMetaDataset()
+    ds.file_meta.MediaStorageSOPClassUID = "1.2.840.10008.5.1.4.1.1.13.1.3"  # Breast Tomosynthesis
+    ds.file_meta.MediaStorageSOPInstanceUID = generate_uid()
+    ds.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    ds.SOPClassUID = ds.file_meta.MediaStorageSOPClassUID
+    ds.SOPInstanceUID = ds.file_meta.MediaStorageSOPInstanceUID
+    ds.StudyInstanceUID = generate_uid()
+    ds.SeriesInstanceUID = generate_uid()
+    ds.PatientID = "LARGE"
+    ds.Modality = "MG"
+    ds.Rows = 2048
+    ds.Columns = 2048
+    ds.NumberOfFrames = frames
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    ds.BitsAllocated = 16
+    ds.BitsStored = 16
+    ds.HighBit = 15
+    ds.PixelRepresentation = 0
+    ds.save_as(path, enforce_file_format=True)
+
+    with open(path, "r+b") as f:
+        f.seek(0, 2)
+        f.write(struct.pack("<HH2sHI", 0x7FE0, 0x0010, b"OW", 0, pixel_bytes))
+        f.truncate(f.tell() + pixel_bytes)
+    return path
+
+def peak_rss_mb():
+    """Peak RSS of this process and of its waited-for children in MB"""
+    unit = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return (round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / unit, 1),
+            round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / unit, 1))
+
+async def _native_store(file_path, port, zero_copy):
+    from src.dicom.native.association import Association
+    from src.dicom.native.dimse import read_part10_header
+
+    header = read_part10_header(file_path)
+    assoc = Association("127.0.0.1", port, "STORESCP")
+    await assoc.connect([(header.sop_class_uid, [header.transfer_syntax_uid])])
+    try:
+        response = await assoc.c_store_file(file_path, header, zero_copy=zero_copy)
+    finally:
+        await assoc.release()
+    if response["status"] != 0:
+        raise RuntimeError(f"C-STORE failed with status {response['status']:04X}H")
+
+def run_operation(operation, file_path, port):
+    """Run one operation on the file in this process and return its peak RSS"""
+    import pydicom
+
+    if operation == "header":
+        from src.dicom.native.dimse import read_part10_header
+        read_part10_header(file_path)
+        pydicom.dcmread(file_path, stop_before_pixels=True)
+    elif operation == "grouping_keys":
+        from src.dicom.grouping import read_grouping_keys
+        read_grouping_keys(file_path)
+    elif operation in ("native_read", "native_sendfile"):
+        asyncio.run(_native_store(file_path, port, operation == "native_sendfile"))
+    elif operation == "dicom_modifier":
+        from src.dicom.dicom_modifier import modify_dicom_tags, cleanup_temp_files
+        output = modify_dicom_tags(file_path, {"00100020": "MEMORY_CHECK"})
+        if not output:
+            raise RuntimeError("DicomModifier failed")
+        cleanup_temp_files(output)
+    elif operation == CONTROL_OPERATION:
+        pydicom.dcmread(file_path).PixelData
+    self_rss, children_rss = peak_rss_mb()
+    return {"operation": operation, "peak_rss_mb": self_rss, "peak_child_rss_mb": children_rss}
+
+def measure(operation, file_path, port):
+    """Run an operation in a fresh interpreter so that its peak RSS is its own"""
+    cmd = [sys.executable, os.path.abspath(__file__), "--run", operation, "--file", file_path, "--port", str(port)]
+    completed = subprocess.run(cmd, capture_output=True, text=True)
+    lines = completed.stdout.strip().splitlines()
+    if completed.returncode != 0 or not lines:
+        return {"operation": operation, "error": (completed.stderr or completed.stdout).strip()[-500:]}
+    return json.loads(lines[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that large objects are handled with bounded memory")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[64, 512, 2048],
+                        help="Pixel data sizes in MB to test (default: 64 512 2048)")
+    parser.add_argument("--tolerance-mb", type=float, default=32.0,
+                        help="Allowed growth of peak RSS from the smallest to the largest size (default: 32)")
+    parser.add_argument("--directory", help="Where to create the sparse test files (default: the temp directory)")
+    parser.add_argument("--port", type=int, default=11198, help="Port of the loopback SCP (default: 11198)")
+    parser.add_argument("--json", help="Write the measurements as JSON to this file")
+    parser.add_argument("--run", choices=BOUNDED_OPERATIONS + [CONTROL_OPERATION], help=argparse.SUPPRESS)
+    parser.add_argument("--file", help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    setup_logging()
+
+    if resource is None:
+        print("Error: peak RSS cannot be measured on this platform")
+        return 1
+    if args.run:
+        print(json.dumps(run_operation(args.run, args.file, args.port)))
+        return 0
+
+    operations = [op for op in BOUNDED_OPERATIONS if op != "dicom_modifier" or get_java_version()[0]]
+    operations.append(CONTROL_OPERATION)
+    sizes = sorted(args.sizes)
+    directory = args.directory or tempfile.gettempdir()
+    measurements = {op: {} for op in operations}
+
+    scp_process = start_python_scp(args.port)
+    try:
+        for size in sizes:
+            path = make_sparse_object(os.path.join(directory, f"large_object_{size}mb.dcm"), size * 1024 * 1024)
+            try:
+                for operation in operations:
+                    if operation == CONTROL_OPERATION and size > 1024:
+                        continue
+                    measurements[operation][size] = measure(operation, path, args.port)
+            finally:
+                os.remove(path)
+    finally:
+        stop_storescp(scp_process)
+
+    print(f"\n{'Operation':<20}" + "".join(f"{str(size) + ' MB':>12}" for size in sizes) + f"{'growth':>10}  result")
+    passed = True
+    for operation in operations:
+        row = measurements[operation]
+        peaks = {}
+        for size, entry in row.items():
+            if "error" in entry:
+                print(f"{operation}: {size} MB failed: {entry['error']}")
+                passed = False
+                continue
+            peaks[size] = entry["peak_rss_mb"] + entry["peak_child_rss_mb"]
+        if not peaks:
+            continue
+        growth = peaks[max(peaks)] - peaks[min(peaks)]
+        if operation == CONTROL_OPERATION:
+            verdict = "control (loads the pixel data)"
+        elif growth <= args.tolerance_mb:
+            verdict = "bounded"
+        else:
+            verdict = "UNBOUNDED"
+            passed = False
+        print(f"{operation:<20}" + "".join(f"{peaks[size]:>12.1f}" if size in peaks else f"{'-':>12}" for size in sizes)
+              + f"{growth:>10.1f}  {verdict}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"sizes_mb": sizes, "tolerance_mb": args.tolerance_mb, "measurements": measurements}, f, indent=4)
+    print("\nPeak memory is bounded" if passed else "\nPeak memory grows with object size")
+    return 0 if passed else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -30,7 +30,7 @@ def validate_setup():
 def display_dicom_tags(file_path):
     """Display key DICOM tags from a file"""
     try:
-        ds = pydicom.dcmread(file_path)
+        ds = pydicom.dcmread(file_path, stop_before_pixels=True)
         print("\nDICOM Tags:")
         print("-" * 40)
         
@@ -34,7 +34,7 @@ def display_dicom_info(file_path):
     """Display information about the DICOM file"""
     try:
         import pydicom
-        ds = pydicom.dcmread(file_path)
+        ds = pydicom.dcmread(file_path, stop_before_pixels=True)
         print("\nDICOM File Information:")
         print("-" * 40)
         print(f"File: {file_path}")
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+"""
+Test script for the native asyncio DICOM backend against the bundled dcm4che storescp
+"""
+import os
+import sys
+import logging
+import argparse
+import tempfile
+
+# Add parent directory to sys.path
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from src.dicom.native.sender import echo_dicom_native, send_multiple_dicom_native
+from src.utils.file_helpers import find_dicom_files_in_folder
+from src.utils.local_scp import start_storescp, stop_storescp
+
+def setup_logging():
+    """Set up logging configuration"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+def run_test(file_paths, ip, port, ae_title, batch_size, associations):
+    """
+    Echo and send files with the native backend
+
+    Returns:
+        bool: True if the echo and all sends succeeded
+    """
+    print(f"\nTesting native DICOM echo to {ip}:{port} with AE Title: {ae_title}")
+    echo = echo_dicom_native(ip, port, ae_title)
+    if not echo["success"]:
+        print(f"DICOM echo failed: {echo['error']}")
+        return False
+    print(f"DICOM echo successful! Association: {echo['association_ms']} ms, echo: {echo['echo_ms']} ms")
+
+    print(f"\nSending {len(file_paths)} files over up to {associations} associations...")
+    results = send_multiple_dicom_native(
+        file_paths, ip, port, ae_title,
+        batch_size=batch_size, max_associations=associations
+    )
+    failures = [path for path, result in results.items() if not result["success"]]
+    for path in failures:
+        print(f"Failed: {path}: {results[path]['error']}")
+    print(f"Sent {len(results) - len(failures)}/{len(results)} files successfully")
+    return not failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Test the native asyncio DICOM backend")
+    input_group = parser.add_mutually_exclusive_group(required=True)
+    input_group.add_argument("--file", help="DICOM file to send")
+    input_group.add_argument("--folder", help="Folder of DICOM files to send")
+    parser.add_argument("--ip", help="DICOM server IP address (default: start a local storescp)")
+    parser.add_argument("--port", default="11115", help="DICOM server port (default: 11115)")
+    parser.add_argument("--ae-title", default="STORESCP", help="DICOM AE Title (default: STORESCP)")
+    parser.add_argument("--batch-size", type=int, default=100, help="Files per association (default: 100)")
+    parser.add_argument("--associations", type=int, default=4, help="Concurrent associations (default: 4)")
+
+    args = parser.parse_args()
+
+    setup_logging()
+
+    file_paths = [args.file] if args.file else find_dicom_files_in_folder(args.folder)
+    if not file_paths:
+        print("No DICOM files found.")
+        return 1
+
+    # Without a server address, receive into a temporary directory with the bundled storescp
+    if args.ip:
+        return 0 if run_test(file_paths, args.ip, args.port, args.ae_title, args.batch_size, args.associations) else 1
+
+    with tempfile.TemporaryDirectory() as storage_dir:
+        process = start_storescp(args.port, args.ae_title, storage_dir)
+        try:
+            success = run_test(file_paths, "127.0.0.1", args.port, args.ae_title, args.batch_size, args.associations)
+        finally:
+            stop_storescp(process)
+
+    return 0 if success else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+"""
+Test script for parsing StoreSCU log output, including locale-formatted summary lines
+"""
+import os
+import sys
+
+# Add parent directory to sys.path
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+
+from src.dicom.storescu_output import MB, parse_storescu_output, store_result_from_output
+
+STORE_OUTPUT = """12:00:00.100 INFO - Connected to 127.0.0.1:11112 in 12ms
+12:00:00.200 INFO - << 1:C-STORE-RQ[pcid=1, prior=0
+  iuid=1.2.3.4
+12:00:01.200 INFO - >> 1:C-STORE-RSP[pcid=1, status=0H
+  iuid=1.2.3.4
+12:00:01.300 INFO - {summary}
+"""
+
+def test_grouped_summary():
+    """A summary with thousands separators is parsed, and the instance still succeeds"""
+    report = parse_storescu_output(STORE_OUTPUT.format(
+        summary="Sent 1,001 objects (=1,024.5MB) in 1,234.5s (=0.83MB/s)"
+    ))
+    assert report.sent_objects == 1001
+    assert report.sent_bytes == int(1024.5 * MB)
+    assert report.sent_seconds == 1234.5
+    assert report.records["1.2.3.4"].success
+
+def test_decimal_comma_summary():
+    """A summary formatted for a locale with a decimal comma is parsed"""
+    report = parse_storescu_output(STORE_OUTPUT.format(
+        summary="Sent 1 objects (=1.024,5MB) in 0,35s (=2926,43MB/s)"
+    ))
+    assert report.sent_bytes == int(1024.5 * MB)
+    assert report.sent_seconds == 0.35
+
+def test_single_large_object_result():
+    """A single object of 1 GB or more is reported as sent"""
+    output = STORE_OUTPUT.format(summary="Sent 1 objects (=1,536MB) in 12.5s (=122.88MB/s)")
+    result = store_result_from_output(__file__, output, "", 0)
+    assert result["success"], result["error"]
+
+def main():
+    tests = [test_grouped_summary, test_decimal_comma_summary, test_single_large_object_result]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"PASS {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAIL {test.__name__}: {e}")
+    print(f"{len(tests) - failed}/{len(tests)} tests passed")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+Anonymization tag sets, and anonymization of many files in one pass
+"""
+
+import os
+import uuid
+import random
+import string
+import datetime
+from src.dicom.dicom_modifier import modify_dicom_files
+
+def generate_random_id(length=8):
+    """Generate a random ID with specified length"""
+    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=length))
+
+def generate_random_name():
+    """Generate a random patient name in DICOM format (LAST^FIRST)"""
+    last_names = ["SMITH", "JONES", "WILLIAMS", "BROWN", "TAYLOR", "ANONYMOUS", "TEST", "DOE"]
+    first_names = ["JOHN", "JANE", "MICHAEL", "ROBERT", "SARAH", "MARY", "JAMES", "TEST"]
+
+    last = random.choice(last_names)
+    first = random.choice(first_names)
+    return f"{last}^{first}"
+
+def generate_random_date():
+    """Generate a random date in YYYYMMDD format within the past 5 years"""
+    today = datetime.date.today()
+    random_days = random.randint(0, 365 * 5)  # Up to 5 years in the past
+    random_date = today - datetime.timedelta(days=random_days)
+    return random_date.strftime("%Y%m%d")
+
+def anonymization_tags(randomize=False):
+    """
+    Tags to modify to anonymize a file
+
+    Args:
+        randomize: If True, use random values, otherwise use fixed "ANONYMOUS" values
+
+    Returns:
+        dict: DICOM tags to modify (e.g., {"00100020": "ANONYMOUS"})
+    """
+    dicom_tags = {}
+
+    if randomize:
+        # Use random values
+        dicom_tags["00100010"] = generate_random_name()
+        dicom_tags["00100020"] = generate_random_id()
+        dicom_tags["00100030"] = generate_random_date()
+        dicom_tags["00100040"] = random.choice(["M", "F", "O"])
+        dicom_tags["00081030"] = f"ANONYMOUS STUDY {generate_random_id(4)}"
+        # Generate a new SOP Instance UID
+        dicom_tags["00080018"] = f"1.2.826.0.1.3680043.8.498.{uuid.uuid4().int % 10000000}.{uuid.uuid4().int % 10000000}.{uuid.uuid4().int % 10000000}"
+    else:
+        # Use fixed values
+        dicom_tags["00100010"] = "ANONYMOUS^PATIENT"
+        dicom_tags["00100020"] = "ANONYMOUS"
+        dicom_tags["00100030"] = ""  # Remove birth date
+        dicom_tags["00100040"] = "O"  # Other
+        dicom_tags["00081030"] = "ANONYMOUS STUDY"
+
+    # Additional tags to remove/anonymize
+    dicom_tags["00081070"] = ""  # Operator's Name
+    dicom_tags["00081090"] = ""  # Manufacturer's Model Name
+    dicom_tags["00080090"] = "ANONYMOUS^DOCTOR"  # Referring Physician
+    return dicom_tags
+
+def anonymized_path(file_path, output_dir=None):
+    """Output path of an anonymized file, in output_dir or beside the original"""
+    base_name = os.path.splitext(os.path.basename(file_path))[0]
+    return os.path.join(output_dir or os.path.dirname(file_path), f"{base_name}_anonymized.dcm")
+
+def anonymize_files(file_paths, output_dir=None, randomize=False, threads=None, on_result=None):
+    """
+    Anonymize many files, in this process or in one DicomModifier JVM.
+
+    Each file gets its own tag set, so random values differ between files. DicomModifier
+    is only started, and rebuilt when it predates the manifest batch mode, if a file
+    cannot be anonymized in Python.
+
+    Parameters:
+    - file_paths: Paths of the files to anonymize
+    - output_dir: Directory to save the anonymized files (default: beside each original)
+    - randomize: Whether to use random values (True) or fixed "ANONYMOUS" values (False)
+    - threads: Worker threads (default: "modifier_threads" from the configuration)
+    - on_result: Optional callback(input_file, result) called as each file completes
+
+    Returns:
+    - Dictionary with a result for each input file, as from modify_dicom_files
+    """
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    return modify_dicom_files(
+        ((file_path, anonymized_path(file_path, output_dir), anonymization_tags(randomize))
+         for file_path in file_paths),
+        threads=threads, on_result=on_result
+    )
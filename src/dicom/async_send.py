@@ -0,0 +1,292 @@
+"""
+Asyncio API for sending and echo: StoreSCU in asyncio subprocesses or the native backend, with a concurrency limit, timeouts and cancellation
+"""
+
+import os
+import time
+import signal
+import asyncio
+import logging
+import subprocess
+from itertools import islice
+from src.utils.config import ConfigManager, destination_key
+from src.dicom.jvm import java_command, finish_java_command
+from src.dicom.dcm4che import build_echo_command
+from src.dicom.storescu_batch import DEFAULT_BATCH_SIZE, build_storescu_command, batch_results_from_output
+from src.dicom.storescu_output import parse_echo_output
+from src.dicom.result_stream import compact_result
+from src.dicom.transport import get_transport_tuner
+from src.dicom.native.pool import AssociationPool, DEFAULT_IDLE_TIMEOUT
+from src.dicom.native.sender import send_files_over_association, echo_dicom_native_async
+
+# Backends that run without blocking a thread
+ASYNC_BACKENDS = ("dcm4che", "native")
+
+# JVMs or native associations running at once per client
+DEFAULT_MAX_CONCURRENCY = 4
+
+def _kill(process):
+    """Kill a JVM together with any launcher processes in its process group"""
+    if os.name == "posix":
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+            return
+        except OSError:
+            pass
+    process.kill()
+
+def _discard(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+async def run_java_async(tool, cmd, timeout=None):
+    """
+    Run a short-lived ["java", ...] command with the startup options, like run_java, on the running event loop.
+
+    If the timeout expires or the calling task is cancelled, the JVM is killed and
+    reaped before the exception propagates, so no JVM outlives its call. On POSIX the
+    JVM runs in its own process group, so wrapper scripts around java are killed too.
+
+    Parameters:
+    - tool: Name of the tool, used to name its archive (e.g. "storescu")
+    - cmd: The plain java command
+    - timeout: Seconds to wait for the JVM, or None to wait indefinitely
+
+    Returns:
+    - subprocess.CompletedProcess with text stdout and stderr
+
+    Raises:
+    - asyncio.TimeoutError if the timeout expired
+    """
+    full_cmd, dump_path = java_command(tool, cmd)
+    killed = False
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *full_cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+            start_new_session=os.name == "posix"
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+        except BaseException:
+            if process.returncode is None:
+                _kill(process)
+                killed = True
+                await process.wait()
+            raise
+    finally:
+        # A JVM killed while dumping its class archive leaves a truncated one
+        if killed and dump_path:
+            _discard(dump_path)
+        finish_java_command(tool, full_cmd, dump_path)
+    return subprocess.CompletedProcess(full_cmd, process.returncode,
+                                       stdout.decode(errors="replace"), stderr.decode(errors="replace"))
+
+async def _iter_batches(file_paths, batch_size):
+    """Split an iterable or async iterable of paths into lists of up to batch_size, lazily"""
+    if hasattr(file_paths, "__aiter__"):
+        batch = []
+        async for file_path in file_paths:
+            batch.append(file_path)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+        return
+    paths = iter(file_paths)
+    while True:
+        batch = list(islice(paths, batch_size))
+        if not batch:
+            return
+        yield batch
+
+async def _cancel_all(tasks):
+    """Cancel unfinished tasks and wait until each has cleaned up"""
+    pending = [task for task in tasks if not task.done()]
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.wait(pending)
+
+def _failed_result(error):
+    return {"success": False, "status": None, "output": "", "error": error}
+
+class AsyncDicomClient:
+    """
+    Asyncio counterparts of the blocking send and echo functions, for use inside an event loop.
+
+    With the dcm4che backend every batch is one StoreSCU JVM started with
+    asyncio.create_subprocess_exec; with the native backend it is one association of
+    the asyncio DICOM implementation, taken from a pool owned by the client. Either way
+    no thread is held while a send is in flight.
+
+    At most max_concurrency JVMs or associations run at once over all calls made on the
+    client. Every call takes a timeout in seconds (default: the client's), applied to
+    each JVM or association. Cancelling a call kills its JVMs or aborts its associations.
+
+    Use it as "async with AsyncDicomClient(...) as client:" so that pooled associations
+    are released at the end.
+    """
+
+    def __init__(self, backend="dcm4che", max_concurrency=DEFAULT_MAX_CONCURRENCY, timeout=None,
+                 batch_size=DEFAULT_BATCH_SIZE, config_manager=None):
+        if backend not in ASYNC_BACKENDS:
+            raise ValueError(f"Backend {backend!r} has no asyncio API; use one of {', '.join(ASYNC_BACKENDS)}")
+        self.backend = backend
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.timeout = timeout
+        self.batch_size = max(1, int(batch_size or DEFAULT_BATCH_SIZE))
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.pool = None
+        if backend == "native":
+            config_manager = config_manager or ConfigManager()
+            self.pool = AssociationPool(config_manager.get_value("association_idle_timeout", DEFAULT_IDLE_TIMEOUT))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """Release the idle pooled associations"""
+        if self.pool:
+            await self.pool.close_all()
+
+    async def echo(self, host, port, ae_title, timeout=None):
+        """
+        Send a DICOM C-ECHO.
+
+        Returns:
+        - Dictionary with success, status, association_ms, echo_ms and error
+        """
+        timeout = self.timeout if timeout is None else timeout
+        async with self.semaphore:
+            try:
+                if self.backend == "native":
+                    return await asyncio.wait_for(echo_dicom_native_async(host, port, ae_title), timeout)
+                result = await run_java_async("storescu", build_echo_command(host, port, ae_title), timeout)
+                return parse_echo_output(result.stdout + "\n" + result.stderr)
+            except asyncio.TimeoutError:
+                return {"success": False, "status": None, "association_ms": None, "echo_ms": None,
+                        "error": f"C-ECHO timed out after {timeout} s"}
+            except OSError as e:
+                return {"success": False, "status": None, "association_ms": None, "echo_ms": None, "error": str(e)}
+
+    async def _send_batch(self, batch, host, port, ae_title, dicom_tags, timeout):
+        """Send one batch over one JVM or association and return the results for each file"""
+        async with self.semaphore:
+            try:
+                if self.backend == "native":
+                    return await asyncio.wait_for(
+                        send_files_over_association(batch, host, port, ae_title, pool=self.pool, dicom_tags=dicom_tags),
+                        timeout
+                    )
+                transport = get_transport_tuner().settings(host, port, ae_title)
+                cmd = build_storescu_command(batch, host, port, ae_title, dicom_tags, transport)
+                start = time.perf_counter()
+                result = await run_java_async("storescu", cmd, timeout)
+                elapsed = time.perf_counter() - start
+            except asyncio.TimeoutError:
+                return {file_path: _failed_result(f"Send timed out after {timeout} s") for file_path in batch}
+            except OSError as e:
+                return {file_path: _failed_result(str(e)) for file_path in batch}
+        # Mapping responses to files reads each file's SOP Instance UID, so it runs off the event loop
+        return await asyncio.get_running_loop().run_in_executor(
+            None, batch_results_from_output, batch, host, port, ae_title,
+            result.stdout, result.stderr, elapsed, transport, dicom_tags
+        )
+
+    async def send_file(self, file_path, host, port, ae_title, dicom_tags=None, timeout=None):
+        """
+        Send one DICOM file.
+
+        Returns:
+        - Dictionary with success, status, output and error, like the per-file results of the batch functions
+        """
+        timeout = self.timeout if timeout is None else timeout
+        results = await self._send_batch([file_path], host, port, ae_title, dicom_tags, timeout)
+        return results.get(file_path) or _failed_result("No result reported for this file")
+
+    async def send_files(self, file_paths, host, port, ae_title, dicom_tags=None, timeout=None):
+        """
+        Send multiple DICOM files, batch_size files per JVM or association.
+
+        Parameters:
+        - file_paths: List of paths to the DICOM files
+        - host, port, ae_title: Destination
+        - dicom_tags: Dictionary of DICOM tags to coerce while the files are sent
+        - timeout: Seconds allowed per batch
+
+        Returns:
+        - Dictionary with results for each file
+        """
+        timeout = self.timeout if timeout is None else timeout
+        batches = [file_paths[i:i + self.batch_size] for i in range(0, len(file_paths), self.batch_size)]
+        tasks = [asyncio.ensure_future(self._send_batch(batch, host, port, ae_title, dicom_tags, timeout))
+                 for batch in batches]
+        try:
+            await asyncio.wait(tasks)
+        finally:
+            # gather() would return on the first cancelled batch, before the others killed their JVMs
+            await _cancel_all(tasks)
+        results = {}
+        for task in tasks:
+            results.update(task.result())
+        return results
+
+    async def iter_send(self, file_paths, host, port, ae_title, dicom_tags=None, timeout=None,
+                        failure_log=None, counters=None):
+        """
+        Send files and yield one compact record per file as its batch completes.
+
+        file_paths may be an iterable or an async iterable; it is consumed lazily, with at
+        most two batches per concurrency slot in flight. Records come in completion order.
+        Leaving the loop early or cancelling the consuming task cancels the batches in
+        flight, which kills their JVMs; wrap the iterator in contextlib.aclosing() to have
+        that happen at once rather than when the iterator is garbage collected.
+
+        Parameters:
+        - failure_log: Optional FailureLog receiving the full log text of failures
+        - counters: Optional SendCounters updated with every record
+
+        Yields:
+        - Compact records as returned by compact_result
+        """
+        timeout = self.timeout if timeout is None else timeout
+        logging.info(f"Streaming asyncio send to {destination_key(host, port, ae_title)}, "
+                     f"up to {self.max_concurrency} {'associations' if self.backend == 'native' else 'JVMs'} at once")
+        batches = _iter_batches(file_paths, self.batch_size)
+        in_flight = {}
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(in_flight) < 2 * self.max_concurrency:
+                    try:
+                        batch = await batches.__anext__()
+                    except StopAsyncIteration:
+                        exhausted = True
+                        break
+                    task = asyncio.ensure_future(self._send_batch(batch, host, port, ae_title, dicom_tags, timeout))
+                    in_flight[task] = batch
+                if not in_flight:
+                    break
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    batch = in_flight.pop(task)
+                    try:
+                        batch_results = task.result()
+                    except Exception as e:
+                        logging.error(f"Failed to send batch of {len(batch)} files: {str(e)}")
+                        batch_results = {}
+                    for file_path in batch:
+                        result = batch_results.get(file_path) or _failed_result("No result reported for this file")
+                        record = compact_result(file_path, result, failure_log)
+                        if counters is not None:
+                            counters.add(record)
+                        yield record
+        finally:
+            await _cancel_all(in_flight)
+            await batches.aclose()
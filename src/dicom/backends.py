@@ -0,0 +1,86 @@
+"""
+Selection of the network backend used for sending and echo
+"""
+
+from src.dicom.dcm4che import echo_dicom_using_dcm4che, send_dicom_using_dcm4che, send_multiple_dicom_using_dcm4che_alt
+from src.dicom.send_daemon_pool import get_send_daemon, send_multiple_dicom_using_daemon
+from src.dicom.native.sender import echo_dicom_native, send_multiple_dicom_native
+from src.dicom.storescu_output import parse_echo_output, store_result_from_output
+from src.dicom.coercion import coercion_edits, report_coercion
+
+# Available values for the "send_backend" configuration key
+DCM4CHE_BACKEND = "dcm4che"
+DAEMON_BACKEND = "daemon"
+NATIVE_BACKEND = "native"
+SEND_BACKENDS = (DCM4CHE_BACKEND, DAEMON_BACKEND, NATIVE_BACKEND)
+
+def get_send_backend(config_manager):
+    """Return the configured send backend, falling back to dcm4che for unknown values"""
+    backend = config_manager.get_value("send_backend", DCM4CHE_BACKEND)
+    return backend if backend in SEND_BACKENDS else DCM4CHE_BACKEND
+
+def get_send_multiple_function(backend):
+    """
+    Return the function used to send multiple files with the given backend.
+
+    All returned functions share the signature
+    (file_paths, host, port, ae_title, progress_callback=None, dicom_tags=None, batch_size=...)
+    and return a dictionary with results for each file.
+    """
+    if backend == NATIVE_BACKEND:
+        return send_multiple_dicom_native
+    if backend == DAEMON_BACKEND:
+        return send_multiple_dicom_using_daemon
+    return send_multiple_dicom_using_dcm4che_alt
+
+def send_file_with_backend(backend, file_path, host, port, ae_title, dicom_tags=None):
+    """
+    Send a single file with the given backend, applying tag modifications in flight.
+
+    dcm4che starts a StoreSCU for the file, the daemon keeps one JVM for all files and the
+    native backend reuses pooled associations between files.
+
+    Returns:
+    - Dictionary with file, success and error, plus whatever else the backend reports
+    """
+    try:
+        if backend in (DAEMON_BACKEND, NATIVE_BACKEND):
+            result = get_send_multiple_function(backend)([file_path], host, port, ae_title,
+                                                         dicom_tags=dicom_tags)[file_path]
+        else:
+            # StoreSCU coerces the tags as it sends, so no modified copy is written
+            process = send_dicom_using_dcm4che(file_path, host, port, ae_title, dicom_tags)
+            result = report_coercion(store_result_from_output(file_path, process.stdout, process.stderr,
+                                                              process.returncode),
+                                     coercion_edits(dicom_tags))
+    except Exception as e:
+        result = {"success": False, "error": str(e)}
+    result["file"] = file_path
+    return result
+
+def echo_with_backend(backend, host, port, ae_title):
+    """
+    Send a DICOM echo with the given backend.
+
+    Returns:
+    - Dictionary with success, association_ms, echo_ms (None when not measured) and error
+    """
+    if backend == NATIVE_BACKEND:
+        return echo_dicom_native(host, port, ae_title)
+    if backend == DAEMON_BACKEND:
+        try:
+            result = get_send_daemon().echo(host, port, ae_title)
+            if not result["success"] and not result.get("error"):
+                result["error"] = f"C-ECHO failed with status {result['status']:04X}H"
+            result.setdefault("error", "")
+            return result
+        except Exception as e:
+            return {"success": False, "association_ms": None, "echo_ms": None, "error": str(e)}
+
+    result = echo_dicom_using_dcm4che(host, port, ae_title)
+    output = result.stdout + "\n" + result.stderr
+    echo = parse_echo_output(output)
+    echo["output"] = result.stdout
+    if not echo["success"] and result.stderr.strip():
+        echo["error"] = result.stderr.strip()
+    return echo
@@ -0,0 +1,290 @@
+"""
+Batch processor for DICOM files: a queue of files worked through by a pool of threads
+"""
+import os
+import logging
+import threading
+import time
+import queue
+from src.dicom.send_journal import JournalRecorder
+from src.dicom.retry import RetryScheduler
+from src.dicom.fanout import send_to_destinations, summarize_fanout, format_fanout_summary
+from src.dicom.anonymize import anonymize_files
+from src.dicom.grouping import group_by_study
+from src.dicom.storescu_output import format_throughput
+from src.dicom.result_stream import compact_result, SendCounters, FailureLog
+from src.utils.dcm4che_validator import validate_dcm4che_setup
+from src.utils.file_helpers import find_dicom_files_in_folder
+
+class BatchProcessor:
+    """Batch processor for DICOM operations"""
+    
+    def __init__(self, num_workers=4):
+        self.num_workers = num_workers
+        self.file_queue = queue.Queue()
+        # Only compact records of failed files are kept; successes are just counted
+        self.failures = []
+        self.counters = SendCounters()
+        self.failure_log = None
+        self.success_count = 0
+        self.error_count = 0
+        self.stop_event = threading.Event()
+        self.workers = []
+        self.progress_lock = threading.Lock()
+        self.journal = None
+        self.retries = RetryScheduler(None, self.file_queue.put)
+
+    def setup_logging(self):
+        """Set up logging configuration"""
+        logging.basicConfig(
+            level=logging.INFO,
+            format='%(asctime)s - %(levelname)s - %(message)s'
+        )
+
+    def validate_setup(self):
+        """Validate that the dcm4che environment is properly set up"""
+        is_valid, report = validate_dcm4che_setup()
+        print(report)
+        return is_valid
+
+    def add_files_from_folder(self, folder_path):
+        """Add all DICOM files from a folder to the processing queue"""
+        files = find_dicom_files_in_folder(folder_path)
+        if not files:
+            print(f"No DICOM files found in folder: {folder_path}")
+            return 0
+            
+        for file in files:
+            self.file_queue.put(file)
+            
+        print(f"Added {len(files)} DICOM files to the processing queue")
+        return len(files)
+        
+    def add_file(self, file_path):
+        """Add a single file to the processing queue"""
+        if os.path.exists(file_path):
+            self.file_queue.put(file_path)
+            return 1
+        else:
+            print(f"File not found: {file_path}")
+            return 0
+            
+    def take_queued_files(self):
+        """Remove every file from the queue and return them in queue order"""
+        files = []
+        while not self.file_queue.empty():
+            files.append(self.file_queue.get())
+            self.file_queue.task_done()
+        return files
+        
+    def use_journal(self, journal, destination, dicom_tags=None):
+        """Record the outcome of every processed file, sent with dicom_tags, in a send journal"""
+        self.journal = JournalRecorder(journal, destination, dicom_tags)
+        
+    def skip_acknowledged(self):
+        """
+        Remove the files the journal destination already acknowledged from the queue
+        
+        Returns:
+            int: Number of files skipped
+        """
+        files = self.take_queued_files()
+        pending, skipped = self.journal.split_acknowledged(files)
+        for file in pending:
+            self.file_queue.put(file)
+        return len(skipped)
+        
+    def sort_by_study(self):
+        """
+        Reorder the queue by study, series and Instance Number so each study is sent in order
+        
+        Returns:
+            int: Number of studies in the queue
+        """
+        grouped = group_by_study(self.take_queued_files())
+        for study_files in grouped.values():
+            for file in study_files:
+                self.file_queue.put(file)
+        return len(grouped)
+        
+    def worker_thread(self, worker_id, operation, **kwargs):
+        """Worker thread for processing DICOM files"""
+        while not self.stop_event.is_set():
+            try:
+                # Get a file from the queue with a timeout
+                file_path = self.file_queue.get(timeout=0.5)
+                
+                # Process the file
+                with self.progress_lock:
+                    total = self.success_count + self.error_count + self.file_queue.qsize()
+                    print(f"Worker {worker_id}: Processing file {self.success_count + self.error_count + 1}/{total}: {os.path.basename(file_path)}")
+                
+                result = operation(file_path, **kwargs)
+                if self.retries.schedule(file_path, result):
+                    self.file_queue.task_done()
+                    continue
+                if self.journal:
+                    self.journal.record(file_path, result)
+                self.track_result(file_path, result)
+                
+                # Mark the task as done
+                self.file_queue.task_done()
+                
+            except queue.Empty:
+                # No more files in the queue, unless a retry is still waiting for its backoff
+                if self.retries.waiting():
+                    continue
+                break
+            except Exception as e:
+                # Handle any other exceptions
+                with self.progress_lock:
+                    print(f"Worker {worker_id} error: {str(e)}")
+                    self.error_count += 1
+                    record = compact_result(file_path if 'file_path' in locals() else 'unknown',
+                                            {'success': False, 'error': str(e)}, self.failure_log)
+                    self.failures.append(record)
+                self.counters.add(record)
+                # Mark the task as done if we got a file
+                if 'file_path' in locals():
+                    self.file_queue.task_done()
+    
+    def process_batch(self, operation, **kwargs):
+        """
+        Process all files in the queue using the specified operation
+        
+        Args:
+            operation: Function to call for each file
+            **kwargs: Additional arguments to pass to the operation
+            
+        Returns:
+            dict: Results summary
+        """
+        # Start worker threads
+        start_time = time.time()
+        self.counters = SendCounters()
+        self.workers = []
+        for i in range(self.num_workers):
+            worker = threading.Thread(
+                target=self.worker_thread,
+                args=(i+1, operation),
+                kwargs=kwargs
+            )
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+            
+        # Start a progress reporting thread
+        def report_progress():
+            last_count = 0
+            while not self.stop_event.is_set() and any(w.is_alive() for w in self.workers):
+                with self.progress_lock:
+                    total = self.success_count + self.error_count + self.file_queue.qsize()
+                    current = self.success_count + self.error_count
+                    if current != last_count:
+                        print(f"Progress: {current}/{total} files processed ({self.success_count} success, {self.error_count} errors)")
+                        last_count = current
+                time.sleep(2)
+                
+        progress_thread = threading.Thread(target=report_progress)
+        progress_thread.daemon = True
+        progress_thread.start()
+        
+        # Wait for all files to be processed
+        for worker in self.workers:
+            worker.join()
+            
+        # Set the stop event to terminate the progress thread
+        self.stop_event.set()
+        progress_thread.join()
+        
+        # Final progress report
+        return self.summary(time.time() - start_time)
+    
+    def track_result(self, file_path, result):
+        """Count a final result, keeping only a compact record of failures"""
+        record = compact_result(file_path, result, self.failure_log)
+        self.counters.add(record)
+        with self.progress_lock:
+            if record['success']:
+                self.success_count += 1
+            else:
+                self.error_count += 1
+                self.failures.append(record)
+            return self.success_count + self.error_count
+    
+    def summary(self, elapsed):
+        """Print and return the results summary of a run"""
+        print(f"Completed processing {self.success_count + self.error_count} files in {elapsed:.1f}s")
+        print(f"Success: {self.success_count}, Errors: {self.error_count}")
+        return {
+            'total': self.success_count + self.error_count,
+            'success': self.success_count,
+            'errors': self.error_count,
+            'seconds': elapsed,
+            'failures': self.failures,
+            'counters': self.counters.summary()
+        }
+    
+    def use_failure_log(self, path):
+        """Write the full log text of failed files to a file instead of keeping it in memory"""
+        self.failure_log = FailureLog(path)
+    
+    def print_throughput(self, results):
+        """Print the throughput of the sent files in a process_batch results summary"""
+        counters = results['counters']
+        print(f"Throughput: {format_throughput(counters['throughput'])}")
+        if counters['statuses']:
+            print(f"DIMSE statuses: {counters['statuses']}")
+
+    def process_fanout(self, destinations, dicom_tags=None, backend="dcm4che", journal=None, resume=False,
+                       group_by_study=False):
+        """
+        Send all queued files to several destinations in one pass
+        
+        Args:
+            destinations: List of (host, port, ae_title)
+            dicom_tags: Optional dictionary of DICOM tags to modify
+            backend: Send backend ("dcm4che", "daemon" or "native")
+            journal: Optional send journal recording each destination's results
+            resume: Skip files a destination already acknowledged
+            group_by_study: Send study by study, never mixing studies on one association
+            
+        Returns:
+            dict: Results summary, with a summary per destination
+        """
+        def report_progress(current, total, current_file):
+            print(f"Progress: {current}/{total} files delivered to all destinations")
+        
+        start_time = time.time()
+        results = send_to_destinations(
+            self.take_queued_files(), destinations, report_progress, dicom_tags,
+            backend=backend, retry_policy=self.retries.policy, journal=journal, resume=resume,
+            group_by_study=group_by_study
+        )
+        summary = summarize_fanout(results, time.time() - start_time)
+        for line in format_fanout_summary(summary):
+            print(line)
+        return summary
+    
+    def process_anonymize(self, output_dir=None, randomize=False):
+        """
+        Anonymize all queued files with num_workers threads, in this process or in one DicomModifier JVM
+        
+        Args:
+            output_dir: Directory to save the anonymized files (optional)
+            randomize: Whether to use random values (True) or fixed "ANONYMOUS" values (False)
+            
+        Returns:
+            dict: Results summary, like process_batch
+        """
+        files = self.take_queued_files()
+        
+        def record(file_path, result):
+            done = self.track_result(file_path, result)
+            if done % 100 == 0 or done == len(files):
+                print(f"Progress: {done}/{len(files)} files processed ({self.success_count} success, {self.error_count} errors)")
+        
+        start_time = time.time()
+        self.counters = SendCounters()
+        anonymize_files(files, output_dir, randomize, threads=self.num_workers, on_result=record)
+        return self.summary(time.time() - start_time)
@@ -0,0 +1,101 @@
+"""
+Tag coercion applied while a dataset is sent, so that no modified copy is written to disk
+"""
+
+import os
+from pydicom.filebase import DicomBytesIO
+from pydicom.filewriter import write_dataset
+from src.dicom.python_modifier import SOP_INSTANCE_UID, parse_edits, apply_edits, read_for_edits
+
+def coercion_edits(dicom_tags):
+    """
+    The edits of a tag dictionary that are applied: tags with a value, values as text.
+
+    The returned dictionary is what send results report under "coerced"; it is shared
+    by the results of one send, not copied per file.
+    """
+    if not dicom_tags or not isinstance(dicom_tags, dict):
+        return {}
+    return {tag_name: str(tag_value) for tag_name, tag_value in dicom_tags.items() if tag_value}
+
+def storescu_coercion_options(dicom_tags):
+    """
+    StoreSCU options that coerce tags in flight.
+
+    StoreSCU applies "-s tag=value" to each dataset as it sends it, streaming the bulk
+    data from the file, and uses a coerced SOP Instance UID in the C-STORE request.
+    """
+    options = []
+    for tag_name, tag_value in coercion_edits(dicom_tags).items():
+        options += ["-s", f"{tag_name}={tag_value}"]
+    return options
+
+def coerced_sop_instance_uid(dicom_tags):
+    """The SOP Instance UID a coercion sets, or None if it leaves it alone"""
+    for tag_name, tag_value in coercion_edits(dicom_tags).items():
+        try:
+            if int(tag_name, 16) == SOP_INSTANCE_UID:
+                return tag_value
+        except ValueError:
+            pass
+    return None
+
+def report_coercion(result, edits):
+    """Add the applied edits to a per-file result under "coerced" and return the result"""
+    if edits:
+        result["coerced"] = edits
+    return result
+
+class CoercedDataset:
+    """
+    A dataset to send with its leading elements re-encoded with the edits.
+
+    The dataset is prefix followed by the tail_length bytes of the file that start at
+    tail_offset, which are sent unchanged.
+    """
+
+    __slots__ = ("prefix", "tail_offset", "tail_length", "sop_instance_uid")
+
+    def __init__(self, prefix, tail_offset, tail_length, sop_instance_uid=None):
+        self.prefix = prefix
+        self.tail_offset = tail_offset
+        self.tail_length = tail_length
+        self.sop_instance_uid = sop_instance_uid
+
+    @property
+    def dataset_size(self):
+        return len(self.prefix) + self.tail_length
+
+def coerce_dataset(file_path, dicom_tags):
+    """
+    Prepare a file's dataset for sending with tags coerced.
+
+    Only the elements up to the last edited tag are read and re-encoded, in the transfer
+    syntax of the file; everything after them, pixel data included, is left in the file
+    for the sender to stream as it is.
+
+    Parameters:
+    - file_path: Path to a DICOM Part 10 file
+    - dicom_tags: Dictionary of DICOM tags to coerce (e.g., {"00100020": "12345"})
+
+    Returns:
+    - CoercedDataset
+
+    Raises:
+    - python_modifier.UnsupportedFile for files without file meta information, with a
+      deflated dataset, or for edits at or after the pixel data
+    - ValueError for edits that cannot be applied
+    """
+    edits = parse_edits(dicom_tags)
+    if not edits:
+        raise ValueError("No tags to coerce")
+    with open(file_path, "rb") as f:
+        ds, splice_offset, transfer_syntax = read_for_edits(f, edits)
+        tail_length = os.fstat(f.fileno()).st_size - splice_offset
+    apply_edits(ds, edits)
+
+    fp = DicomBytesIO()
+    fp.is_little_endian = transfer_syntax.is_little_endian
+    fp.is_implicit_VR = transfer_syntax.is_implicit_VR
+    write_dataset(fp, ds)
+    return CoercedDataset(fp.getvalue(), splice_offset, tail_length, coerced_sop_instance_uid(dicom_tags))
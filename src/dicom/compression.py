@@ -0,0 +1,249 @@
+"""
+Lossless compression of uncompressed images before sending, for destinations known to accept it
+"""
+
+import os
+import sys
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pydicom
+from src.utils.config import ConfigManager, destination_key
+from src.utils.file_helpers import get_lib_dir
+from src.dicom.jvm import run_java
+from src.dicom.native.dimse import read_part10_header, EXPLICIT_VR_LITTLE_ENDIAN, IMPLICIT_VR_LITTLE_ENDIAN
+from src.dicom.context_cache import get_context_cache
+from src.dicom.spool import get_spool
+
+JPEG_LS_LOSSLESS = "1.2.840.10008.1.2.4.80"
+JPEG_2000_LOSSLESS = "1.2.840.10008.1.2.4.90"
+
+# "wan_compression" values and the transfer syntax and dcm2dcm option each one selects
+COMPRESSION_SYNTAXES = {
+    "jpeg-ls": (JPEG_LS_LOSSLESS, "--jlsl"),
+    "jpeg2000": (JPEG_2000_LOSSLESS, "--j2kr")
+}
+
+DEFAULT_COMPRESSION_WORKERS = 2
+
+# Only uncompressed little endian pixel data is re-encoded
+_COMPRESSIBLE_SOURCE_SYNTAXES = (EXPLICIT_VR_LITTLE_ENDIAN, IMPLICIT_VR_LITTLE_ENDIAN)
+
+def get_compression_syntax(config_manager, host, port, ae_title):
+    """
+    Look up the lossless transfer syntax configured for a destination.
+
+    The per-destination value in "destination_wan_compression" wins over "wan_compression".
+
+    Returns:
+    - The transfer syntax UID, or None when compression is off for the destination
+    """
+    overrides = config_manager.get_value("destination_wan_compression", {}) or {}
+    name = overrides.get(destination_key(host, port, ae_title), config_manager.get_value("wan_compression", ""))
+    if not name:
+        return None
+    if name not in COMPRESSION_SYNTAXES:
+        logging.warning(f"Unknown wan_compression value '{name}', sending uncompressed")
+        return None
+    return COMPRESSION_SYNTAXES[name][0]
+
+def get_dcm2dcm_classpath():
+    """Build the classpath with all JARs needed to run dcm2dcm and its image codecs"""
+    lib_dir = get_lib_dir()
+    return os.pathsep.join(os.path.join(lib_dir, jar) for jar in [
+        "dcm4che-tool-dcm2dcm-5.33.1.jar",
+        "dcm4che-core-5.33.1.jar",
+        "dcm4che-net-5.33.1.jar",
+        "dcm4che-image-5.33.1.jar",
+        "dcm4che-imageio-5.33.1.jar",
+        "dcm4che-imageio-opencv-5.33.1.jar",
+        "dcm4che-imageio-rle-5.33.1.jar",
+        "dcm4che-tool-common-5.33.1.jar",
+        "weasis-core-img-4.9.0.1.jar",
+        "jai_imageio-1.2-pre-dr-b04.jar",
+        "clibwrapper_jiio-1.2-pre-dr-b04.jar",
+        "slf4j-api-2.0.16.jar",
+        "logback-core-1.5.12.jar",
+        "logback-classic-1.5.12.jar",
+        "commons-cli-1.9.0.jar"
+    ])
+
+def get_native_library_dir():
+    """Directory holding the native codec libraries (OpenCV, clib_jiio) for this platform"""
+    machine = "x86-64" if sys.maxsize > 2 ** 32 else "x86"
+    system = {"win32": "windows", "darwin": "macosx"}.get(sys.platform, "linux")
+    return os.path.join(get_lib_dir(), f"{system}-{machine}")
+
+def is_compressible(file_path):
+    """
+    Check whether a file holds uncompressed 8 or 16 bit pixel data that can be compressed losslessly.
+
+    Returns:
+    - (True, header) or (False, header or None)
+    """
+    try:
+        header = read_part10_header(file_path)
+        if header.transfer_syntax_uid not in _COMPRESSIBLE_SOURCE_SYNTAXES:
+            return False, header
+        ds = pydicom.dcmread(file_path, stop_before_pixels=True,
+                             specific_tags=["Rows", "BitsAllocated", "SamplesPerPixel"])
+        return ds.get("Rows") is not None and ds.get("BitsAllocated") in (8, 16), header
+    except Exception as e:
+        logging.warning(f"Could not check {file_path} for compression: {str(e)}")
+        return False, None
+
+def _unique_name_batches(file_paths):
+    """Split files so that no batch has two files with the same name (dcm2dcm keeps names in its output directory)"""
+    batches = []
+    for file_path in file_paths:
+        name = os.path.basename(file_path)
+        for names, batch in batches:
+            if name not in names:
+                names.add(name)
+                batch.append(file_path)
+                break
+        else:
+            batches.append(({name}, [file_path]))
+    return [batch for _, batch in batches]
+
+def compress_files_using_dcm4che(file_paths, transfer_syntax_uid, output_dir):
+    """
+    Compress files losslessly with dcm2dcm, one JVM per batch of distinctly named files.
+
+    Returns:
+    - Dictionary mapping each compressed file to its output path; files that failed are missing
+    """
+    option = next(opt for ts, opt in COMPRESSION_SYNTAXES.values() if ts == transfer_syntax_uid)
+    outputs = {}
+    for batch in _unique_name_batches(file_paths):
+        cmd = [
+            "java", f"-Djava.library.path={get_native_library_dir()}",
+            "-cp", get_dcm2dcm_classpath(),
+            "org.dcm4che3.tool.dcm2dcm.Dcm2Dcm", option
+        ] + batch + [output_dir]
+        result = run_java("dcm2dcm", cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            logging.error(f"dcm2dcm failed for a batch of {len(batch)} files: {result.stderr.strip()}")
+        for file_path in batch:
+            output_path = os.path.join(output_dir, os.path.basename(file_path))
+            if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+                outputs[file_path] = output_path
+    return outputs
+
+def compress_files_using_pydicom(file_paths, transfer_syntax_uid, output_dir):
+    """
+    Compress files losslessly with pydicom (needs pyjpegls or pylibjpeg-openjpeg).
+
+    Returns:
+    - Dictionary mapping each compressed file to its output path; files that failed are missing
+    """
+    outputs = {}
+    for index, file_path in enumerate(file_paths):
+        output_path = os.path.join(output_dir, f"{index}_{os.path.basename(file_path)}")
+        try:
+            ds = pydicom.dcmread(file_path)
+            ds.compress(transfer_syntax_uid)
+            ds.save_as(output_path, enforce_file_format=True)
+            outputs[file_path] = output_path
+        except Exception as e:
+            logging.error(f"Failed to compress {file_path} with pydicom: {str(e)}")
+    return outputs
+
+class CompressionStage:
+    """
+    Compresses chunks of files on its own worker threads while earlier chunks are sent.
+
+    A file is compressed only if it holds uncompressed 8/16 bit pixel data and the
+    presentation context cache says the destination accepted the target syntax for its
+    SOP class. Compressed copies that are not smaller than the original are dropped.
+    At most max_ahead chunks of compressed copies exist at a time, so a slow network
+    does not fill the disk; release() frees a chunk's copies once it is sent.
+    """
+
+    def __init__(self, destination, transfer_syntax_uid, workers=DEFAULT_COMPRESSION_WORKERS,
+                 max_ahead=2, backend="dcm4che", cache=None):
+        self.destination = destination
+        self.transfer_syntax_uid = transfer_syntax_uid
+        self.backend = backend
+        self.cache = cache or get_context_cache()
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers))
+        self.slots = threading.BoundedSemaphore(max(1, max_ahead))
+        self.stats = {"compressed": 0, "bytes_before": 0, "bytes_after": 0}
+        self.stats_lock = threading.Lock()
+
+    @classmethod
+    def for_destination(cls, host, port, ae_title, max_ahead=2, config_manager=None):
+        """Create the stage configured for a destination, or return None when compression is off"""
+        config_manager = config_manager or ConfigManager()
+        transfer_syntax_uid = get_compression_syntax(config_manager, host, port, ae_title)
+        if not transfer_syntax_uid:
+            return None
+        return cls(destination_key(host, port, ae_title), transfer_syntax_uid,
+                   config_manager.get_value("compression_workers", DEFAULT_COMPRESSION_WORKERS),
+                   max_ahead, config_manager.get_value("compression_backend", "dcm4che"))
+
+    def submit(self, chunk):
+        """
+        Start compressing a chunk.
+
+        Returns:
+        - Future of (send_map, output_dir): send_map maps each original file to the path
+          to send, output_dir holds the compressed copies (None if there are none)
+        """
+        return self.executor.submit(self._compress_chunk, chunk)
+
+    def _compress_chunk(self, chunk):
+        self.slots.acquire()
+        try:
+            return self._compress(chunk)
+        except Exception as e:
+            logging.error(f"Compression of {len(chunk)} files failed, sending them uncompressed: {str(e)}")
+            return {file_path: file_path for file_path in chunk}, None
+
+    def _compress(self, chunk):
+        send_map = {file_path: file_path for file_path in chunk}
+        eligible = [file_path for file_path in chunk if self.is_accepted(file_path)]
+        if not eligible:
+            return send_map, None
+
+        # Chunks are compressed ahead and out of order, so a chunk must not wait for the budget
+        # a later one holds; when it is used up the copies go to the overflow directory on disk
+        output_dir = get_spool().mkdtemp(prefix="compressed_", block=False,
+                                         size=sum(os.path.getsize(file_path) for file_path in eligible))
+        compress = compress_files_using_pydicom if self.backend == "pydicom" else compress_files_using_dcm4che
+        try:
+            outputs = compress(eligible, self.transfer_syntax_uid, output_dir)
+            for file_path, output_path in outputs.items():
+                before, after = os.path.getsize(file_path), os.path.getsize(output_path)
+                if after >= before:
+                    continue
+                send_map[file_path] = output_path
+                with self.stats_lock:
+                    self.stats["compressed"] += 1
+                    self.stats["bytes_before"] += before
+                    self.stats["bytes_after"] += after
+        except Exception:
+            # The chunk is sent uncompressed, so nobody else would release the directory
+            get_spool().release(output_dir)
+            raise
+        return send_map, output_dir
+
+    def is_accepted(self, file_path):
+        """Return True if the file is compressible and the destination is known to accept the target syntax"""
+        compressible, header = is_compressible(file_path)
+        return compressible and self.cache.lookup(
+            self.destination, header.sop_class_uid, self.transfer_syntax_uid
+        ) is True
+
+    def release(self, output_dir):
+        """Delete a chunk's compressed copies and let the next chunk be compressed"""
+        if output_dir:
+            get_spool().release(output_dir)
+        self.slots.release()
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.stats["compressed"]:
+            saved = 1 - self.stats["bytes_after"] / max(1, self.stats["bytes_before"])
+            logging.info(f"Compressed {self.stats['compressed']} files for {self.destination}, "
+                         f"{saved:.0%} fewer bytes on the wire")
@@ -0,0 +1,168 @@
+"""
+Concurrent sending over several associations with per-destination concurrency limits
+"""
+
+import math
+import logging
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from src.dicom.storescu_batch import DEFAULT_BATCH_SIZE, send_dicom_batch_using_dcm4che
+from src.dicom.send_daemon_pool import get_send_daemon
+from src.dicom.native.sender import send_multiple_dicom_native
+from src.utils.config import destination_key
+from src.dicom.grouping import split_by_study
+from src.dicom.compression import CompressionStage
+from src.dicom.prefetch import Prefetcher
+
+# Default number of parallel associations opened to one destination
+DEFAULT_MAX_ASSOCIATIONS = 4
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_max_associations(config_manager, host, port, ae_title):
+    """
+    Look up the number of parallel associations allowed for a destination.
+
+    The per-destination value in "destination_max_associations" wins over "max_associations".
+    """
+    limits = config_manager.get_value("destination_max_associations", {}) or {}
+    default = config_manager.get_value("max_associations", DEFAULT_MAX_ASSOCIATIONS)
+    return max(1, int(limits.get(destination_key(host, port, ae_title), default)))
+
+def get_destination_limiter(host, port, ae_title, limit):
+    """
+    Return the semaphore shared by every send to this destination in the process.
+
+    Concurrent jobs to the same destination together never open more than limit associations.
+    """
+    key = destination_key(host, port, ae_title)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None or limiter[0] != limit:
+            limiter = (limit, threading.BoundedSemaphore(limit))
+            _limiters[key] = limiter
+        return limiter[1]
+
+class OrderedProgress:
+    """Serialises progress callbacks from worker threads so counts never go backwards"""
+
+    def __init__(self, progress_callback, total):
+        self.progress_callback = progress_callback
+        self.total = total
+        self.completed = 0
+        self.lock = threading.Lock()
+
+    def advance(self, count, current_file):
+        with self.lock:
+            self.completed += count
+            if self.progress_callback:
+                self.progress_callback(self.completed, self.total, current_file)
+
+def send_chunk(backend, chunk, host, port, ae_title, dicom_tags):
+    """Send one chunk of files over a single association with the given backend"""
+    if backend == "native":
+        return send_multiple_dicom_native(chunk, host, port, ae_title, None, dicom_tags, batch_size=len(chunk))
+    if backend == "daemon":
+        return get_send_daemon().send(chunk, host, port, ae_title, dicom_tags)
+    return send_dicom_batch_using_dcm4che(chunk, host, port, ae_title, dicom_tags)
+
+def send_multiple_dicom_concurrently(file_paths, host, port, ae_title, progress_callback=None, dicom_tags=None,
+                                     batch_size=DEFAULT_BATCH_SIZE, max_associations=DEFAULT_MAX_ASSOCIATIONS,
+                                     backend="dcm4che", group_by_study=False):
+    """
+    Send multiple DICOM files over up to max_associations parallel associations.
+
+    Files are split into chunks of at most batch_size files, each sent over its own
+    association. Chunks are made smaller when needed so that every association gets work.
+    With group_by_study, chunks follow study boundaries instead. When "wan_compression"
+    is configured for the destination, images it is known to accept compressed are
+    compressed losslessly on separate threads while earlier chunks are being sent, and
+    with prefetching configured the files of upcoming chunks are read into the page cache.
+
+    Parameters:
+    - file_paths: List of paths to the DICOM files
+    - host: PACS server hostname/IP
+    - port: PACS server port
+    - ae_title: AE Title of the PACS server
+    - progress_callback: Optional callback(current, total, current_file), called in completion order
+    - dicom_tags: Dictionary of DICOM tags to modify
+    - batch_size: Maximum number of files sent over one association
+    - max_associations: Maximum parallel associations to this destination
+    - backend: "dcm4che", "daemon" or "native"
+    - group_by_study: Send each study over its own associations, in series and Instance Number
+      order, instead of splitting the files in the given order
+
+    Returns:
+    - Dictionary with results for each file, in the order of file_paths
+    """
+    total_files = len(file_paths)
+    if total_files == 0:
+        return {}
+    max_associations = max(1, int(max_associations or 1))
+    batch_size = max(1, int(batch_size or DEFAULT_BATCH_SIZE))
+    if group_by_study:
+        chunks = split_by_study(file_paths, batch_size)
+        prefetcher = Prefetcher.for_files([path for chunk in chunks for path in chunk], reorder=False)
+    else:
+        # Without study grouping the files are sent in directory and inode order when prefetching
+        prefetcher = Prefetcher.for_files(file_paths)
+        send_order = prefetcher.queue if prefetcher else file_paths
+        chunk_size = min(batch_size, math.ceil(total_files / max_associations))
+        chunks = [send_order[i:i + chunk_size] for i in range(0, total_files, chunk_size)]
+
+    limiter = get_destination_limiter(host, port, ae_title, max_associations)
+    progress = OrderedProgress(progress_callback, total_files)
+    progress.advance(0, "Starting...")
+
+    # Optional lossless compression runs on its own threads, ahead of the associations
+    stage = CompressionStage.for_destination(host, port, ae_title, max_ahead=2 * max_associations)
+
+    def run_chunk(chunk, compressed=None):
+        if prefetcher:
+            prefetcher.consume(chunk)
+        send_map, output_dir = compressed.result() if compressed else ({path: path for path in chunk}, None)
+        originals = {send_map[path]: path for path in chunk}
+        try:
+            with limiter:
+                sent = send_chunk(backend, [send_map[path] for path in chunk], host, port, ae_title, dicom_tags)
+        except Exception as e:
+            logging.error(f"Failed to send chunk of {len(chunk)} files: {str(e)}")
+            sent = {}
+        finally:
+            if stage:
+                stage.release(output_dir)
+        chunk_results = {}
+        for send_path, result in sent.items():
+            if send_path != originals.get(send_path, send_path):
+                result["transfer_syntax"] = stage.transfer_syntax_uid
+            chunk_results[originals.get(send_path, send_path)] = result
+        for file_path in chunk:
+            if file_path not in chunk_results:
+                chunk_results[file_path] = {
+                    "success": False,
+                    "output": "",
+                    "error": "No result reported for this file"
+                }
+        progress.advance(len(chunk), Path(chunk[-1]).name)
+        return chunk_results
+
+    logging.info(f"Sending {total_files} files to {destination_key(host, port, ae_title)} "
+                 f"in {len(chunks)} associations, up to {max_associations} in parallel")
+    collected = {}
+    try:
+        with ThreadPoolExecutor(max_workers=min(max_associations, len(chunks))) as executor:
+            futures = [executor.submit(run_chunk, chunk, stage.submit(chunk) if stage else None) for chunk in chunks]
+            for future in futures:
+                collected.update(future.result())
+    finally:
+        if stage:
+            stage.close()
+        if prefetcher:
+            prefetcher.close()
+
+    if progress_callback:
+        progress_callback(total_files, total_files, "Completed")
+
+    return {file_path: collected[file_path] for file_path in file_paths}
@@ -0,0 +1,117 @@
+"""
+Persistent per-destination cache of the presentation contexts a destination accepted or rejected
+"""
+
+import time
+import logging
+import threading
+from src.utils.config import ConfigManager
+from src.dicom.native.dimse import EXPLICIT_VR_LITTLE_ENDIAN, IMPLICIT_VR_LITTLE_ENDIAN
+
+# Seconds a cached negotiation result stays valid
+DEFAULT_CONTEXT_CACHE_TTL = 86400
+
+ACCEPTED = "acceptance"
+ABSTRACT_SYNTAX_NOT_SUPPORTED = "abstract-syntax-not-supported"
+
+# Transfer syntaxes every object can be transcoded to, in order of preference
+UNCOMPRESSED_TRANSFER_SYNTAXES = [EXPLICIT_VR_LITTLE_ENDIAN, IMPLICIT_VR_LITTLE_ENDIAN]
+
+SEND = "send"
+TRANSCODE = "transcode"
+SKIP = "skip"
+
+class PresentationContextCache:
+    """
+    Remembers, per destination, which (SOP class, transfer syntax) pairs were accepted.
+
+    The cache is stored beside config.json as
+    {destination: {sop_class_uid: {transfer_syntax_uid: {"result": ..., "checked": epoch}}}}
+    and entries older than the "context_cache_ttl" config value are ignored.
+    """
+
+    def __init__(self, config_manager=None):
+        self.config_manager = config_manager or ConfigManager()
+        self.ttl = self.config_manager.get_value("context_cache_ttl", DEFAULT_CONTEXT_CACHE_TTL)
+        self.entries = self.config_manager.load_context_cache()
+        self.lock = threading.Lock()
+
+    def _fresh(self, entry):
+        return self.ttl > 0 and time.time() - entry.get("checked", 0) < self.ttl
+
+    def lookup(self, destination, sop_class_uid, transfer_syntax_uid):
+        """
+        Look up a cached negotiation result.
+
+        Returns:
+        - True if accepted, False if rejected, None if unknown or expired
+        """
+        with self.lock:
+            entry = self.entries.get(destination, {}).get(sop_class_uid, {}).get(transfer_syntax_uid)
+        if entry is None or not self._fresh(entry):
+            return None
+        return entry["result"] == ACCEPTED
+
+    def sop_class_unsupported(self, destination, sop_class_uid):
+        """Return True if the destination recently rejected the SOP class itself"""
+        with self.lock:
+            entries = list(self.entries.get(destination, {}).get(sop_class_uid, {}).values())
+        return any(entry["result"] == ABSTRACT_SYNTAX_NOT_SUPPORTED and self._fresh(entry) for entry in entries)
+
+    def record(self, destination, accepted, rejected):
+        """
+        Store the outcome of a negotiation and save the cache.
+
+        Parameters:
+        - accepted: Iterable of (sop_class_uid, transfer_syntax_uid) pairs that were accepted
+        - rejected: Dictionary of (sop_class_uid, transfer_syntax_uid) to the rejection reason
+        """
+        now = time.time()
+        results = [(pair, ACCEPTED) for pair in accepted] + list(rejected.items())
+        with self.lock:
+            sop_classes = self.entries.setdefault(destination, {})
+            for (sop_class_uid, transfer_syntax_uid), result in results:
+                if sop_class_uid is None:
+                    continue
+                sop_classes.setdefault(sop_class_uid, {})[transfer_syntax_uid] = {"result": result, "checked": now}
+            if results:
+                self.config_manager.save_context_cache(self.entries)
+
+    def plan(self, destination, sop_class_uid, transfer_syntax_uid):
+        """
+        Decide before negotiating how an object should be sent.
+
+        Returns:
+        - (SEND, transfer_syntax) to send the file as it is
+        - (TRANSCODE, transfer_syntax) to convert it to an uncompressed syntax first
+        - (SKIP, reason) when the destination is known not to accept it at all
+        """
+        if self.sop_class_unsupported(destination, sop_class_uid):
+            return SKIP, f"{destination} does not support SOP Class {sop_class_uid} (cached)"
+        if self.lookup(destination, sop_class_uid, transfer_syntax_uid) is not False:
+            return SEND, transfer_syntax_uid
+        for target in UNCOMPRESSED_TRANSFER_SYNTAXES:
+            if target != transfer_syntax_uid and self.lookup(destination, sop_class_uid, target) is not False:
+                return TRANSCODE, target
+        return SKIP, f"{destination} accepts no transfer syntax for SOP Class {sop_class_uid} (cached)"
+
+    def clear(self, destination=None):
+        """Forget cached results for one destination, or for all of them"""
+        with self.lock:
+            if destination is None:
+                self.entries = {}
+            else:
+                self.entries.pop(destination, None)
+        return self.config_manager.clear_context_cache(destination)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_context_cache():
+    """Return the presentation context cache shared by every send in this process"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = PresentationContextCache()
+            logging.info(f"Loaded presentation context cache for {len(_cache.entries)} destination(s)")
+        return _cache
@@ -6,154 +6,94 @@ import os
 import subprocess
 import logging
 from pathlib import Path
-from src.utils.file_helpers import get_lib_dir
-from src.dicom.dicom_modifier import modify_dicom_tags, cleanup_temp_files
+from src.utils.file_helpers import link_or_copy
+from src.dicom.jvm import run_java, java_command, finish_java_command
+from src.dicom.coercion import coercion_edits, storescu_coercion_options, report_coercion
+from src.dicom.storescu_batch import send_multiple_dicom_in_batches, get_storescu_classpath
+from src.dicom.storescu_output import parse_echo_output, store_result_from_output
+from src.dicom.transport import get_transport_tuner, storescu_transport_options
 
 def send_dicom_using_dcm4che(file_path, host, port, ae_title, dicom_tags=None):
     """
     Send DICOM file using dcm4che storescu tool.
     
+    Tags are coerced by StoreSCU while it sends the dataset, so no modified copy is written.
+    
     Parameters:
     - file_path: Path to the DICOM file
     - host: PACS server hostname/IP
     - port: PACS server port
     - ae_title: AE Title of the PACS server
-    - dicom_tags: Dictionary of DICOM tags to modify (e.g., {"PatientID": "12345", "PatientName": "ANONYMOUS"})
+    - dicom_tags: Dictionary of DICOM tags to modify (e.g., {"00100020": "12345", "00100010": "ANONYMOUS"})
     
     Returns:
     - subprocess.CompletedProcess object with stdout and stderr
     """
-    # If we have tags to modify, use the Java-based modifier
-    temp_file = None
-    if dicom_tags and isinstance(dicom_tags, dict):
-        modified_file = modify_dicom_tags(file_path, dicom_tags)
-        if modified_file:
-            temp_file = modified_file
-            file_path = modified_file
-            logging.info(f"Using modified DICOM file: {file_path}")
-        else:
-            logging.warning("Failed to modify DICOM tags, proceeding with original file")
+    # Build the command; StoreSCU applies the tag modifications as it streams the dataset
+    cmd = [
+        "java", "-cp", get_storescu_classpath(),
+        "org.dcm4che3.tool.storescu.StoreSCU",
+        "-c", f"{ae_title}@{host}:{port}",
+        *storescu_transport_options(get_transport_tuner().settings(host, port, ae_title)),
+        *storescu_coercion_options(dicom_tags),
+        "--", # Add a separator to indicate end of options
+        file_path
+    ]
     
-    try:
-        # Use the classpath approach for better control
-        lib_dir = get_lib_dir()
-        
-        # Build classpath with all necessary JARs
-        classpath = os.pathsep.join([
-            os.path.join(lib_dir, "dcm4che-core-5.33.1.jar"),
-            os.path.join(lib_dir, "dcm4che-net-5.33.1.jar"),
-            os.path.join(lib_dir, "dcm4che-tool-common-5.33.1.jar"),
-            os.path.join(lib_dir, "commons-cli-1.9.0.jar"),
-            os.path.join(lib_dir, "slf4j-api-2.0.16.jar"),
-            os.path.join(lib_dir, "logback-core-1.5.12.jar"),
-            os.path.join(lib_dir, "logback-classic-1.5.12.jar"),
-            # The main storescu JAR
-            os.path.join(lib_dir, "dcm4che-tool-storescu-5.33.1.jar")
-        ])
-        
-        # Build the command - no longer need tag modification options
-        cmd = [
-            "java", "-cp", classpath,
-            "org.dcm4che3.tool.storescu.StoreSCU",
-            "-c", f"{ae_title}@{host}:{port}",
-            "--", # Add a separator to indicate end of options
-            file_path
-        ]
-        
-        logging.info(f"Executing command: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        # Clean up temporary file if we created one
-        if temp_file:
-            cleanup_temp_files(temp_file)
-            
-        return result
-        
-    except Exception as e:
-        # Clean up temporary file if an exception occurred
-        if temp_file:
-            cleanup_temp_files(temp_file)
-        raise e
+    logging.info(f"Executing command: {' '.join(cmd)}")
+    return run_java("storescu", cmd, capture_output=True, text=True)
 
 def send_dicom_using_dcm4che_alt(file_path, host, port, ae_title, dicom_tags=None):
     """
-    Alternative implementation of the DICOM sender using shell=True for complex command handling.
+    Alternative implementation of the DICOM sender passing an absolute file path with normalized slashes.
+    
+    Tags are coerced by StoreSCU while it sends the dataset, so no modified copy is written.
     
     Parameters:
     - file_path: Path to the DICOM file
     - host: PACS server hostname/IP
     - port: PACS server port
     - ae_title: AE Title of the PACS server
-    - dicom_tags: Dictionary of DICOM tags to modify (e.g., {"PatientID": "12345", "PatientName": "ANONYMOUS"})
+    - dicom_tags: Dictionary of DICOM tags to modify (e.g., {"00100020": "12345", "00100010": "ANONYMOUS"})
     
     Returns:
     - subprocess.CompletedProcess object with stdout and stderr
     """
-    # If we have tags to modify, use the Java-based modifier
-    temp_file = None
-    if dicom_tags and isinstance(dicom_tags, dict):
-        modified_file = modify_dicom_tags(file_path, dicom_tags)
-        if modified_file:
-            temp_file = modified_file
-            file_path = modified_file
-            logging.info(f"Using modified DICOM file: {file_path}")
-        else:
-            logging.warning("Failed to modify DICOM tags, proceeding with original file")
+    # Convert file path to absolute path with normalized slashes
+    abs_file_path = os.path.abspath(file_path).replace('\\', '/')
     
-    try:
-        # Use the classpath approach for better control
-        lib_dir = get_lib_dir()
-        
-        # Build classpath with all necessary JARs
-        classpath = os.pathsep.join([
-            os.path.join(lib_dir, "dcm4che-core-5.33.1.jar"),
-            os.path.join(lib_dir, "dcm4che-net-5.33.1.jar"),
-            os.path.join(lib_dir, "dcm4che-tool-common-5.33.1.jar"),
-            os.path.join(lib_dir, "commons-cli-1.9.0.jar"),
-            os.path.join(lib_dir, "slf4j-api-2.0.16.jar"),
-            os.path.join(lib_dir, "logback-core-1.5.12.jar"),
-            os.path.join(lib_dir, "logback-classic-1.5.12.jar"),
-            os.path.join(lib_dir, "dcm4che-tool-storescu-5.33.1.jar")
-        ])
-        
-        # Convert file path to absolute path with normalized slashes
-        abs_file_path = os.path.abspath(file_path).replace('\\', '/')
-        
-        # Build command parts for better control
-        cmd_parts = []
-        cmd_parts.append('java')
-        cmd_parts.append('-cp')
-        cmd_parts.append(f'"{classpath}"')
-        cmd_parts.append('org.dcm4che3.tool.storescu.StoreSCU')
-        cmd_parts.append('-c')
-        cmd_parts.append(f'{ae_title}@{host}:{port}')
-        
-        # We no longer need to add tag modification options as we've already modified the file
-        cmd_parts.append(f'"{abs_file_path}"')
-        
-        # Join all parts with spaces
-        cmd = ' '.join(cmd_parts)
-        
-        logging.info(f"Executing command: {cmd}")
-        
-        # Using shell=True to handle the complex command
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-        
-        # Clean up temporary file if we created one
-        if temp_file:
-            cleanup_temp_files(temp_file)
-            
-        return result
-        
-    except Exception as e:
-        # Clean up temporary file if an exception occurred
-        if temp_file:
-            cleanup_temp_files(temp_file)
-        raise e
+    # Build the command as a list, so no part of it needs quoting
+    cmd = [
+        "java", "-cp", get_storescu_classpath(),
+        "org.dcm4che3.tool.storescu.StoreSCU",
+        "-c", f"{ae_title}@{host}:{port}",
+        *storescu_transport_options(get_transport_tuner().settings(host, port, ae_title)),
+        # Tag modifications are applied by StoreSCU in flight
+        *storescu_coercion_options(dicom_tags),
+        abs_file_path
+    ]
+    
+    logging.info(f"Executing command: {' '.join(cmd)}")
+    return run_java("storescu", cmd, capture_output=True, text=True)
+
+def build_echo_command(host, port, ae_title):
+    """
+    Build the StoreSCU command that sends a C-ECHO (StoreSCU run without files).
+    
+    Returns:
+    - The plain ["java", ...] command
+    """
+    # Simply try to associate with the server and report success if connection is established
+    return [
+        "java", "-cp", get_storescu_classpath(),
+        "org.dcm4che3.tool.storescu.StoreSCU",
+        "-b", "DICOM_SENDER", # Use a local AE title
+        "-c", f"{ae_title}@{host}:{port}"
+    ]
 
 def echo_dicom_using_dcm4che(host, port, ae_title):
     """
-    Send DICOM echo using a simplified approach.
+    Send a DICOM C-ECHO by running StoreSCU without files.
     
     Parameters:
     - host: PACS server hostname/IP
@@ -163,34 +103,13 @@ def echo_dicom_using_dcm4che(host, port, ae_title):
     Returns:
     - subprocess.CompletedProcess object with stdout and stderr
     """
-    lib_dir = get_lib_dir()
-    
-    # Build classpath with all necessary JARs
-    classpath = os.pathsep.join([
-        os.path.join(lib_dir, "dcm4che-core-5.33.1.jar"),
-        os.path.join(lib_dir, "dcm4che-net-5.33.1.jar"),
-        os.path.join(lib_dir, "dcm4che-tool-common-5.33.1.jar"),
-        os.path.join(lib_dir, "commons-cli-1.9.0.jar"),
-        os.path.join(lib_dir, "slf4j-api-2.0.16.jar"),
-        os.path.join(lib_dir, "logback-core-1.5.12.jar"),
-        os.path.join(lib_dir, "logback-classic-1.5.12.jar"),
-        os.path.join(lib_dir, "dcm4che-tool-storescu-5.33.1.jar") 
-    ])
-    
-    # Simply try to associate with the server and report success if connection is established
-    cmd = [
-        "java", "-cp", classpath,
-        "org.dcm4che3.tool.storescu.StoreSCU",
-        "-b", "DICOM_SENDER", # Use a local AE title
-        "-c", f"{ae_title}@{host}:{port}"
-    ]
+    cmd = build_echo_command(host, port, ae_title)
     
     logging.info(f"Executing command: {' '.join(cmd)}")
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        # If we can connect and see "Connected to" in the output, consider it a successful echo
-        if "Connected to" in result.stdout:
-            result.returncode = 0  # Mark as successful
+        result = run_java("storescu", cmd, capture_output=True, text=True)
+        # Success is the status of the C-ECHO response, not just an established connection
+        result.returncode = 0 if parse_echo_output(result.stdout + "\n" + result.stderr)["success"] else 1
         return result
     except Exception as e:
         # Create a CompletedProcess-like object to return in case of error
@@ -202,7 +121,7 @@ def echo_dicom_using_dcm4che(host, port, ae_title):
         
         return ErrorResult(e)
 
-def send_multiple_dicom_using_dcm4che(file_paths, host, port, ae_title, progress_callback=None, dicom_tags=None):
+def send_multiple_dicom_using_dcm4che(file_paths, host, port, ae_title, progress_callback=None, dicom_tags=None, batch_size=None):
     """
     Send multiple DICOM files using dcm4che storescu tool.
     
@@ -213,12 +132,17 @@ def send_multiple_dicom_using_dcm4che(file_paths, host, port, ae_title, progress
     - ae_title: AE Title of the PACS server
     - progress_callback: Optional callback function to update progress
     - dicom_tags: Dictionary of DICOM tags to modify (e.g., {"PatientID": "12345", "PatientName": "ANONYMOUS"})
+    - batch_size: If set, send up to this many files per StoreSCU invocation and association
     
     Returns:
     - Dictionary with results for each file
     """
+    if batch_size:
+        return send_multiple_dicom_in_batches(file_paths, host, port, ae_title, progress_callback, dicom_tags, batch_size)
+    
     results = {}
     total_files = len(file_paths)
+    coerced = coercion_edits(dicom_tags)
     
     for i, file_path in enumerate(file_paths):
         try:
@@ -226,37 +150,15 @@ def send_multiple_dicom_using_dcm4che(file_paths, host, port, ae_title, progress
             if progress_callback:
                 progress_callback(i, total_files, Path(file_path).name)
                 
-            # Use the classpath approach for better control
-            lib_dir = get_lib_dir()
-            
-            # Build classpath with all necessary JARs
-            classpath = os.pathsep.join([
-                os.path.join(lib_dir, "dcm4che-core-5.33.1.jar"),
-                os.path.join(lib_dir, "dcm4che-net-5.33.1.jar"),
-                os.path.join(lib_dir, "dcm4che-tool-common-5.33.1.jar"),
-                os.path.join(lib_dir, "commons-cli-1.9.0.jar"),
-                os.path.join(lib_dir, "slf4j-api-2.0.16.jar"),
-                os.path.join(lib_dir, "logback-core-1.5.12.jar"),
-                os.path.join(lib_dir, "logback-classic-1.5.12.jar"),
-                # The main storescu JAR
-                os.path.join(lib_dir, "dcm4che-tool-storescu-5.33.1.jar")
-            ])
-            
             # Build the command
             cmd = [
-                "java", "-cp", classpath,
+                "java", "-cp", get_storescu_classpath(),
                 "org.dcm4che3.tool.storescu.StoreSCU",
                 "-c", f"{ae_title}@{host}:{port}"
-            ]
+            ] + storescu_transport_options(get_transport_tuner().settings(host, port, ae_title))
             
-            # Add tag modification options if provided
-            if dicom_tags and isinstance(dicom_tags, dict):
-                for tag_name, tag_value in dicom_tags.items():
-                    # Only add if the tag has a value
-                    if tag_value:
-                        # Add each argument separately to let subprocess handle escaping
-                        cmd.append("-s")
-                        cmd.append(f"{tag_name}={tag_value}")
+            # Tag modifications are applied by StoreSCU in flight; each argument is passed separately
+            cmd += storescu_coercion_options(dicom_tags)
             
             # We need to make sure the file path is the last argument
             # and is properly passed as a string, not split by spaces
@@ -264,14 +166,12 @@ def send_multiple_dicom_using_dcm4che(file_paths, host, port, ae_title, progress
             cmd.append(file_path)
             
             logging.info(f"Executing command: {' '.join(cmd)}")
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            result = run_java("storescu", cmd, capture_output=True, text=True)
             
             # Store results
-            results[file_path] = {
-                "success": result.returncode == 0,
-                "output": result.stdout,
-                "error": result.stderr
-            }
+            results[file_path] = report_coercion(
+                store_result_from_output(file_path, result.stdout, result.stderr, result.returncode), coerced
+            )
             
         except Exception as e:
             results[file_path] = {
@@ -286,9 +186,9 @@ def send_multiple_dicom_using_dcm4che(file_paths, host, port, ae_title, progress
         
     return results
 
-def send_multiple_dicom_using_dcm4che_alt(file_paths, host, port, ae_title, progress_callback=None, dicom_tags=None):
+def send_multiple_dicom_using_dcm4che_alt(file_paths, host, port, ae_title, progress_callback=None, dicom_tags=None, batch_size=None):
     """
-    Alternative implementation for sending multiple DICOM files using shell=True.
+    Alternative implementation for sending multiple DICOM files, one send_dicom_using_dcm4che_alt per file.
     
     Parameters:
     - file_paths: List of paths to the DICOM files
@@ -297,12 +197,17 @@ def send_multiple_dicom_using_dcm4che_alt(file_paths, host, port, ae_title, prog
     - ae_title: AE Title of the PACS server
     - progress_callback: Optional callback function to update progress
     - dicom_tags: Dictionary of DICOM tags to modify (e.g., {"PatientID": "12345", "PatientName": "ANONYMOUS"})
+    - batch_size: If set, send up to this many files per StoreSCU invocation and association
     
     Returns:
     - Dictionary with results for each file
     """
+    if batch_size:
+        return send_multiple_dicom_in_batches(file_paths, host, port, ae_title, progress_callback, dicom_tags, batch_size)
+    
     results = {}
     total_files = len(file_paths)
+    coerced = coercion_edits(dicom_tags)
     
     for i, file_path in enumerate(file_paths):
         try:
@@ -314,11 +219,9 @@ def send_multiple_dicom_using_dcm4che_alt(file_paths, host, port, ae_title, prog
             result = send_dicom_using_dcm4che_alt(file_path, host, port, ae_title, dicom_tags)
             
             # Store results
-            results[file_path] = {
-                "success": result.returncode == 0,
-                "output": result.stdout,
-                "error": result.stderr
-            }
+            results[file_path] = report_coercion(
+                store_result_from_output(file_path, result.stdout, result.stderr, result.returncode), coerced
+            )
             
         except Exception as e:
             results[file_path] = {
@@ -354,20 +257,12 @@ def send_dicom_using_dcm4che_batch(file_path, host, port, ae_title, dicom_tags=N
     # Generate a random identifier for the temp files
     random_id = ''.join(random.choice(string.ascii_letters) for _ in range(8))
     
-    # Use the classpath approach for better control
-    lib_dir = get_lib_dir()
-    
-    # Build classpath with all necessary JARs
-    classpath = os.pathsep.join([
-        os.path.join(lib_dir, "dcm4che-core-5.33.1.jar"),
-        os.path.join(lib_dir, "dcm4che-net-5.33.1.jar"),
-        os.path.join(lib_dir, "dcm4che-tool-common-5.33.1.jar"),
-        os.path.join(lib_dir, "commons-cli-1.9.0.jar"),
-        os.path.join(lib_dir, "slf4j-api-2.0.16.jar"),
-        os.path.join(lib_dir, "logback-core-1.5.12.jar"),
-        os.path.join(lib_dir, "logback-classic-1.5.12.jar"),
-        os.path.join(lib_dir, "dcm4che-tool-storescu-5.33.1.jar")
-    ])
+    classpath = get_storescu_classpath()
+    
+    # Startup options of the JVM (archive and launch flags), quoted for the batch file
+    java_cmd = ["java", "-cp", classpath, "org.dcm4che3.tool.storescu.StoreSCU"]
+    full_cmd, dump_path = java_command("storescu", java_cmd)
+    java_options = " ".join(f'"{option}"' for option in full_cmd[1:len(full_cmd) - len(java_cmd) + 1])
     
     # Create a temporary batch file
     with tempfile.NamedTemporaryFile(suffix=".bat", delete=False, mode='w') as batch_file:
@@ -375,25 +270,24 @@ def send_dicom_using_dcm4che_batch(file_path, host, port, ae_title, dicom_tags=N
         
         # Write the command to the batch file
         batch_file.write(f'@echo off\n')
-        batch_file.write(f'java -cp "{classpath}" org.dcm4che3.tool.storescu.StoreSCU -c {ae_title}@{host}:{port}')
+        batch_file.write(f'java {java_options} -cp "{classpath}" org.dcm4che3.tool.storescu.StoreSCU -c {ae_title}@{host}:{port}')
+        for option in storescu_transport_options(get_transport_tuner().settings(host, port, ae_title)):
+            batch_file.write(f' {option}')
         
         # Add tag modification options if provided
-        if dicom_tags and isinstance(dicom_tags, dict):
-            for tag_name, tag_value in dicom_tags.items():
-                if tag_value:
-                    if ' ' in tag_value:
-                        batch_file.write(f' -s {tag_name}="{tag_value}"')
-                    else:
-                        batch_file.write(f' -s {tag_name}={tag_value}')
+        for tag_name, tag_value in coercion_edits(dicom_tags).items():
+            if ' ' in tag_value:
+                batch_file.write(f' -s {tag_name}="{tag_value}"')
+            else:
+                batch_file.write(f' -s {tag_name}={tag_value}')
         
         # Create a copy of the file with a standard name
         temp_dir = tempfile.gettempdir()
         dicom_temp_filename = f"dicom_{random_id}.dcm"
         dicom_temp_path = os.path.join(temp_dir, dicom_temp_filename)
         
-        # Copy the DICOM file to the temporary location
-        import shutil
-        shutil.copy2(file_path, dicom_temp_path)
+        # Link the DICOM file into the temporary location (copied only across file systems)
+        link_or_copy(file_path, dicom_temp_path)
         
         # Add the file path to the batch command
         batch_file.write(f' "{dicom_temp_path}"\n')
@@ -405,7 +299,10 @@ def send_dicom_using_dcm4che_batch(file_path, host, port, ae_title, dicom_tags=N
     
     # Execute the batch file
     logging.info(f"Executing batch file: {batch_file_path}")
-    process = subprocess.run(batch_file_path, shell=True, capture_output=True, text=True)
+    try:
+        process = subprocess.run(batch_file_path, shell=True, capture_output=True, text=True)
+    finally:
+        finish_java_command("storescu", full_cmd, dump_path)
     
     # Read the output and error files
     try:
@@ -424,8 +321,8 @@ def send_dicom_using_dcm4che_batch(file_path, host, port, ae_title, dicom_tags=N
             self.stdout = stdout
             self.stderr = stderr
     
-    # Determine return code based on stderr content
-    return_code = 0 if not stderr.strip() else 1
+    # Determine return code from the C-STORE status, or from stderr if StoreSCU logged no response
+    return_code = 0 if store_result_from_output(file_path, stdout, stderr, 0 if not stderr.strip() else 1)["success"] else 1
     result = BatchResult(return_code, stdout, stderr)
     
     # Clean up temporary files
@@ -440,7 +337,7 @@ def send_dicom_using_dcm4che_batch(file_path, host, port, ae_title, dicom_tags=N
     
     return result
 
-def send_multiple_dicom_using_dcm4che_batch(file_paths, host, port, ae_title, progress_callback=None, dicom_tags=None):
+def send_multiple_dicom_using_dcm4che_batch(file_paths, host, port, ae_title, progress_callback=None, dicom_tags=None, batch_size=None):
     """
     Implementation for sending multiple DICOM files using the batch file approach.
     
@@ -451,12 +348,17 @@ def send_multiple_dicom_using_dcm4che_batch(file_paths, host, port, ae_title, pr
     - ae_title: AE Title of the PACS server
     - progress_callback: Optional callback function to update progress
     - dicom_tags: Dictionary of DICOM tags to modify (e.g., {"PatientID": "12345", "PatientName": "ANONYMOUS"})
+    - batch_size: If set, send up to this many files per StoreSCU invocation and association
     
     Returns:
     - Dictionary with results for each file
     """
+    if batch_size:
+        return send_multiple_dicom_in_batches(file_paths, host, port, ae_title, progress_callback, dicom_tags, batch_size)
+    
     results = {}
     total_files = len(file_paths)
+    coerced = coercion_edits(dicom_tags)
     
     for i, file_path in enumerate(file_paths):
         try:
@@ -468,11 +370,9 @@ def send_multiple_dicom_using_dcm4che_batch(file_paths, host, port, ae_title, pr
             result = send_dicom_using_dcm4che_batch(file_path, host, port, ae_title, dicom_tags)
             
             # Store results
-            results[file_path] = {
-                "success": result.returncode == 0,
-                "output": result.stdout,
-                "error": result.stderr
-            }
+            results[file_path] = report_coercion(
+                store_result_from_output(file_path, result.stdout, result.stderr, result.returncode), coerced
+            )
             
         except Exception as e:
             results[file_path] = {
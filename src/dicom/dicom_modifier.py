@@ -2,42 +2,164 @@
 Python interface to the Java-based DICOM tag modifier
 """
 import os
+import time
+import glob
+import zipfile
 import subprocess
 import logging
-import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from pathlib import Path
+from src.utils.config import ConfigManager
 from src.utils.file_helpers import get_lib_dir
+from src.dicom.jvm import run_java, get_cds_dir
+from src.dicom.spool import get_spool
+from src.dicom.modifier_manifest import modify_files_in_jvm
+from src.dicom.python_modifier import (
+    DEFAULT_MODIFIER_BACKEND, UnsupportedFile, modifier_backend_for, modify_dicom_tags_python, remove_partial_output
+)
 
-def modify_dicom_tags(input_file, dicom_tags):
+# Worker threads of a batch DicomModifier JVM ("modifier_threads")
+DEFAULT_MODIFIER_THREADS = 4
+
+# Option only found in classes built with the manifest batch mode
+MANIFEST_MODE_MARKER = b"--manifest"
+
+# Modification times of DicomModifier.java and .class at the last check, and its outcome
+_modifier_check = None
+
+def is_dicom_modifier_current(java_dir):
+    """Whether DicomModifier.class was built from a source with the manifest batch mode"""
+    class_file = os.path.join(java_dir, "DicomModifier.class")
+    if not os.path.exists(class_file):
+        return False
+    with open(class_file, "rb") as f:
+        return MANIFEST_MODE_MARKER in f.read()
+
+def ensure_dicom_modifier_current():
+    """
+    Rebuild DicomModifier when its class is older than DicomModifier.java or predates
+    the manifest batch mode.
+    
+    Returns:
+    - None if the class is current, otherwise an error message
+    """
+    java_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "java")
+    source_file = os.path.join(java_dir, "DicomModifier.java")
+    class_file = os.path.join(java_dir, "DicomModifier.class")
+    global _modifier_check
+    key = tuple(os.path.getmtime(path) if os.path.exists(path) else None for path in (source_file, class_file))
+    if _modifier_check and _modifier_check[0] == key:
+        return _modifier_check[1]
+    
+    current = is_dicom_modifier_current(java_dir)
+    # Checkouts do not keep modification times, so a newer source only prompts a rebuild
+    stale = key[0] is not None and (key[1] is None or key[0] > key[1])
+    error = None
+    if stale or not current:
+        logging.info("DicomModifier.class is older than DicomModifier.java, rebuilding it")
+        if build_dicom_modifier() and is_dicom_modifier_current(java_dir):
+            current = True
+        elif current:
+            logging.warning("Could not rebuild DicomModifier, using the existing class")
+        else:
+            error = (f"DicomModifier is out of date: {class_file} has no --manifest mode. "
+                     "Rebuild it from DicomModifier.java with src/java/build.bat")
+    
+    # Check again only once either file changes
+    key = tuple(os.path.getmtime(path) if os.path.exists(path) else None for path in (source_file, class_file))
+    _modifier_check = (key, error)
+    return error
+
+def get_dicom_modifier_classpath():
+    """
+    Build the classpath for the DicomModifier utility.
+    
+    The compiled classes are packaged into a jar under lib/cds, since class data sharing
+    archives only cover classes loaded from jars. Library jars are listed in sorted
+    order so the classpath, and with it the archive, stays the same between runs.
+    
+    Returns:
+    - The classpath, or None if DicomModifier is not built
+    """
+    java_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "java")
+    error = ensure_dicom_modifier_current()
+    if error:
+        # Classes from before the manifest mode still handle single files
+        logging.warning(error)
+    classes = sorted(glob.glob(os.path.join(java_dir, "DicomModifier*.class")))
+    if not classes:
+        logging.error(f"DICOM Modifier utility not built in: {java_dir}")
+        return None
+    
+    jar_path = os.path.join(get_cds_dir(), "dicom-modifier.jar")
+    newest_class = max(os.path.getmtime(path) for path in classes)
+    if not os.path.exists(jar_path) or os.path.getmtime(jar_path) < newest_class:
+        os.makedirs(get_cds_dir(), exist_ok=True)
+        temp_jar = f"{jar_path}.{os.getpid()}.tmp"
+        with zipfile.ZipFile(temp_jar, "w") as jar:
+            jar.writestr("META-INF/MANIFEST.MF", "Manifest-Version: 1.0\r\n\r\n")
+            for path in classes:
+                jar.write(path, os.path.basename(path))
+        os.replace(temp_jar, jar_path)
+    
+    return os.pathsep.join([jar_path] + sorted(glob.glob(os.path.join(get_lib_dir(), "*.jar"))))
+
+def modify_dicom_tags(input_file, dicom_tags, backend=None, output_file=None):
     """
-    Modify DICOM tags in a file using the Java DicomModifier utility.
+    Modify DICOM tags in a file using the Java DicomModifier utility, or in Python.
+    
+    With "tag_modifier_backend" set to "auto" (the default), simple edits such as the
+    PatientID, PatientName and UIDs set by the GUI are applied in this process by
+    modify_dicom_tags_python, which saves starting a JVM; other edits, and files the
+    Python path cannot pass through, go to DicomModifier.
     
     Parameters:
     - input_file: Path to the input DICOM file
     - dicom_tags: Dictionary of DICOM tags to modify (e.g., {"00100020": "12345"})
+    - backend: "auto", "java" or "python" (default: "tag_modifier_backend" from the configuration)
+    - output_file: Where to write the modified file (default: a unique spool file, which
+      waits for room in the spool budget; pass it to cleanup_temp_files when done)
     
     Returns:
-    - Path to the modified DICOM file (temporary file) or None if failed
+    - Path to the modified DICOM file (spool file unless output_file is given) or None if failed
     """
     if not dicom_tags or not isinstance(dicom_tags, dict):
         logging.info("No DICOM tags to modify, returning original file")
         return input_file
     
-    # Create a temporary file for the output
-    temp_dir = tempfile.gettempdir()
-    temp_file = os.path.join(temp_dir, f"modified_{os.path.basename(input_file)}")
+    backend = modifier_backend_for(
+        dicom_tags, backend or ConfigManager().get_value("tag_modifier_backend", DEFAULT_MODIFIER_BACKEND)
+    )
     
-    # Get path to the Java utility
-    java_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "java")
-    run_script = os.path.join(java_dir, "run_dicom_modifier.bat")
+    # Spool the output under a unique name, so concurrent jobs on files of the same name do not collide
+    temp_file = output_file or get_spool().create(
+        prefix="modified_", suffix=f"_{os.path.basename(input_file)}", size=os.path.getsize(input_file) if os.path.isfile(input_file) else 0
+    )
+    output = _modify_dicom_tags(input_file, dicom_tags, backend, temp_file)
+    if output is None and not output_file:
+        cleanup_temp_files(temp_file)
+    return output
+
+def _modify_dicom_tags(input_file, dicom_tags, backend, temp_file):
+    """Modify the tags of input_file into temp_file with the resolved backend"""
+    if backend == "python":
+        try:
+            return modify_dicom_tags_python(input_file, dicom_tags, temp_file)
+        except UnsupportedFile as e:
+            logging.info(f"Modifying {input_file} with DicomModifier: {str(e)}")
+        except Exception as e:
+            remove_partial_output(temp_file)
+            logging.error(f"Error modifying DICOM tags in Python: {str(e)}")
+            return None
     
-    # Check if the utility exists
-    if not os.path.exists(run_script):
-        logging.error(f"DICOM Modifier utility not found at: {run_script}")
+    # Get the classpath of the Java utility
+    classpath = get_dicom_modifier_classpath()
+    if classpath is None:
         return None
     
-    # Prepare the command
-    cmd = [run_script, input_file, temp_file]
+    # Prepare the command, the same one run_dicom_modifier.bat runs
+    cmd = ["java", "-cp", classpath, "DicomModifier", input_file, temp_file]
     
     # Add the tag modifications
     for tag_name, tag_value in dicom_tags.items():
@@ -47,7 +169,7 @@ def modify_dicom_tags(input_file, dicom_tags):
     # Run the command
     logging.info(f"Modifying DICOM tags using Java utility: {' '.join(cmd)}")
     try:
-        process = subprocess.run(cmd, capture_output=True, text=True)
+        process = run_java("dicom-modifier", cmd, capture_output=True, text=True)
         
         if process.returncode == 0:
             logging.info(f"Successfully modified DICOM tags, output saved to: {temp_file}")
@@ -59,6 +181,70 @@ def modify_dicom_tags(input_file, dicom_tags):
         logging.error(f"Error running DICOM modifier: {str(e)}")
         return None
 
+def modify_dicom_files(jobs, threads=None, on_result=None, backend=None):
+    """
+    Modify many files, each with its own edits and output path.
+    
+    Files whose edits modify_dicom_tags would apply in Python are modified in this
+    process on a pool of threads, splicing the edited header in front of the untouched
+    rest of the file; all others are then modified in a single DicomModifier JVM.
+    
+    Parameters:
+    - jobs: Iterable of (input_file, output_file, dicom_tags)
+    - threads: Worker threads (default: "modifier_threads" from the configuration)
+    - on_result: Optional callback(input_file, result) called as each file completes
+    - backend: "auto", "java" or "python" (default: "tag_modifier_backend" from the configuration)
+    
+    Returns:
+    - Dictionary with a result for each input file: success, output_file, ms and error
+    """
+    config_manager = ConfigManager()
+    threads = threads or config_manager.get_value("modifier_threads", DEFAULT_MODIFIER_THREADS)
+    backend = backend or config_manager.get_value("tag_modifier_backend", DEFAULT_MODIFIER_BACKEND)
+    if backend == "java":
+        return modify_files_in_jvm(jobs, threads, on_result)
+    
+    results = {}
+    deferred = []
+    lock = threading.Lock()
+    
+    def modify(input_file, output_file, dicom_tags):
+        start = time.perf_counter()
+        try:
+            modify_dicom_tags_python(input_file, dicom_tags, output_file)
+            result = {"success": True, "output_file": output_file, "ms": None, "error": ""}
+        except UnsupportedFile as e:
+            if backend != "python":
+                with lock:
+                    deferred.append((input_file, output_file, dicom_tags))
+                return
+            result = {"success": False, "output_file": output_file, "ms": None, "error": str(e)}
+        except Exception as e:
+            remove_partial_output(output_file)
+            result = {"success": False, "output_file": output_file, "ms": None, "error": str(e)}
+        result["ms"] = int((time.perf_counter() - start) * 1000)
+        # Callbacks are serialized, as they are when results come from the JVM
+        with lock:
+            results[input_file] = result
+            if on_result:
+                on_result(input_file, result)
+    
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        in_flight = set()
+        for input_file, output_file, dicom_tags in jobs:
+            if modifier_backend_for(dicom_tags, backend) != "python":
+                deferred.append((input_file, output_file, dicom_tags))
+                continue
+            # Keep a generator of jobs from being read far ahead of the workers
+            if len(in_flight) >= threads * 4:
+                _, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            in_flight.add(executor.submit(modify, input_file, output_file, dicom_tags))
+    
+    if deferred:
+        logging.info(f"Modifying {len(deferred)} files with DicomModifier")
+        results.update(modify_files_in_jvm(deferred, threads, on_result))
+    return results
+
 def build_dicom_modifier():
     """
     Build the Java DICOM modifier utility
@@ -88,7 +274,10 @@ def build_dicom_modifier():
         return False
 
 def cleanup_temp_files(temp_file):
-    """Clean up temporary files created by the DICOM modifier"""
+    """Clean up temporary files created by the DICOM modifier, freeing their share of the spool budget"""
+    if temp_file and get_spool().release(temp_file):
+        logging.info(f"Removed temporary file: {temp_file}")
+        return
     if temp_file and os.path.exists(temp_file):
         try:
             os.remove(temp_file)
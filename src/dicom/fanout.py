@@ -0,0 +1,192 @@
+"""
+Fan-out sending: one discovery pass, delivered to several destinations concurrently
+"""
+
+import queue
+import logging
+import threading
+from pathlib import Path
+from src.dicom.concurrent_send import send_multiple_dicom_concurrently, get_max_associations
+from src.dicom.send_journal import instance_key
+from src.dicom.storescu_batch import DEFAULT_BATCH_SIZE
+from src.dicom.retry import with_retries
+from src.dicom.grouping import sort_by_study
+from src.dicom.storescu_output import summarize_throughput, format_throughput
+from src.utils.config import ConfigManager, destination_key
+
+# Files handed to each destination at a time
+DEFAULT_FANOUT_CHUNK_SIZE = 500
+
+# Chunks that may wait in a destination's queue before no further chunks are read
+DEFAULT_FANOUT_MAX_LEAD = 4
+
+def send_to_destinations(file_paths, destinations, progress_callback=None, dicom_tags=None,
+                         batch_size=DEFAULT_BATCH_SIZE, max_associations=None,
+                         backend="dcm4che", retry_policy=None, journal=None, resume=False,
+                         chunk_size=DEFAULT_FANOUT_CHUNK_SIZE, group_by_study=False,
+                         max_lead=DEFAULT_FANOUT_MAX_LEAD):
+    """
+    Send the same files to several destinations in parallel.
+
+    Files are processed in chunks, which each destination's own worker takes from its own
+    queue. A slow or failing destination only delays itself until max_lead chunks wait
+    for it; then no further chunks are read until it catches up, so each file is still
+    read from disk once and served to the other destinations from the page cache.
+
+    Every backend applies tag modifications in flight, so no modified copies are written.
+
+    Parameters:
+    - file_paths: List of paths to the DICOM files
+    - destinations: List of (host, port, ae_title)
+    - progress_callback: Optional callback(current, total, current_file), counted in files
+      delivered to all destinations
+    - dicom_tags: Dictionary of DICOM tags to modify
+    - batch_size, backend: As for send_multiple_dicom_concurrently, per destination
+    - max_associations: Parallel associations per destination (default: from config per destination)
+    - retry_policy: Optional RetryPolicy; transient failures are retried per destination
+    - journal: Optional SendJournal recording each destination's results
+    - resume: Skip instances a destination already acknowledged with the same dicom_tags according to the journal
+    - group_by_study: Send in study, series and Instance Number order, one study per association
+    - max_lead: Chunks that may wait for a destination before reading pauses
+
+    Returns:
+    - Dictionary mapping each destination key (AE@host:port) to its results for each file
+    """
+    total_files = len(file_paths)
+    keys = {destination_key(host, port, ae_title): (host, port, ae_title) for host, port, ae_title in destinations}
+    results = {key: {} for key in keys}
+    if total_files == 0 or not keys:
+        return results
+
+    send_order = sort_by_study(file_paths) if group_by_study else file_paths
+    send_function = with_retries(send_multiple_dicom_concurrently, retry_policy) if retry_policy \
+        else send_multiple_dicom_concurrently
+    config_manager = ConfigManager()
+    instance_keys = {}
+
+    def deliver(key, chunk):
+        host, port, ae_title = keys[key]
+        limit = max_associations or get_max_associations(config_manager, host, port, ae_title)
+        pending = chunk
+        if journal and resume:
+            acknowledged = journal.acknowledged_keys(key, [instance_keys[path] for path in chunk if path in instance_keys])
+            pending = [path for path in chunk if instance_keys.get(path) not in acknowledged]
+            for path in chunk:
+                if path not in pending:
+                    results[key][path] = {"success": True, "output": "Already acknowledged", "error": "", "skipped": True}
+        if not pending:
+            return
+        sent = send_function(
+            pending, host, port, ae_title, None, dicom_tags=dicom_tags,
+            batch_size=batch_size, max_associations=limit, backend=backend,
+            group_by_study=group_by_study
+        )
+        for file_path, result in sent.items():
+            results[key][file_path] = result
+            if journal and file_path in instance_keys:
+                journal.record(key, instance_keys[file_path], file_path, result)
+
+    delivered = {key: 0 for key in keys}
+    progress_lock = threading.Lock()
+
+    def worker(key, chunks):
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                return
+            try:
+                deliver(key, chunk)
+            except Exception as e:
+                logging.error(f"Error sending to {key}: {str(e)}")
+                for file_path in chunk:
+                    results[key].setdefault(file_path, {"success": False, "output": "", "error": str(e)})
+            # Progress counts the files delivered to every destination
+            with progress_lock:
+                before = min(delivered.values())
+                delivered[key] += len(chunk)
+                if progress_callback and min(delivered.values()) > before:
+                    progress_callback(min(delivered.values()), total_files, Path(chunk[-1]).name)
+
+    if progress_callback:
+        progress_callback(0, total_files, "Starting...")
+    logging.info(f"Sending {total_files} files to {len(keys)} destinations: {', '.join(keys)}")
+
+    queues = {key: queue.Queue(maxsize=max(1, max_lead)) for key in keys}
+    workers = [threading.Thread(target=worker, args=(key, queues[key]), daemon=True) for key in keys]
+    for thread in workers:
+        thread.start()
+    try:
+        for start in range(0, total_files, max(1, chunk_size)):
+            chunk = send_order[start:start + chunk_size]
+            if journal:
+                for file_path in chunk:
+                    try:
+                        instance_keys[file_path] = instance_key(file_path, dicom_tags)
+                    except OSError as e:
+                        logging.warning(f"Could not identify {file_path} for the send journal: {str(e)}")
+            # Blocks while the slowest destination is max_lead chunks behind
+            for chunks in queues.values():
+                chunks.put(chunk)
+    finally:
+        for chunks in queues.values():
+            chunks.put(None)
+        for thread in workers:
+            thread.join()
+
+    if journal:
+        journal.flush()
+    if progress_callback:
+        progress_callback(total_files, total_files, "Completed")
+
+    for key, key_results in results.items():
+        successes = sum(1 for result in key_results.values() if result["success"])
+        logging.info(f"{key}: {successes}/{total_files} files sent successfully")
+    return {key: {path: key_results[path] for path in file_paths if path in key_results}
+            for key, key_results in results.items()}
+
+def summarize_fanout(results, seconds):
+    """
+    Summarize the results of send_to_destinations.
+
+    Parameters:
+    - results: Dictionary mapping each destination key to its results for each file
+    - seconds: Wall-clock time the fan-out took
+
+    Returns:
+    - Dictionary with total, success and errors over all destinations, and under
+      "destinations" the success, skipped, errors, failures (file path to error),
+      results and throughput of each one
+    """
+    summary = {"total": 0, "success": 0, "errors": 0, "destinations": {}}
+    for key, key_results in results.items():
+        success = sum(1 for result in key_results.values() if result["success"])
+        errors = len(key_results) - success
+        summary["destinations"][key] = {
+            "success": success,
+            "skipped": sum(1 for result in key_results.values() if result.get("skipped")),
+            "errors": errors,
+            "failures": {file_path: result["error"] for file_path, result in key_results.items()
+                         if not result["success"]},
+            "results": key_results,
+            "throughput": summarize_throughput(key_results, seconds)
+        }
+        summary["total"] += len(key_results)
+        summary["success"] += success
+        summary["errors"] += errors
+    return summary
+
+def format_fanout_summary(summary):
+    """
+    Describe each destination of a summarize_fanout summary.
+
+    Returns:
+    - List of lines: per destination the files sent, already sent and failed with its
+      throughput, followed by one line for each failed file
+    """
+    lines = []
+    for key, destination in summary["destinations"].items():
+        lines.append(f"{key}: {destination['success'] - destination['skipped']} sent, "
+                     f"{destination['skipped']} already sent, {destination['errors']} errors, "
+                     f"{format_throughput(destination['throughput'])}")
+        lines.extend(f"  Failed: {file_path}: {error}" for file_path, error in destination["failures"].items())
+    return lines
@@ -0,0 +1,91 @@
+"""
+Grouping of files by study and series so that each study is sent in order over its own association
+"""
+
+import os
+import logging
+import functools
+import pydicom
+
+# Headers parsed once are reused by later grouping of the same, unchanged files
+GROUPING_CACHE_SIZE = 100000
+
+def read_grouping_keys(file_path):
+    """
+    Read the Study Instance UID, Series Instance UID and Instance Number of a file.
+
+    Results are cached by path, size and modification time, so sorting files and then
+    splitting them into associations parses each header only once.
+
+    Returns:
+    - (study_uid, series_uid, instance_number); values that cannot be read are "" or None
+    """
+    try:
+        stat = os.stat(file_path)
+    except OSError as e:
+        logging.warning(f"Could not read study/series of {file_path}: {str(e)}")
+        return "", "", None
+    return _read_grouping_keys(file_path, stat.st_size, stat.st_mtime_ns)
+
+@functools.lru_cache(maxsize=GROUPING_CACHE_SIZE)
+def _read_grouping_keys(file_path, size, mtime_ns):
+    try:
+        ds = pydicom.dcmread(file_path, stop_before_pixels=True,
+                             specific_tags=["StudyInstanceUID", "SeriesInstanceUID", "InstanceNumber"])
+        study_uid = str(ds.get("StudyInstanceUID", ""))
+        series_uid = str(ds.get("SeriesInstanceUID", ""))
+    except Exception as e:
+        logging.warning(f"Could not read study/series of {file_path}: {str(e)}")
+        return "", "", None
+
+    # A malformed Instance Number only loses the file its place within the series
+    try:
+        instance_number = ds.get("InstanceNumber")
+        instance_number = int(instance_number) if instance_number not in (None, "") else None
+    except Exception as e:
+        logging.warning(f"Could not read Instance Number of {file_path}: {str(e)}")
+        instance_number = None
+    return study_uid, series_uid, instance_number
+
+def group_by_study(file_paths):
+    """
+    Group files by study, then series, ordered by Instance Number within each series.
+
+    Studies and series keep the order in which they first appear in file_paths.
+    Files without an Instance Number follow the numbered ones of their series.
+    Files whose header cannot be read are grouped under the study "".
+
+    Returns:
+    - Dictionary mapping each Study Instance UID to its sorted list of files
+    """
+    studies = {}
+    for index, file_path in enumerate(file_paths):
+        study_uid, series_uid, instance_number = read_grouping_keys(file_path)
+        series = studies.setdefault(study_uid, {})
+        series.setdefault(series_uid, []).append((instance_number is None, instance_number or 0, index, file_path))
+
+    grouped = {}
+    for study_uid, series in studies.items():
+        grouped[study_uid] = [entry[3] for instances in series.values() for entry in sorted(instances)]
+    return grouped
+
+def sort_by_study(file_paths):
+    """Return the files ordered by study, series and Instance Number"""
+    return [file_path for files in group_by_study(file_paths).values() for file_path in files]
+
+def split_by_study(file_paths, max_objects):
+    """
+    Split files into association-sized chunks that never mix studies.
+
+    Parameters:
+    - file_paths: List of paths to the DICOM files
+    - max_objects: Maximum number of files sent over one association
+
+    Returns:
+    - List of chunks, each one study (or part of one) in series and instance order
+    """
+    max_objects = max(1, int(max_objects))
+    chunks = []
+    for files in group_by_study(file_paths).values():
+        chunks.extend(files[i:i + max_objects] for i in range(0, len(files), max_objects))
+    return chunks
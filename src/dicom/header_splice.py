@@ -0,0 +1,106 @@
+"""
+Header splicing: re-encode the start of a dataset and copy the rest of the file, pixel data included, without passing it through Python
+"""
+
+import os
+import errno
+import logging
+from pydicom.filereader import read_partial
+
+# Pixel Data, Float Pixel Data and Double Float Pixel Data
+PIXEL_DATA_TAGS = (0x7FE00008, 0x7FE00009, 0x7FE00010)
+
+# Errors meaning a zero-copy call does not work for this pair of files, rather than a failed copy
+_UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF, errno.ENOTSOCK}
+
+# Size of the copies when no zero-copy call is available
+COPY_BUFFER_SIZE = 1024 * 1024
+
+def copy_range(src_fd, dst_fd, offset, count):
+    """
+    Copy count bytes from offset in one file to the current position of another.
+
+    os.copy_file_range is tried first, which lets the file system share the blocks
+    (reflink) or copy them in the kernel; then os.sendfile, which copies in the kernel;
+    then a read/write loop. The position of dst_fd is advanced past the copied bytes.
+
+    Returns:
+    - Tuple of (bytes copied, method used)
+    """
+    if count <= 0:
+        return 0, "none"
+    start = os.lseek(dst_fd, 0, os.SEEK_CUR)
+    calls = []
+    if hasattr(os, "copy_file_range"):
+        calls.append(("copy_file_range", lambda remaining, position: os.copy_file_range(src_fd, dst_fd, remaining, position)))
+    if hasattr(os, "sendfile"):
+        calls.append(("sendfile", lambda remaining, position: os.sendfile(dst_fd, src_fd, position, remaining)))
+    for method, call in calls:
+        copied = 0
+        try:
+            while copied < count:
+                moved = call(count - copied, offset + copied)
+                if not moved:
+                    break
+                copied += moved
+            return copied, method
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED_ERRNOS:
+                raise
+            os.lseek(dst_fd, start, os.SEEK_SET)
+
+    os.lseek(src_fd, offset, os.SEEK_SET)
+    copied = 0
+    while copied < count:
+        chunk = os.read(src_fd, min(count - copied, COPY_BUFFER_SIZE))
+        if not chunk:
+            break
+        view = memoryview(chunk)
+        while view:
+            view = view[os.write(dst_fd, view):]
+        copied += len(chunk)
+    return copied, "read"
+
+def read_header(src, last_tag):
+    """
+    Read the dataset of an open file up to the first element after last_tag.
+
+    Reading also stops at the pixel data, so bulk pixel data is never read. The file is
+    left positioned at the first element that was not read: the splice offset.
+
+    Parameters:
+    - src: Binary file object positioned at the start of the file
+    - last_tag: Highest tag that will be edited
+
+    Returns:
+    - Tuple of (dataset read so far, splice offset)
+    """
+    def stop_when(tag, vr, length):
+        return tag > last_tag or tag in PIXEL_DATA_TAGS
+
+    ds = read_partial(src, stop_when=stop_when)
+    return ds, src.tell()
+
+def write_spliced(save, src, splice_offset, output_file):
+    """
+    Write an edited header followed by the input from splice_offset to its end.
+
+    Parameters:
+    - save: Callable writing the preamble, file meta information and edited header to a file object
+    - src: Binary file object of the input
+    - splice_offset: Offset of the first input byte to copy unchanged
+    - output_file: Path of the output file
+
+    Returns:
+    - Tuple of (header bytes written, bytes copied, copy method)
+    """
+    tail = os.fstat(src.fileno()).st_size - splice_offset
+    with open(output_file, "wb") as dst:
+        save(dst)
+        dst.flush()
+        header_bytes = dst.tell()
+        copied, method = copy_range(src.fileno(), dst.fileno(), splice_offset, tail)
+    if copied != tail:
+        raise OSError(f"Input ended after {copied} of {tail} bytes following the header")
+    logging.debug(f"Spliced {header_bytes} header bytes and {copied} bytes copied with {method} into {output_file}")
+    return header_bytes, copied, method
@@ -0,0 +1,195 @@
+"""
+Concurrent C-ECHO health probing of several destinations, with a rolling latency history
+"""
+
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from src.dicom.backends import echo_with_backend, NATIVE_BACKEND
+from src.utils.config import destination_key
+
+# Seconds between two probe rounds of a HealthMonitor
+DEFAULT_HEALTH_CHECK_INTERVAL = 60
+
+# Number of probe results kept per destination
+DEFAULT_LATENCY_HISTORY_SIZE = 100
+
+# A destination is degraded when its last echo is this many times slower than its median
+DEGRADED_FACTOR = 3.0
+DEGRADED_MIN_SAMPLES = 5
+
+def parse_destination(text):
+    """
+    Parse a destination written as AE@host:port.
+
+    Returns:
+    - (host, port, ae_title)
+
+    Raises:
+    - ValueError if the text is not in that form
+    """
+    try:
+        ae_title, address = text.split("@", 1)
+        host, port = address.rsplit(":", 1)
+        if not ae_title or not host:
+            raise ValueError
+        return host, int(port), ae_title
+    except ValueError:
+        raise ValueError(f"Invalid destination '{text}', expected AE@host:port")
+
+def probe_destinations(destinations, backend=NATIVE_BACKEND, max_workers=8):
+    """
+    Send a C-ECHO to every destination concurrently.
+
+    Parameters:
+    - destinations: List of (host, port, ae_title)
+    - backend: Send backend used for the echo
+    - max_workers: Maximum number of echoes in flight
+
+    Returns:
+    - List of echo result dictionaries, in the order of destinations, each with
+      destination (AE@host:port) and time (epoch seconds) added
+    """
+    def probe(destination):
+        host, port, ae_title = destination
+        started = time.time()
+        try:
+            result = echo_with_backend(backend, host, port, ae_title)
+        except Exception as e:
+            result = {"success": False, "association_ms": None, "echo_ms": None, "error": str(e)}
+        result["destination"] = destination_key(host, port, ae_title)
+        result["time"] = started
+        result.pop("output", None)
+        return result
+
+    if not destinations:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(destinations))) as executor:
+        return list(executor.map(probe, destinations))
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def _latency_summary(values):
+    if not values:
+        return None
+    return {
+        "last": values[-1],
+        "min": min(values),
+        "avg": round(sum(values) / len(values), 1),
+        "p50": _percentile(values, 0.5),
+        "p95": _percentile(values, 0.95),
+        "max": max(values)
+    }
+
+class LatencyHistory:
+    """Keeps the last probe results of every destination"""
+
+    def __init__(self, size=DEFAULT_LATENCY_HISTORY_SIZE):
+        self.size = size
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def add(self, result):
+        """Record one probe result returned by probe_destinations"""
+        with self.lock:
+            self.samples.setdefault(result["destination"], deque(maxlen=self.size)).append(result)
+
+    def summary(self, destination):
+        """
+        Summarise the history of one destination.
+
+        Returns:
+        - Dictionary with probes, failures, state ("ok", "degraded", "down" or "unknown"),
+          last_error and min/avg/p50/p95/max summaries of echo_ms and association_ms
+        """
+        with self.lock:
+            samples = list(self.samples.get(destination, []))
+        echo_times = [s["echo_ms"] for s in samples if s["success"] and s["echo_ms"] is not None]
+        association_times = [s["association_ms"] for s in samples if s["success"] and s["association_ms"] is not None]
+        failures = [s for s in samples if not s["success"]]
+
+        if not samples:
+            state = "unknown"
+        elif not samples[-1]["success"]:
+            state = "down"
+        elif (len(echo_times) >= DEGRADED_MIN_SAMPLES and samples[-1]["echo_ms"] is not None and
+              samples[-1]["echo_ms"] > DEGRADED_FACTOR * max(_percentile(echo_times, 0.5), 1)):
+            state = "degraded"
+        else:
+            state = "ok"
+
+        return {
+            "destination": destination,
+            "probes": len(samples),
+            "failures": len(failures),
+            "state": state,
+            "last_error": failures[-1]["error"] if failures else "",
+            "echo_ms": _latency_summary(echo_times),
+            "association_ms": _latency_summary(association_times)
+        }
+
+    def summaries(self):
+        """Summaries of every destination in the history"""
+        with self.lock:
+            destinations = list(self.samples)
+        return [self.summary(destination) for destination in destinations]
+
+class HealthMonitor:
+    """
+    Probes a list of destinations on a schedule in a background thread.
+
+    Usage:
+        monitor = HealthMonitor([("10.0.0.5", 104, "ARCHIVE")], interval=60)
+        monitor.start()
+        ...
+        print(monitor.history.summaries())
+        monitor.stop()
+    """
+
+    def __init__(self, destinations, backend=NATIVE_BACKEND, interval=DEFAULT_HEALTH_CHECK_INTERVAL,
+                 history=None, on_probe=None):
+        self.destinations = list(destinations)
+        self.backend = backend
+        self.interval = interval
+        self.history = history or LatencyHistory()
+        self.on_probe = on_probe
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def probe_once(self):
+        """Run one probe round, record it and return its results"""
+        results = probe_destinations(self.destinations, self.backend)
+        for result in results:
+            self.history.add(result)
+            if not result["success"]:
+                logging.warning(f"Health probe of {result['destination']} failed: {result['error']}")
+        if self.on_probe:
+            self.on_probe(results)
+        return results
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.probe_once()
+            except Exception as e:
+                logging.error(f"Health probe round failed: {str(e)}")
+            self.stop_event.wait(self.interval)
+
+    def start(self):
+        """Start probing in a background thread"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="dicom-health-monitor", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop probing and wait for the current round to finish"""
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
@@ -0,0 +1,207 @@
+"""
+Faster startup of short-lived dcm4che JVMs with AppCDS archives and tuned launch flags
+"""
+
+import os
+import re
+import time
+import hashlib
+import logging
+import statistics
+import threading
+import subprocess
+from src.utils.config import ConfigManager
+from src.utils.file_helpers import get_lib_dir
+
+# Flags for JVMs that live for one short task: C1 compiler only, serial GC, no perf data file
+DEFAULT_JVM_FLAGS = ["-XX:TieredStopAtLevel=1", "-XX:+UseSerialGC", "-XX:-UsePerfData", "-Xshare:auto"]
+DEFAULT_JVM_MAX_HEAP = "512m"
+
+# Dynamic AppCDS archives (-XX:ArchiveClassesAtExit) need JDK 13 or newer
+MIN_DYNAMIC_CDS_VERSION = 13
+
+# A dump lock older than this belongs to a JVM that died while dumping
+STALE_LOCK_SECONDS = 600
+
+VERSION_PATTERN = re.compile(r'version "([^"]+)"')
+
+_java_version = None
+_java_version_lock = threading.Lock()
+
+def get_java_version():
+    """
+    Return the version of the java on the PATH.
+
+    Returns:
+    - (major, full version string), or (0, "") if java cannot be run
+    """
+    global _java_version
+    with _java_version_lock:
+        if _java_version is None:
+            try:
+                result = subprocess.run(["java", "-version"], capture_output=True, text=True)
+                match = VERSION_PATTERN.search(result.stderr + result.stdout)
+                full = match.group(1) if match else ""
+                parts = full.split(".")
+                major = int(parts[1] if parts[0] == "1" and len(parts) > 1 else re.sub(r"\D.*", "", parts[0]) or 0)
+                _java_version = (major, full)
+            except (OSError, ValueError):
+                _java_version = (0, "")
+        return _java_version
+
+def get_cds_dir():
+    """Directory under lib/ holding the class data sharing archives"""
+    return os.path.normpath(os.path.join(get_lib_dir(), "..", "..", "cds"))
+
+def get_archive_path(tool, classpath):
+    """
+    Path of the archive for a tool.
+
+    The name includes the Java version and a hash of the classpath, because an
+    archive is only usable by the exact JVM and classpath that created it.
+    """
+    digest = hashlib.sha1(classpath.encode("utf-8")).hexdigest()[:10]
+    return os.path.join(get_cds_dir(), f"{tool}-{get_java_version()[1]}-{digest}.jsa")
+
+def _classpath_of(cmd):
+    return cmd[cmd.index("-cp") + 1] if "-cp" in cmd else ""
+
+def _acquire_dump_lock(lock_path):
+    """Create the dump lock file, breaking a stale one; return True if this process may dump"""
+    for _ in range(2):
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) < STALE_LOCK_SECONDS:
+                    return False
+                os.remove(lock_path)
+            except OSError:
+                return False
+        except OSError:
+            return False
+    return False
+
+def jvm_max_heap(tool, config_manager):
+    """
+    Maximum heap of a tool's JVM, or None to leave the JVM default.
+
+    "jvm_tool_max_heap" sets it per tool. Otherwise StoreSCU, which streams datasets,
+    gets "jvm_max_heap", while DicomModifier and dcm2dcm, which hold whole datasets in
+    memory, keep the default of a quarter of physical memory.
+    """
+    per_tool = config_manager.get_value("jvm_tool_max_heap", {})
+    if tool in per_tool:
+        return per_tool[tool]
+    if tool == "storescu":
+        return config_manager.get_value("jvm_max_heap", DEFAULT_JVM_MAX_HEAP)
+    return None
+
+def jvm_options(tool, config_manager=None):
+    """Launch flags for a tool's short-lived JVMs, from "jvm_flags" and its maximum heap in the configuration"""
+    config_manager = config_manager or ConfigManager()
+    options = list(config_manager.get_value("jvm_flags", DEFAULT_JVM_FLAGS))
+    max_heap = jvm_max_heap(tool, config_manager)
+    if max_heap:
+        options.append(f"-Xmx{max_heap}")
+    return options
+
+def java_command(tool, cmd, config_manager=None):
+    """
+    Add the startup options to a ["java", ...] command.
+
+    If the tool has an archive it is used. Otherwise, on JDK 13+, one process at a
+    time dumps the classes it loaded to a temporary archive at exit, which
+    finish_java_command then moves into place.
+
+    Returns:
+    - (command, dump_path) where dump_path is None unless this run creates the archive
+    """
+    config_manager = config_manager or ConfigManager()
+    options = jvm_options(tool, config_manager)
+    dump_path = None
+    if config_manager.get_value("use_cds", True) and get_java_version()[0] >= MIN_DYNAMIC_CDS_VERSION:
+        archive = get_archive_path(tool, _classpath_of(cmd))
+        if os.path.exists(archive):
+            options.append(f"-XX:SharedArchiveFile={archive}")
+        else:
+            os.makedirs(get_cds_dir(), exist_ok=True)
+            if _acquire_dump_lock(archive + ".lock"):
+                dump_path = f"{archive}.{os.getpid()}.tmp"
+                options.append(f"-XX:ArchiveClassesAtExit={dump_path}")
+    return [cmd[0]] + options + cmd[1:], dump_path
+
+def finish_java_command(tool, cmd, dump_path):
+    """Move an archive dumped by a finished run into place and release the dump lock"""
+    if not dump_path:
+        return
+    archive = get_archive_path(tool, _classpath_of(cmd))
+    try:
+        if os.path.exists(dump_path) and os.path.getsize(dump_path) > 0:
+            os.replace(dump_path, archive)
+            logging.info(f"Created class data sharing archive for {tool}: {archive}")
+        elif os.path.exists(dump_path):
+            os.remove(dump_path)
+    except OSError as e:
+        logging.warning(f"Could not store the class data sharing archive for {tool}: {str(e)}")
+    finally:
+        try:
+            os.remove(archive + ".lock")
+        except OSError:
+            pass
+
+def run_java(tool, cmd, **kwargs):
+    """
+    Run a short-lived ["java", ...] command with the startup options, like subprocess.run.
+
+    Parameters:
+    - tool: Name of the tool, used to name its archive (e.g. "storescu")
+    - cmd: The plain java command
+    - kwargs: Passed on to subprocess.run
+    """
+    full_cmd, dump_path = java_command(tool, cmd)
+    try:
+        return subprocess.run(full_cmd, **kwargs)
+    finally:
+        finish_java_command(tool, full_cmd, dump_path)
+
+def _time_run(cmd, run):
+    start = time.perf_counter()
+    run(cmd)
+    return (time.perf_counter() - start) * 1000
+
+def measure_startup(tool, cmd, runs=5):
+    """
+    Compare the wall-clock time of a command launched plainly and with the startup options.
+
+    The optimized command is run once first so that its archive exists.
+
+    Returns:
+    - Dictionary with tool, runs, baseline_ms, optimized_ms (medians), saved_ms and saved_percent
+    """
+    run_java(tool, cmd, capture_output=True)
+    baseline = [_time_run(cmd, lambda c: subprocess.run(c, capture_output=True)) for _ in range(runs)]
+    optimized = [_time_run(cmd, lambda c: run_java(tool, c, capture_output=True)) for _ in range(runs)]
+    baseline_ms = statistics.median(baseline)
+    optimized_ms = statistics.median(optimized)
+    return {
+        "tool": tool,
+        "runs": runs,
+        "baseline_ms": round(baseline_ms, 1),
+        "optimized_ms": round(optimized_ms, 1),
+        "saved_ms": round(baseline_ms - optimized_ms, 1),
+        "saved_percent": round(100 * (baseline_ms - optimized_ms) / baseline_ms, 1) if baseline_ms else 0.0
+    }
+
+def clear_archives():
+    """Delete every class data sharing archive, returning the number removed"""
+    cds_dir = get_cds_dir()
+    if not os.path.isdir(cds_dir):
+        return 0
+    removed = 0
+    for name in os.listdir(cds_dir):
+        if name.endswith(".jsa"):
+            os.remove(os.path.join(cds_dir, name))
+            removed += 1
+    return removed
@@ -0,0 +1,122 @@
+"""
+Batch modification of many files in a single DicomModifier JVM fed through a streamed manifest
+"""
+import subprocess
+import logging
+import threading
+from collections import deque
+from src.dicom.jvm import java_command, finish_java_command
+
+def _manifest_line(input_file, output_file, dicom_tags):
+    """One tab-separated manifest line: input, output and the tag=value edits"""
+    fields = [str(input_file), str(output_file)]
+    fields += [f"{tag_name}={tag_value}" for tag_name, tag_value in (dicom_tags or {}).items() if tag_value]
+    if any("\t" in field or "\n" in field for field in fields):
+        raise ValueError("Paths and tag values must not contain tabs or newlines")
+    return "\t".join(fields) + "\n"
+
+def modify_files_in_jvm(jobs, threads, on_result):
+    """
+    Modify many files in a single DicomModifier JVM.
+    
+    The manifest is written to the JVM's stdin while its status lines are read back,
+    so jobs may be a generator and results arrive as each file completes.
+    
+    Returns:
+    - Dictionary with a result for each input file: success, output_file, ms and error
+    """
+    # Import here to avoid circular import
+    from src.dicom.dicom_modifier import ensure_dicom_modifier_current, get_dicom_modifier_classpath
+    
+    results = {}
+    lock = threading.Lock()
+    
+    def record(input_file, result):
+        with lock:
+            results[input_file] = result
+        if on_result:
+            on_result(input_file, result)
+    
+    def fail_all(error):
+        for input_file, output_file, _ in jobs:
+            record(input_file, {"success": False, "output_file": output_file, "ms": None, "error": error})
+        return results
+    
+    error = ensure_dicom_modifier_current()
+    if error:
+        logging.error(error)
+        return fail_all(error)
+    classpath = get_dicom_modifier_classpath()
+    if classpath is None:
+        return fail_all("DicomModifier is not built")
+    
+    cmd = ["java", "-cp", classpath, "DicomModifier", "--manifest", "-", "--threads", str(threads)]
+    full_cmd, dump_path = java_command("dicom-modifier", cmd)
+    logging.info(f"Starting batch DicomModifier with {threads} threads")
+    pending = {}
+    stderr_tail = deque(maxlen=20)
+    try:
+        try:
+            process = subprocess.Popen(
+                full_cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                text=True, encoding="utf-8", bufsize=1
+            )
+        except OSError as e:
+            logging.error(f"Error running DICOM modifier: {str(e)}")
+            return fail_all(str(e))
+        
+        def drain_stderr():
+            for line in process.stderr:
+                stderr_tail.append(line.rstrip())
+                logging.debug(f"DicomModifier: {line.rstrip()}")
+        
+        def write_manifest():
+            try:
+                for input_file, output_file, dicom_tags in jobs:
+                    try:
+                        line = _manifest_line(input_file, output_file, dicom_tags)
+                    except ValueError as e:
+                        record(input_file, {"success": False, "output_file": output_file, "ms": None, "error": str(e)})
+                        continue
+                    with lock:
+                        pending[str(input_file)] = (input_file, output_file)
+                    process.stdin.write(line)
+            except OSError as e:
+                logging.error(f"DicomModifier stopped reading its manifest: {str(e)}")
+            finally:
+                try:
+                    process.stdin.close()
+                except OSError:
+                    pass
+        
+        # Writing and reading run side by side so neither pipe can fill up and stall the other
+        helpers = [threading.Thread(target=drain_stderr, daemon=True),
+                   threading.Thread(target=write_manifest, daemon=True)]
+        for helper in helpers:
+            helper.start()
+        for line in process.stdout:
+            parts = line.rstrip("\n").split("\t")
+            if parts[0] == "RESULT" and len(parts) >= 5:
+                with lock:
+                    input_file, _ = pending.pop(parts[1], (parts[1], parts[2]))
+                success = parts[3] == "0"
+                record(input_file, {
+                    "success": success,
+                    "output_file": parts[2],
+                    "ms": int(parts[4]) if parts[4].isdigit() else None,
+                    "error": "" if success else (parts[5] if len(parts) > 5 else "Failed to modify DICOM tags")
+                })
+            elif parts[0] == "DONE":
+                logging.info(f"Batch DicomModifier finished: {parts[2] if len(parts) > 2 else '?'} of "
+                             f"{parts[1] if len(parts) > 1 else '?'} files failed")
+        process.wait()
+        for helper in helpers:
+            helper.join()
+    finally:
+        finish_java_command("dicom-modifier", full_cmd, dump_path)
+    
+    # Files the JVM never answered, e.g. because it crashed
+    error = "\n".join(stderr_tail) or "No result reported for this file"
+    for input_file, output_file in pending.values():
+        record(input_file, {"success": False, "output_file": output_file, "ms": None, "error": error})
+    return results
@@ -0,0 +1,3 @@
+"""
+Pure-Python asyncio DICOM network backend (C-ECHO and C-STORE SCU)
+"""
@@ -0,0 +1,294 @@
+"""
+asyncio DICOM association supporting C-ECHO and C-STORE as an SCU
+"""
+
+import asyncio
+import struct
+import time
+from src.dicom.native import pdu, dimse
+from src.dicom.transport import open_buffered_connection
+
+DEFAULT_CALLING_AE = "DICOM_SENDER"
+DEFAULT_TIMEOUT = 30
+
+# Fragment size used when the peer does not limit the PDU length
+UNLIMITED_FRAGMENT_SIZE = 1024 * 1024
+
+# Size of the reads used to stream a dataset from disk
+READ_CHUNK_SIZE = 1024 * 1024
+
+class AssociationError(Exception):
+    """Raised when an association is rejected, aborted or breaks"""
+
+class Association:
+    """
+    An SCU association on an asyncio stream.
+
+    Usage:
+        assoc = Association(host, port, called_ae)
+        await assoc.connect([(sop_class_uid, [transfer_syntax_uid])])
+        status = await assoc.c_store_file(path)
+        await assoc.release()
+    """
+
+    def __init__(self, host, port, called_ae, calling_ae=DEFAULT_CALLING_AE,
+                 max_pdu=pdu.DEFAULT_MAX_PDU, timeout=DEFAULT_TIMEOUT, transport=None):
+        """
+        Parameters:
+        - max_pdu: Maximum PDU length we accept
+        - transport: Optional settings from TransportTuner.settings(); a non-zero max_pdu
+          there also caps the PDUs we send, and the buffer sizes are set on the socket
+        """
+        transport = transport or {}
+        # Only the settings that differ from the defaults, so that equal settings compare equal
+        self.transport = {name: value for name, value in transport.items() if value}
+        self.host = host
+        self.port = int(port)
+        self.called_ae = called_ae
+        self.calling_ae = calling_ae
+        self.max_pdu = transport.get("max_pdu") or max_pdu
+        self.max_send_pdu = transport.get("max_pdu") or 0
+        self.send_buffer = transport.get("send_buffer") or 0
+        self.receive_buffer = transport.get("receive_buffer") or 0
+        self.timeout = timeout
+        self.reader = None
+        self.writer = None
+        self.proposed = set()
+        self.accepted = {}
+        self.rejected = {}
+        self.peer_max_pdu = 0
+        self.message_id = 0
+        self.association_time = None
+        self.connect_time = None
+        self.bytes_sent = 0
+        # Whether any of the current C-STORE's dataset has been written
+        self.dataset_started = False
+
+    @property
+    def is_established(self):
+        return self.writer is not None and not self.writer.is_closing() and not self.reader.at_eof()
+
+    @property
+    def fragment_size(self):
+        """Largest PDV payload that fits into the peer's maximum PDU length and our own send limit"""
+        limits = [limit for limit in (self.peer_max_pdu, self.max_send_pdu) if limit]
+        return min(limits) - 6 if limits else UNLIMITED_FRAGMENT_SIZE
+
+    async def _read_pdu(self):
+        try:
+            header = await asyncio.wait_for(self.reader.readexactly(6), self.timeout)
+            pdu_type, _, length = struct.unpack(">BBI", header)
+            body = await asyncio.wait_for(self.reader.readexactly(length), self.timeout)
+        except asyncio.IncompleteReadError:
+            raise AssociationError("Connection closed by peer") from None
+        return pdu_type, body
+
+    async def connect(self, contexts):
+        """
+        Open the TCP connection and negotiate the association.
+
+        Parameters:
+        - contexts: List of (abstract_syntax, [transfer_syntax, ...]) to propose
+        """
+        start = time.perf_counter()
+        if self.send_buffer or self.receive_buffer:
+            self.reader, self.writer = await asyncio.wait_for(
+                open_buffered_connection(self.host, self.port, self.send_buffer, self.receive_buffer), self.timeout
+            )
+        else:
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), self.timeout
+            )
+        # The TCP handshake takes one round trip
+        self.connect_time = time.perf_counter() - start
+        try:
+            proposed = [(2 * i + 1, abstract, list(syntaxes)) for i, (abstract, syntaxes) in enumerate(contexts)]
+            self.proposed = {(abstract, ts) for _, abstract, syntaxes in proposed for ts in syntaxes}
+            self.writer.write(pdu.encode_associate_rq(self.calling_ae, self.called_ae, proposed, self.max_pdu))
+            await self.writer.drain()
+
+            pdu_type, body = await self._read_pdu()
+            if pdu_type == pdu.A_ASSOCIATE_RJ:
+                result, source, reason = pdu.decode_associate_rj(body)
+                raise AssociationError(f"Association rejected (result={result}, source={source}, reason={reason})")
+            if pdu_type != pdu.A_ASSOCIATE_AC:
+                raise AssociationError(f"Unexpected PDU type {pdu_type:#04x} during association")
+
+            ac = pdu.decode_associate_ac(body)
+            self.peer_max_pdu = ac["max_pdu"]
+            abstract_by_pcid = {pcid: abstract for pcid, abstract, _ in proposed}
+            syntaxes_by_pcid = {pcid: syntaxes for pcid, _, syntaxes in proposed}
+            for pcid, (result, transfer_syntax) in ac["contexts"].items():
+                key = (abstract_by_pcid.get(pcid), transfer_syntax)
+                if result == pdu.PC_ACCEPTANCE:
+                    self.accepted[key] = pcid
+                else:
+                    for transfer_syntax in syntaxes_by_pcid.get(pcid, []):
+                        self.rejected[(abstract_by_pcid.get(pcid), transfer_syntax)] = pdu.PC_RESULTS.get(result, str(result))
+        except BaseException:
+            # Also on a timeout or cancellation, so a failed negotiation never leaks the connection
+            await self._close()
+            raise
+        self.association_time = time.perf_counter() - start
+
+    def find_context(self, abstract_syntax, transfer_syntax):
+        """Return the accepted presentation context ID for the pair, or None"""
+        return self.accepted.get((abstract_syntax, transfer_syntax))
+
+    def _next_message_id(self):
+        self.message_id = self.message_id % 0xFFFF + 1
+        return self.message_id
+
+    async def _send_fragments(self, pcid, data, is_command, last=True):
+        """Send data in PDV fragments; with last=False more fragments of the same message follow"""
+        size = self.fragment_size
+        for offset in range(0, max(len(data), 1), size):
+            chunk = data[offset:offset + size]
+            is_last = last and offset + size >= len(data)
+            self.writer.write(pdu.encode_p_data(pcid, chunk, is_command, is_last))
+            self.bytes_sent += len(chunk)
+            await self.writer.drain()
+
+    async def _send_file_dataset(self, pcid, file_path, offset, length):
+        """Stream a dataset from disk in PDV fragments without loading the whole file"""
+        size = self.fragment_size
+        remaining = length
+        with open(file_path, "rb") as f:
+            f.seek(offset)
+            while remaining > 0:
+                chunk = f.read(min(size, remaining, READ_CHUNK_SIZE))
+                if not chunk:
+                    raise AssociationError(f"Unexpected end of file: {file_path}")
+                remaining -= len(chunk)
+                self.writer.write(pdu.encode_p_data(pcid, chunk, False, remaining == 0))
+                self.bytes_sent += len(chunk)
+                await self.writer.drain()
+
+    async def _sendfile_dataset(self, pcid, file_path, offset, length):
+        """
+        Send a dataset from disk with loop.sendfile, one PDV fragment at a time.
+
+        Only the PDU headers pass through Python; on transports that support it the kernel
+        moves the data from the page cache to the socket (os.sendfile), otherwise asyncio
+        falls back to reading in bounded chunks.
+        """
+        loop = asyncio.get_running_loop()
+        size = self.fragment_size
+        remaining = length
+        with open(file_path, "rb") as f:
+            while remaining > 0:
+                count = min(size, remaining)
+                remaining -= count
+                self.writer.write(pdu.p_data_header(pcid, count, False, remaining == 0))
+                await self.writer.drain()
+                sent = await loop.sendfile(self.writer.transport, f, offset, count)
+                if sent != count:
+                    raise AssociationError(f"Unexpected end of file: {file_path}")
+                offset += count
+                self.bytes_sent += count
+
+    async def _receive_command(self):
+        """Read P-DATA PDUs until a complete command set has arrived"""
+        command = b""
+        while True:
+            pdu_type, body = await self._read_pdu()
+            if pdu_type == pdu.A_ABORT:
+                await self._close()
+                raise AssociationError("Association aborted by peer")
+            if pdu_type == pdu.A_RELEASE_RQ:
+                self.writer.write(pdu.encode_release_rp())
+                await self._close()
+                raise AssociationError("Association released by peer")
+            if pdu_type != pdu.P_DATA_TF:
+                raise AssociationError(f"Unexpected PDU type {pdu_type:#04x}")
+            for _, is_command, is_last, data in pdu.decode_p_data(body):
+                if is_command:
+                    command += data
+                    if is_last:
+                        return dimse.decode_command(command)
+
+    async def c_echo(self):
+        """
+        Send a C-ECHO request.
+
+        Returns:
+        - (status, round_trip_seconds)
+        """
+        pcid = self.find_context(dimse.VERIFICATION_SOP_CLASS, dimse.IMPLICIT_VR_LITTLE_ENDIAN)
+        if pcid is None:
+            raise AssociationError("Verification SOP Class was not accepted")
+        start = time.perf_counter()
+        await self._send_fragments(pcid, dimse.echo_rq(self._next_message_id()), True)
+        response = await self._receive_command()
+        return response.get(0x00000900, -1), time.perf_counter() - start
+
+    async def c_store_file(self, file_path, header=None, zero_copy=False, coerced=None):
+        """
+        Send a DICOM Part 10 file with C-STORE, streaming the dataset from disk.
+
+        With zero_copy the dataset is sent with sendfile instead of being read into Python;
+        memory use is bounded by the fragment size either way. With coerced, a
+        coercion.CoercedDataset of the file, its re-encoded prefix is sent first and the
+        file is streamed from where the prefix ends.
+
+        Returns:
+        - Dictionary with status, error_comment, sop_instance_uid, bytes and seconds
+        """
+        header = header or dimse.read_part10_header(file_path)
+        pcid = self.find_context(header.sop_class_uid, header.transfer_syntax_uid)
+        if pcid is None:
+            raise AssociationError(
+                f"No accepted presentation context for {header.sop_class_uid} / {header.transfer_syntax_uid}"
+            )
+        sop_instance_uid = (coerced and coerced.sop_instance_uid) or header.sop_instance_uid
+        offset, length = header.dataset_offset, header.dataset_size
+        start = time.perf_counter()
+        self.dataset_started = False
+        command = dimse.store_rq(self._next_message_id(), header.sop_class_uid, sop_instance_uid)
+        await self._send_fragments(pcid, command, True)
+        self.dataset_started = True
+        if coerced:
+            offset, length = coerced.tail_offset, coerced.tail_length
+            await self._send_fragments(pcid, coerced.prefix, False, last=length == 0)
+        if length:
+            send_dataset = self._sendfile_dataset if zero_copy else self._send_file_dataset
+            await send_dataset(pcid, file_path, offset, length)
+        response = await self._receive_command()
+        return {
+            "status": response.get(0x00000900, -1),
+            "error_comment": response.get(0x00000902, ""),
+            "sop_instance_uid": sop_instance_uid,
+            "bytes": coerced.dataset_size if coerced else length,
+            "seconds": time.perf_counter() - start
+        }
+
+    async def _close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except Exception:
+                pass
+            self.writer = None
+
+    async def release(self):
+        """Release the association gracefully"""
+        if not self.is_established:
+            return
+        try:
+            self.writer.write(pdu.encode_release_rq())
+            await self.writer.drain()
+            await self._read_pdu()
+        except Exception:
+            pass
+        await self._close()
+
+    async def abort(self):
+        """Abort the association immediately"""
+        if self.is_established:
+            try:
+                self.writer.write(pdu.encode_abort())
+                await self.writer.drain()
+            except Exception:
+                pass
+        await self._close()
@@ -0,0 +1,177 @@
+"""
+DIMSE command encoding and DICOM Part 10 file header reading
+"""
+
+import struct
+
+VERIFICATION_SOP_CLASS = "1.2.840.10008.1.1"
+IMPLICIT_VR_LITTLE_ENDIAN = "1.2.840.10008.1.2"
+EXPLICIT_VR_LITTLE_ENDIAN = "1.2.840.10008.1.2.1"
+
+# Command field values
+C_STORE_RQ = 0x0001
+C_STORE_RSP = 0x8001
+C_ECHO_RQ = 0x0030
+C_ECHO_RSP = 0x8030
+
+# Command Data Set Type values
+DATASET_PRESENT = 0x0000
+NO_DATASET = 0x0101
+
+PRIORITY_MEDIUM = 0x0000
+
+# Command elements and their value type ("UI" strings or "US"/"UL" integers)
+COMMAND_ELEMENTS = {
+    0x00000000: "UL",  # CommandGroupLength
+    0x00000002: "UI",  # AffectedSOPClassUID
+    0x00000100: "US",  # CommandField
+    0x00000110: "US",  # MessageID
+    0x00000120: "US",  # MessageIDBeingRespondedTo
+    0x00000700: "US",  # Priority
+    0x00000800: "US",  # CommandDataSetType
+    0x00000900: "US",  # Status
+    0x00000902: "LO",  # ErrorComment
+    0x00001000: "UI",  # AffectedSOPInstanceUID
+}
+
+# Explicit VRs that use a 4 byte value length
+LONG_VRS = {b"OB", b"OD", b"OF", b"OL", b"OV", b"OW", b"SQ", b"SV", b"UC", b"UN", b"UR", b"UT", b"UV"}
+
+def _encode_value(vr, value):
+    if vr == "US":
+        return struct.pack("<H", value)
+    if vr == "UL":
+        return struct.pack("<I", value)
+    data = value.encode("ascii")
+    if len(data) % 2:
+        data += b"\0" if vr == "UI" else b" "
+    return data
+
+def encode_command(elements):
+    """
+    Encode a DIMSE command set in Implicit VR Little Endian.
+
+    Parameters:
+    - elements: Dictionary of command tag to value, see COMMAND_ELEMENTS
+
+    Returns:
+    - bytes including the CommandGroupLength element
+    """
+    body = b""
+    for tag in sorted(elements):
+        if tag == 0x00000000:
+            continue
+        value = _encode_value(COMMAND_ELEMENTS[tag], elements[tag])
+        body += struct.pack("<HHI", tag >> 16, tag & 0xFFFF, len(value)) + value
+    return struct.pack("<HHII", 0, 0, 4, len(body)) + body
+
+def decode_command(data):
+    """Decode an Implicit VR Little Endian command set into a {tag: value} dictionary"""
+    elements = {}
+    offset = 0
+    while offset + 8 <= len(data):
+        group, element, length = struct.unpack("<HHI", data[offset:offset + 8])
+        tag = (group << 16) | element
+        value = data[offset + 8:offset + 8 + length]
+        vr = COMMAND_ELEMENTS.get(tag)
+        if vr == "US":
+            elements[tag] = struct.unpack("<H", value)[0]
+        elif vr == "UL":
+            elements[tag] = struct.unpack("<I", value)[0]
+        else:
+            elements[tag] = value.decode("ascii", "replace").rstrip("\0 ")
+        offset += 8 + length
+    return elements
+
+def echo_rq(message_id):
+    return encode_command({
+        0x00000002: VERIFICATION_SOP_CLASS,
+        0x00000100: C_ECHO_RQ,
+        0x00000110: message_id,
+        0x00000800: NO_DATASET
+    })
+
+def store_rq(message_id, sop_class_uid, sop_instance_uid, priority=PRIORITY_MEDIUM):
+    return encode_command({
+        0x00000002: sop_class_uid,
+        0x00000100: C_STORE_RQ,
+        0x00000110: message_id,
+        0x00000700: priority,
+        0x00000800: DATASET_PRESENT,
+        0x00001000: sop_instance_uid
+    })
+
+def echo_rsp(message_id, status=0x0000):
+    return encode_command({
+        0x00000002: VERIFICATION_SOP_CLASS,
+        0x00000100: C_ECHO_RSP,
+        0x00000120: message_id,
+        0x00000800: NO_DATASET,
+        0x00000900: status
+    })
+
+def store_rsp(message_id, sop_class_uid, sop_instance_uid, status=0x0000):
+    return encode_command({
+        0x00000002: sop_class_uid,
+        0x00000100: C_STORE_RSP,
+        0x00000120: message_id,
+        0x00000800: NO_DATASET,
+        0x00000900: status,
+        0x00001000: sop_instance_uid
+    })
+
+class Part10Header:
+    """The file meta information of a DICOM Part 10 file and where its dataset starts"""
+
+    def __init__(self, sop_class_uid, sop_instance_uid, transfer_syntax_uid, dataset_offset, file_size):
+        self.sop_class_uid = sop_class_uid
+        self.sop_instance_uid = sop_instance_uid
+        self.transfer_syntax_uid = transfer_syntax_uid
+        self.dataset_offset = dataset_offset
+        self.file_size = file_size
+
+    @property
+    def dataset_size(self):
+        return self.file_size - self.dataset_offset
+
+def read_part10_header(file_path):
+    """
+    Read the file meta information (group 0002) of a DICOM Part 10 file.
+
+    Only the meta header is read, so this is cheap for any file size.
+
+    Returns:
+    - Part10Header
+
+    Raises:
+    - ValueError if the file is not a DICOM Part 10 file
+    """
+    meta = {}
+    with open(file_path, "rb") as f:
+        preamble = f.read(132)
+        if len(preamble) < 132 or preamble[128:132] != b"DICM":
+            raise ValueError(f"Not a DICOM Part 10 file: {file_path}")
+        while True:
+            offset = f.tell()
+            header = f.read(8)
+            if len(header) < 8:
+                break
+            group, element = struct.unpack("<HH", header[:4])
+            if group != 0x0002:
+                f.seek(offset)
+                break
+            vr = header[4:6]
+            if vr in LONG_VRS:
+                length = struct.unpack("<I", f.read(4))[0]
+            else:
+                length = struct.unpack("<H", header[6:8])[0]
+            value = f.read(length)
+            meta[element] = value.decode("ascii", "replace").rstrip("\0 ")
+        dataset_offset = f.tell()
+        f.seek(0, 2)
+        file_size = f.tell()
+
+    try:
+        return Part10Header(meta[0x0002], meta[0x0003], meta[0x0010], dataset_offset, file_size)
+    except KeyError:
+        raise ValueError(f"Incomplete file meta information: {file_path}")
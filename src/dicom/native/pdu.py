@@ -0,0 +1,199 @@
+"""
+DICOM Upper Layer PDU encoding and decoding (PS3.8 section 9.3)
+"""
+
+import struct
+
+APPLICATION_CONTEXT_NAME = "1.2.840.10008.3.1.1.1"
+IMPLEMENTATION_CLASS_UID = "1.2.826.0.1.3680043.8.498.1"
+IMPLEMENTATION_VERSION_NAME = "ALEXAMON_SEND"
+
+# PDU types
+A_ASSOCIATE_RQ = 0x01
+A_ASSOCIATE_AC = 0x02
+A_ASSOCIATE_RJ = 0x03
+P_DATA_TF = 0x04
+A_RELEASE_RQ = 0x05
+A_RELEASE_RP = 0x06
+A_ABORT = 0x07
+
+# Presentation context results in the A-ASSOCIATE-AC
+PC_ACCEPTANCE = 0
+PC_RESULTS = {
+    0: "acceptance",
+    1: "user-rejection",
+    2: "no-reason",
+    3: "abstract-syntax-not-supported",
+    4: "transfer-syntaxes-not-supported"
+}
+
+# Default maximum PDU length we are willing to receive
+DEFAULT_MAX_PDU = 16384
+
+def _ae(ae_title):
+    """Encode an AE title as 16 space padded bytes"""
+    return ae_title.encode("ascii")[:16].ljust(16, b" ")
+
+def _item(item_type, value):
+    return struct.pack(">BBH", item_type, 0, len(value)) + value
+
+def _uid(uid):
+    return uid.encode("ascii")
+
+def encode_associate_rq(calling_ae, called_ae, contexts, max_pdu=DEFAULT_MAX_PDU):
+    """
+    Encode an A-ASSOCIATE-RQ PDU.
+
+    Parameters:
+    - calling_ae: Our AE title
+    - called_ae: The AE title of the remote application
+    - contexts: List of (pcid, abstract_syntax, [transfer_syntax, ...])
+    - max_pdu: Maximum PDU length we accept
+
+    Returns:
+    - bytes of the complete PDU
+    """
+    body = struct.pack(">HH", 1, 0) + _ae(called_ae) + _ae(calling_ae) + bytes(32)
+    body += _item(0x10, _uid(APPLICATION_CONTEXT_NAME))
+    for pcid, abstract_syntax, transfer_syntaxes in contexts:
+        value = struct.pack(">BBBB", pcid, 0, 0, 0) + _item(0x30, _uid(abstract_syntax))
+        for transfer_syntax in transfer_syntaxes:
+            value += _item(0x40, _uid(transfer_syntax))
+        body += _item(0x20, value)
+    user_info = (
+        _item(0x51, struct.pack(">I", max_pdu))
+        + _item(0x52, _uid(IMPLEMENTATION_CLASS_UID))
+        + _item(0x55, IMPLEMENTATION_VERSION_NAME.encode("ascii"))
+    )
+    body += _item(0x50, user_info)
+    return struct.pack(">BBI", A_ASSOCIATE_RQ, 0, len(body)) + body
+
+def _iter_items(data, offset=0):
+    """Yield (item_type, value) for the variable items in data"""
+    while offset + 4 <= len(data):
+        item_type, _, length = struct.unpack(">BBH", data[offset:offset + 4])
+        yield item_type, data[offset + 4:offset + 4 + length]
+        offset += 4 + length
+
+def decode_associate_ac(body):
+    """
+    Decode the body of an A-ASSOCIATE-AC PDU.
+
+    Returns:
+    - Dictionary with "contexts" ({pcid: (result, transfer_syntax)}) and "max_pdu"
+    """
+    contexts = {}
+    max_pdu = 0
+    for item_type, value in _iter_items(body, 68):
+        if item_type == 0x21:
+            pcid, _, result, _ = struct.unpack(">BBBB", value[:4])
+            transfer_syntax = None
+            for sub_type, sub_value in _iter_items(value, 4):
+                if sub_type == 0x40:
+                    transfer_syntax = sub_value.decode("ascii").rstrip("\0 ")
+            contexts[pcid] = (result, transfer_syntax)
+        elif item_type == 0x50:
+            for sub_type, sub_value in _iter_items(value):
+                if sub_type == 0x51:
+                    max_pdu = struct.unpack(">I", sub_value)[0]
+    return {"contexts": contexts, "max_pdu": max_pdu}
+
+def decode_associate_rq(body):
+    """
+    Decode the body of an A-ASSOCIATE-RQ PDU.
+
+    Returns:
+    - Dictionary with "called_ae", "calling_ae", "contexts"
+      ([(pcid, abstract_syntax, [transfer_syntax, ...]), ...]) and "max_pdu"
+    """
+    contexts = []
+    max_pdu = 0
+    for item_type, value in _iter_items(body, 68):
+        if item_type == 0x20:
+            pcid = value[0]
+            abstract_syntax = None
+            transfer_syntaxes = []
+            for sub_type, sub_value in _iter_items(value, 4):
+                uid = sub_value.decode("ascii").rstrip("\0 ")
+                if sub_type == 0x30:
+                    abstract_syntax = uid
+                elif sub_type == 0x40:
+                    transfer_syntaxes.append(uid)
+            contexts.append((pcid, abstract_syntax, transfer_syntaxes))
+        elif item_type == 0x50:
+            for sub_type, sub_value in _iter_items(value):
+                if sub_type == 0x51:
+                    max_pdu = struct.unpack(">I", sub_value)[0]
+    return {
+        "called_ae": body[4:20].decode("ascii", "replace").strip(),
+        "calling_ae": body[20:36].decode("ascii", "replace").strip(),
+        "contexts": contexts,
+        "max_pdu": max_pdu
+    }
+
+def encode_associate_ac(calling_ae, called_ae, results, max_pdu=DEFAULT_MAX_PDU):
+    """
+    Encode an A-ASSOCIATE-AC PDU answering an A-ASSOCIATE-RQ.
+
+    Parameters:
+    - calling_ae, called_ae: The AE titles as received in the request
+    - results: List of (pcid, result, transfer_syntax); transfer_syntax is ignored unless accepted
+    - max_pdu: Maximum PDU length we accept
+
+    Returns:
+    - bytes of the complete PDU
+    """
+    body = struct.pack(">HH", 1, 0) + _ae(called_ae) + _ae(calling_ae) + bytes(32)
+    body += _item(0x10, _uid(APPLICATION_CONTEXT_NAME))
+    for pcid, result, transfer_syntax in results:
+        value = struct.pack(">BBBB", pcid, 0, result, 0)
+        if result == PC_ACCEPTANCE:
+            value += _item(0x40, _uid(transfer_syntax))
+        body += _item(0x21, value)
+    user_info = (
+        _item(0x51, struct.pack(">I", max_pdu))
+        + _item(0x52, _uid(IMPLEMENTATION_CLASS_UID))
+        + _item(0x55, IMPLEMENTATION_VERSION_NAME.encode("ascii"))
+    )
+    body += _item(0x50, user_info)
+    return struct.pack(">BBI", A_ASSOCIATE_AC, 0, len(body)) + body
+
+def decode_associate_rj(body):
+    """Decode an A-ASSOCIATE-RJ body into a (result, source, reason) tuple"""
+    return struct.unpack(">BBBB", body[:4])[1:]
+
+def encode_p_data(pcid, data, is_command, is_last):
+    """Encode a P-DATA-TF PDU holding a single PDV fragment"""
+    control = (0x01 if is_command else 0x00) | (0x02 if is_last else 0x00)
+    pdv = struct.pack(">IBB", len(data) + 2, pcid, control) + data
+    return struct.pack(">BBI", P_DATA_TF, 0, len(pdv)) + pdv
+
+def p_data_header(pcid, length, is_command, is_last):
+    """Return just the PDU and PDV headers for a fragment of the given length"""
+    control = (0x01 if is_command else 0x00) | (0x02 if is_last else 0x00)
+    return struct.pack(">BBIIBB", P_DATA_TF, 0, length + 6, length + 2, pcid, control)
+
+def decode_p_data(body):
+    """
+    Decode a P-DATA-TF body.
+
+    Returns:
+    - List of (pcid, is_command, is_last, data) tuples
+    """
+    fragments = []
+    offset = 0
+    while offset + 6 <= len(body):
+        length, pcid, control = struct.unpack(">IBB", body[offset:offset + 6])
+        data = body[offset + 6:offset + 4 + length]
+        fragments.append((pcid, bool(control & 0x01), bool(control & 0x02), data))
+        offset += 4 + length
+    return fragments
+
+def encode_release_rq():
+    return struct.pack(">BBII", A_RELEASE_RQ, 0, 4, 0)
+
+def encode_release_rp():
+    return struct.pack(">BBII", A_RELEASE_RP, 0, 4, 0)
+
+def encode_abort(source=0, reason=0):
+    return struct.pack(">BBIBBBB", A_ABORT, 0, 4, 0, 0, source, reason)
@@ -0,0 +1,164 @@
+"""
+Pool of established associations, reused across sends and kept open for an idle timeout
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from src.dicom.native.association import Association, DEFAULT_CALLING_AE
+
+# Seconds an unused association is kept open before it is released
+DEFAULT_IDLE_TIMEOUT = 60
+
+# Maximum number of idle associations kept per pool key
+MAX_IDLE_PER_KEY = 16
+
+# An A-ASSOCIATE-RQ can carry at most 128 presentation contexts (odd IDs 1-255)
+MAX_PRESENTATION_CONTEXTS = 128
+
+class AssociationPool:
+    """
+    Keeps negotiated associations open between sends.
+
+    Associations are keyed by (calling AE, called AE, host, port). An idle association
+    is reused when it was negotiated with all the presentation contexts a send needs;
+    otherwise a new one is negotiated proposing the union of old and new contexts so
+    that later sends can reuse it. A pool must only be used from one event loop.
+    """
+
+    def __init__(self, idle_timeout=DEFAULT_IDLE_TIMEOUT, max_idle_per_key=MAX_IDLE_PER_KEY):
+        self.idle_timeout = idle_timeout
+        self.max_idle_per_key = max_idle_per_key
+        self.idle = {}
+        self.known_contexts = {}
+        self.hits = 0
+        self.misses = 0
+        self.renegotiations = 0
+        self.expired = 0
+
+    @staticmethod
+    def _key(host, port, called_ae, calling_ae):
+        return (calling_ae, called_ae, host, int(port))
+
+    async def _expire_idle(self):
+        now = time.monotonic()
+        stale = []
+        for key, entries in self.idle.items():
+            keep = []
+            for assoc, last_used in entries:
+                if now - last_used < self.idle_timeout and assoc.is_established:
+                    keep.append((assoc, last_used))
+                else:
+                    stale.append(assoc)
+            self.idle[key] = keep
+        for assoc in stale:
+            self.expired += 1
+            await assoc.release()
+
+    async def acquire(self, host, port, called_ae, contexts, calling_ae=DEFAULT_CALLING_AE, transport=None):
+        """
+        Get an association covering the given contexts, reusing an idle one if possible.
+
+        Parameters:
+        - contexts: List of (abstract_syntax, [transfer_syntax, ...]) the caller needs
+        - transport: Optional transport settings (see TransportTuner); idle associations
+          opened with other settings are not reused
+
+        Returns:
+        - (Association, reused) where reused tells whether it came from the pool
+        """
+        await self._expire_idle()
+        key = self._key(host, port, called_ae, calling_ae)
+        needed = [(abstract, ts) for abstract, syntaxes in contexts for ts in syntaxes]
+
+        wanted = {name: value for name, value in (transport or {}).items() if value}
+        entries = self.idle.get(key, [])
+        for index, (assoc, _) in enumerate(entries):
+            if set(needed) <= assoc.proposed and assoc.transport == wanted:
+                del entries[index]
+                self.hits += 1
+                return assoc, True
+        if entries:
+            self.renegotiations += 1
+
+        # Propose everything sent to this destination so far, so later sends can reuse the association
+        known = self.known_contexts.setdefault(key, [])
+        for pair in needed:
+            if pair in known:
+                known.remove(pair)
+            known.append(pair)
+        del known[:-MAX_PRESENTATION_CONTEXTS]
+
+        self.misses += 1
+        assoc = Association(host, port, called_ae, calling_ae, transport=transport)
+        await assoc.connect([(abstract, [ts]) for abstract, ts in known])
+        return assoc, False
+
+    async def release(self, assoc):
+        """Return an association to the pool, or release it if it broke or pooling is off"""
+        key = self._key(assoc.host, assoc.port, assoc.called_ae, assoc.calling_ae)
+        entries = self.idle.setdefault(key, [])
+        if not assoc.is_established or self.idle_timeout <= 0 or len(entries) >= self.max_idle_per_key:
+            await assoc.release()
+            return
+        entries.append((assoc, time.monotonic()))
+
+    async def discard(self, assoc):
+        """Abort an association that must not be reused"""
+        await assoc.abort()
+
+    async def close_all(self):
+        """Release every idle association"""
+        for entries in self.idle.values():
+            for assoc, _ in entries:
+                await assoc.release()
+        self.idle = {}
+
+    def stats(self):
+        """Return pool hit/miss statistics"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "renegotiations": self.renegotiations,
+            "expired": self.expired,
+            "idle": sum(len(entries) for entries in self.idle.values())
+        }
+
+_loop = None
+_pool = None
+_loop_lock = threading.Lock()
+
+def _reap_idle(loop, pool):
+    """Periodically release associations that have been idle for too long"""
+    loop.create_task(pool._expire_idle())
+    loop.call_later(max(1, pool.idle_timeout / 2), _reap_idle, loop, pool)
+
+def get_native_loop():
+    """Return the event loop shared by the native backend, running in a background thread"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="native-dicom-loop", daemon=True).start()
+        return _loop
+
+def run_on_native_loop(coroutine):
+    """Run a coroutine on the shared native loop and wait for its result"""
+    return asyncio.run_coroutine_threadsafe(coroutine, get_native_loop()).result()
+
+def get_association_pool():
+    """Return the association pool shared by every native send in this process"""
+    global _pool
+    loop = get_native_loop()
+    with _loop_lock:
+        if _pool is None:
+            from src.utils.config import ConfigManager
+            idle_timeout = ConfigManager().get_value("association_idle_timeout", DEFAULT_IDLE_TIMEOUT)
+            _pool = AssociationPool(idle_timeout)
+            if idle_timeout > 0:
+                loop.call_soon_threadsafe(_reap_idle, loop, _pool)
+            logging.info(f"Association pool created with {idle_timeout} s idle timeout")
+        return _pool
@@ -0,0 +1,115 @@
+"""
+Minimal asyncio Storage SCP that accepts everything and discards the data, used as a loopback stand-in PACS
+
+Run it with: python -m src.dicom.native.scp --port 11112 [--ae-title STORESCP]
+"""
+
+import sys
+import asyncio
+import struct
+import logging
+import argparse
+from src.dicom.native import pdu, dimse
+
+# Largest PDU we announce; big enough not to limit senders on loopback
+SCP_MAX_PDU = 1024 * 1024
+
+class LoopbackSCP:
+    """
+    Storage SCP that accepts every proposed presentation context with its first transfer
+    syntax, answers every C-STORE and C-ECHO with Success and throws the datasets away.
+
+    Because nothing is written to disk, a benchmark against it measures the sender.
+    """
+
+    def __init__(self, ae_title="STORESCP", max_pdu=SCP_MAX_PDU):
+        self.ae_title = ae_title
+        self.max_pdu = max_pdu
+        self.stats = {"associations": 0, "stored": 0, "bytes": 0}
+
+    async def _read_pdu(self, reader):
+        header = await reader.readexactly(6)
+        pdu_type, _, length = struct.unpack(">BBI", header)
+        return pdu_type, await reader.readexactly(length)
+
+    async def handle(self, reader, writer):
+        """Serve one association"""
+        try:
+            pdu_type, body = await self._read_pdu(reader)
+            if pdu_type != pdu.A_ASSOCIATE_RQ:
+                writer.write(pdu.encode_abort())
+                return
+            rq = pdu.decode_associate_rq(body)
+            results = [(pcid, pdu.PC_ACCEPTANCE, syntaxes[0]) if syntaxes else (pcid, 4, None)
+                       for pcid, _, syntaxes in rq["contexts"]]
+            writer.write(pdu.encode_associate_ac(rq["calling_ae"], rq["called_ae"], results, self.max_pdu))
+            await writer.drain()
+            self.stats["associations"] += 1
+            await self._serve(reader, writer)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _serve(self, reader, writer):
+        command = b""
+        request = None
+        while True:
+            pdu_type, body = await self._read_pdu(reader)
+            if pdu_type == pdu.A_RELEASE_RQ:
+                writer.write(pdu.encode_release_rp())
+                await writer.drain()
+                return
+            if pdu_type == pdu.A_ABORT:
+                return
+            if pdu_type != pdu.P_DATA_TF:
+                writer.write(pdu.encode_abort())
+                return
+            for pcid, is_command, is_last, data in pdu.decode_p_data(body):
+                if is_command:
+                    command += data
+                    if not is_last:
+                        continue
+                    request = dimse.decode_command(command)
+                    command = b""
+                    if request.get(0x00000800) == dimse.NO_DATASET:
+                        self._respond(writer, pcid, request)
+                        request = None
+                else:
+                    self.stats["bytes"] += len(data)
+                    if is_last and request is not None:
+                        self.stats["stored"] += 1
+                        self._respond(writer, pcid, request)
+                        request = None
+            await writer.drain()
+
+    def _respond(self, writer, pcid, request):
+        message_id = request.get(0x00000110, 0)
+        if request.get(0x00000100) == dimse.C_ECHO_RQ:
+            response = dimse.echo_rsp(message_id)
+        else:
+            response = dimse.store_rsp(message_id, request.get(0x00000002, ""), request.get(0x00001000, ""))
+        writer.write(pdu.encode_p_data(pcid, response, True, True))
+
+    async def serve_forever(self, host="127.0.0.1", port=11112):
+        server = await asyncio.start_server(self.handle, host, int(port))
+        logging.info(f"Loopback SCP {self.ae_title} listening on {host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="Loopback Storage SCP that discards everything it receives")
+    parser.add_argument("--port", type=int, default=11112, help="Port to listen on (default: 11112)")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--ae-title", default="STORESCP", help="AE title of the SCP (default: STORESCP)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    try:
+        asyncio.run(LoopbackSCP(args.ae_title).serve_forever(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
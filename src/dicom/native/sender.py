@@ -0,0 +1,295 @@
+"""
+Send and echo functions for the native asyncio backend, with the same result format as the dcm4che functions
+"""
+
+import asyncio
+import logging
+from pathlib import Path
+from src.dicom.native import dimse
+from src.dicom.native.association import Association, AssociationError
+from src.dicom.native.pool import get_association_pool, run_on_native_loop
+from src.dicom.storescu_batch import DEFAULT_BATCH_SIZE
+from src.dicom.storescu_output import is_success_status
+from src.dicom.dicom_modifier import cleanup_temp_files
+from src.dicom.coercion import coercion_edits, coerce_dataset, report_coercion
+from src.dicom.context_cache import get_context_cache, UNCOMPRESSED_TRANSFER_SYNTAXES, SKIP, TRANSCODE
+from src.dicom.transcode import transcode_file
+from src.dicom.compression import get_compression_syntax
+from src.dicom.transport import get_transport_tuner
+from src.utils.config import destination_key
+
+# Datasets at least this large are sent with sendfile ("large_object_threshold_mb")
+DEFAULT_LARGE_OBJECT_THRESHOLD_MB = 64
+
+def _contexts_for(headers, cache, destination, compression_syntax=None):
+    """
+    Build one presentation context per distinct (SOP class, transfer syntax) pair.
+
+    Compressed pairs the destination has not accepted before also get an Explicit VR
+    Little Endian fallback, so a rejection can be handled on the same association.
+    With WAN compression configured, uncompressed SOP classes also propose the
+    compressed syntax until the cache knows whether the destination accepts it.
+    """
+    contexts = []
+    for header in headers:
+        candidates = [(header.sop_class_uid, [header.transfer_syntax_uid])]
+        if (header.transfer_syntax_uid not in UNCOMPRESSED_TRANSFER_SYNTAXES and
+                cache.lookup(destination, header.sop_class_uid, header.transfer_syntax_uid) is None):
+            candidates.append((header.sop_class_uid, [dimse.EXPLICIT_VR_LITTLE_ENDIAN]))
+        if (compression_syntax and header.transfer_syntax_uid in UNCOMPRESSED_TRANSFER_SYNTAXES and
+                cache.lookup(destination, header.sop_class_uid, compression_syntax) is None):
+            candidates.append((header.sop_class_uid, [compression_syntax]))
+        for context in candidates:
+            if context not in contexts:
+                contexts.append(context)
+    return contexts
+
+async def _transcode(file_path, transfer_syntax_uid, transcoded):
+    """Transcode a file off the event loop, returning the header of the copy or None"""
+    loop = asyncio.get_running_loop()
+    # The batch keeps its copies until the association ends, so it must not wait for its own budget
+    output_path = await loop.run_in_executor(None, transcode_file, file_path, transfer_syntax_uid, False)
+    if output_path is None:
+        return None
+    transcoded[file_path] = output_path
+    return dimse.read_part10_header(output_path)
+
+def _store_result(response):
+    """Convert a C-STORE response into the per-file result dictionary"""
+    status = response["status"]
+    success = is_success_status(status)
+    return {
+        "success": success,
+        "status": status,
+        "output": f"iuid={response['sop_instance_uid']} status={status:04X}H",
+        "error": "" if success else (response["error_comment"] or f"C-STORE failed with status {status:04X}H"),
+        "bytes": response["bytes"],
+        "transfer_ms": round(response["seconds"] * 1000, 1)
+    }
+
+def _error_result(error):
+    return {"success": False, "output": "", "error": str(error)}
+
+async def send_files_over_association(file_paths, host, port, ae_title, on_result=None, pool=None, dicom_tags=None):
+    """
+    Send a list of files over a single association.
+
+    Parameters:
+    - file_paths: List of paths to DICOM Part 10 files
+    - host, port, ae_title: Destination
+    - on_result: Optional callback(file_path, result) called as each file completes
+    - pool: Optional AssociationPool to take the association from and return it to
+    - dicom_tags: Dictionary of DICOM tags to coerce while each dataset is sent; a file
+      whose tags cannot be coerced fails rather than being sent unchanged
+
+    Returns:
+    - Dictionary with results for each file, with the applied edits under "coerced"
+    """
+    results = {}
+    edits = coercion_edits(dicom_tags)
+    loop = asyncio.get_running_loop()
+
+    def record(file_path, result):
+        results[file_path] = result
+        if on_result:
+            on_result(file_path, result)
+
+    # Decide up front from cached negotiation results whether each file must be transcoded
+    cache = get_context_cache()
+    destination = destination_key(host, port, ae_title)
+    headers = {}
+    transcoded = {}
+    for file_path in file_paths:
+        try:
+            header = dimse.read_part10_header(file_path)
+            action, detail = cache.plan(destination, header.sop_class_uid, header.transfer_syntax_uid)
+            if action == SKIP:
+                record(file_path, _error_result(detail))
+                continue
+            if action == TRANSCODE:
+                header = await _transcode(file_path, detail, transcoded)
+                if header is None:
+                    record(file_path, _error_result(f"Failed to transcode to {detail}"))
+                    continue
+            headers[file_path] = header
+        except Exception as e:
+            record(file_path, _error_result(e))
+    if not headers:
+        return results
+
+    compression_syntax = get_compression_syntax(cache.config_manager, host, port, ae_title)
+    large_object_bytes = cache.config_manager.get_value(
+        "large_object_threshold_mb", DEFAULT_LARGE_OBJECT_THRESHOLD_MB) * 1024 * 1024
+    contexts = _contexts_for(headers.values(), cache, destination, compression_syntax)
+    tuner = get_transport_tuner()
+    transport = tuner.settings(host, port, ae_title)
+    try:
+        if pool:
+            assoc, reused = await pool.acquire(host, port, ae_title, contexts, transport=transport)
+        else:
+            assoc, reused = Association(host, port, ae_title, transport=transport), False
+            await assoc.connect(contexts)
+    except Exception as e:
+        for file_path in headers:
+            record(file_path, _error_result(f"Association failed: {e}"))
+        _cleanup_transcoded(transcoded)
+        return results
+    if not reused:
+        cache.record(destination, assoc.accepted.keys(), assoc.rejected)
+
+    bytes_before = assoc.bytes_sent
+    store_seconds = 0.0
+    try:
+        for file_path, header in headers.items():
+            if assoc.find_context(header.sop_class_uid, header.transfer_syntax_uid) is None:
+                # Rejected in this negotiation: fall back to an accepted uncompressed syntax
+                fallback = next((ts for ts in UNCOMPRESSED_TRANSFER_SYNTAXES
+                                 if assoc.find_context(header.sop_class_uid, ts) is not None), None)
+                header = await _transcode(file_path, fallback, transcoded) if fallback else None
+                if header is None:
+                    record(file_path, _error_result(
+                        f"No accepted presentation context for {headers[file_path].sop_class_uid} / "
+                        f"{headers[file_path].transfer_syntax_uid}"
+                    ))
+                    continue
+            send_path = transcoded.get(file_path, file_path)
+            coerced = None
+            if edits:
+                try:
+                    # Reading and re-encoding the start of the dataset is blocking file work
+                    coerced = await loop.run_in_executor(None, coerce_dataset, send_path, edits)
+                except Exception as e:
+                    record(file_path, _error_result(f"Could not coerce tags: {e}"))
+                    continue
+            try:
+                response = await assoc.c_store_file(send_path, header, coerced=coerced,
+                                                    zero_copy=header.dataset_size >= large_object_bytes)
+                store_seconds += response["seconds"]
+                record(file_path, report_coercion(_store_result(response), edits))
+            except (AssociationError, ConnectionError) as e:
+                # The peer may have closed a pooled association while it was idle. Resend only if
+                # the connection broke before any of the dataset was written, so nothing is stored twice
+                if reused and isinstance(e, ConnectionError) and not assoc.dataset_started:
+                    await pool.discard(assoc)
+                    retry = [path for path in headers if path not in results]
+                    results.update(await send_files_over_association(retry, host, port, ae_title, on_result,
+                                                                     pool=pool, dicom_tags=dicom_tags))
+                    return results
+                record(file_path, _error_result(e))
+                if not assoc.is_established:
+                    break
+            reused = False
+        for file_path in headers:
+            if file_path not in results:
+                record(file_path, _error_result("Association closed before the file was sent"))
+        tuner.observe(host, port, ae_title, assoc.connect_time, assoc.bytes_sent - bytes_before, store_seconds,
+                      assoc.transport)
+    except asyncio.CancelledError:
+        # A store may have been cut off mid-dataset, so the association cannot be released or reused
+        await assoc.abort()
+        raise
+    finally:
+        if pool:
+            await pool.release(assoc)
+        else:
+            await assoc.release()
+        _cleanup_transcoded(transcoded)
+    return results
+
+def _cleanup_transcoded(transcoded):
+    for output_path in transcoded.values():
+        cleanup_temp_files(output_path)
+
+async def send_multiple_dicom_native_async(file_paths, host, port, ae_title, on_result=None,
+                                           batch_size=DEFAULT_BATCH_SIZE, max_associations=1, pool=None,
+                                           dicom_tags=None):
+    """
+    Send files over up to max_associations concurrent associations on the running event loop.
+
+    Each association carries up to batch_size files. With a pool, associations are
+    taken from and returned to it instead of being opened and released per batch.
+    dicom_tags are coerced in flight, as by send_files_over_association.
+
+    Returns:
+    - Dictionary with results for each file
+    """
+    batch_size = max(1, int(batch_size or DEFAULT_BATCH_SIZE))
+    semaphore = asyncio.Semaphore(max(1, int(max_associations)))
+
+    async def run_batch(batch):
+        async with semaphore:
+            return await send_files_over_association(batch, host, port, ae_title, on_result, pool, dicom_tags)
+
+    batches = [file_paths[i:i + batch_size] for i in range(0, len(file_paths), batch_size)]
+    results = {}
+    for batch_results in await asyncio.gather(*(run_batch(batch) for batch in batches)):
+        results.update(batch_results)
+    return results
+
+async def echo_dicom_native_async(host, port, ae_title):
+    """
+    Associate with the Verification SOP Class and send a C-ECHO.
+
+    Returns:
+    - Dictionary with success, status, association_ms, echo_ms and error
+    """
+    assoc = Association(host, port, ae_title)
+    try:
+        await assoc.connect([(dimse.VERIFICATION_SOP_CLASS, [dimse.IMPLICIT_VR_LITTLE_ENDIAN])])
+        status, rtt = await assoc.c_echo()
+        return {
+            "success": status == 0,
+            "status": status,
+            "association_ms": round(assoc.association_time * 1000, 1),
+            "echo_ms": round(rtt * 1000, 1),
+            "error": "" if status == 0 else f"C-ECHO failed with status {status:04X}H"
+        }
+    except Exception as e:
+        return {"success": False, "status": -1, "association_ms": None, "echo_ms": None, "error": str(e)}
+    finally:
+        await assoc.release()
+
+def echo_dicom_native(host, port, ae_title):
+    """Blocking wrapper around echo_dicom_native_async"""
+    return run_on_native_loop(echo_dicom_native_async(host, port, ae_title))
+
+def send_multiple_dicom_native(file_paths, host, port, ae_title, progress_callback=None, dicom_tags=None,
+                               batch_size=DEFAULT_BATCH_SIZE, max_associations=1):
+    """
+    Send multiple DICOM files with the native asyncio backend.
+
+    Parameters:
+    - file_paths: List of paths to the DICOM files
+    - host: PACS server hostname/IP
+    - port: PACS server port
+    - ae_title: AE Title of the PACS server
+    - progress_callback: Optional callback function to update progress
+    - dicom_tags: Dictionary of DICOM tags to modify
+    - batch_size: Maximum number of files sent over one association
+    - max_associations: Number of associations opened concurrently
+
+    Returns:
+    - Dictionary with results for each file
+    """
+    total_files = len(file_paths)
+    if progress_callback:
+        progress_callback(0, total_files, "Starting...")
+
+    completed = [0]
+
+    def on_result(file_path, result):
+        completed[0] += 1
+        if progress_callback:
+            progress_callback(completed[0], total_files, Path(file_path).name)
+
+    # Associations come from the shared pool so successive sends can reuse them;
+    # tag modifications are applied in flight, without temporary copies
+    pool = get_association_pool()
+    results = run_on_native_loop(send_multiple_dicom_native_async(
+        file_paths, host, port, ae_title, on_result, batch_size, max_associations, pool, dicom_tags
+    ))
+    logging.info(f"Association pool statistics: {pool.stats()}")
+
+    if progress_callback:
+        progress_callback(total_files, total_files, "Completed")
+    return results
@@ -0,0 +1,177 @@
+"""
+Read-ahead of upcoming files into the page cache while earlier files are being sent
+"""
+
+import os
+import time
+import logging
+import threading
+from src.utils.config import ConfigManager
+
+DEFAULT_PREFETCH_FILES = 200
+DEFAULT_PREFETCH_BUDGET_MB = 256
+
+# Size of the reads that pull a file into the page cache
+READ_CHUNK_SIZE = 1024 * 1024
+
+def order_for_locality(file_paths):
+    """
+    Order files by directory, then by inode number within each directory.
+
+    On most file systems inode order follows allocation order, so reading in this
+    order mostly moves a disk head forward. Files that cannot be stat'ed keep their
+    relative order at the end.
+
+    Returns:
+    - New list with the same files
+    """
+    located = []
+    missing = []
+    for file_path in file_paths:
+        try:
+            located.append((os.path.dirname(os.path.abspath(file_path)), os.stat(file_path).st_ino, file_path))
+        except OSError:
+            missing.append(file_path)
+    located.sort(key=lambda entry: entry[:2])
+    return [file_path for _, _, file_path in located] + missing
+
+def warm_file(file_path, buffer):
+    """
+    Pull a file into the page cache.
+
+    The whole file is hinted with posix_fadvise(WILLNEED) where available, so the kernel
+    reads it in large requests, and then read through so that it is resident when the
+    sender opens it.
+
+    Returns:
+    - Number of bytes read
+    """
+    fd = os.open(file_path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        total = 0
+        view = memoryview(buffer)
+        with os.fdopen(fd, "rb", buffering=0, closefd=False) as f:
+            while True:
+                count = f.readinto(view)
+                if not count:
+                    return total
+                total += count
+    finally:
+        os.close(fd)
+
+class Prefetcher:
+    """
+    Warms the next files of a send queue on a background thread.
+
+    With reorder, the queue is put in directory and inode order (see order_for_locality);
+    the sender should send in the order of the queue attribute.
+
+    At most max_files files and budget_bytes bytes are kept warmed ahead of the sender;
+    the sender calls consume() with the files it is about to send, which frees their
+    share of the budget. Files the sender reaches before they were warmed are skipped,
+    so the prefetcher never competes with the sender for the same file.
+
+    The counters tell how much disk time was moved off the send path: hidden_seconds is
+    the time spent reading files that were then sent warm (hits); misses are files the
+    sender had to read cold.
+    """
+
+    def __init__(self, file_paths, max_files=DEFAULT_PREFETCH_FILES,
+                 budget_bytes=DEFAULT_PREFETCH_BUDGET_MB * 1024 * 1024, reorder=True):
+        self.queue = order_for_locality(file_paths) if reorder else list(file_paths)
+        self.max_files = max(1, int(max_files))
+        self.budget_bytes = max(1, int(budget_bytes))
+        self.condition = threading.Condition()
+        self.warmed = {}
+        self.consumed = set()
+        self.outstanding_bytes = 0
+        self.closed = False
+        self.stats = {
+            "files": 0, "bytes": 0, "io_seconds": 0.0, "hidden_seconds": 0.0,
+            "hits": 0, "misses": 0, "errors": 0
+        }
+        self.thread = threading.Thread(target=self._run, name="prefetch", daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def for_files(cls, file_paths, reorder=True, config_manager=None):
+        """Create a prefetcher as configured, or return None when prefetching is off"""
+        config_manager = config_manager or ConfigManager()
+        max_files = config_manager.get_value("prefetch_files", DEFAULT_PREFETCH_FILES)
+        budget_mb = config_manager.get_value("prefetch_budget_mb", DEFAULT_PREFETCH_BUDGET_MB)
+        if not max_files or not budget_mb or len(file_paths) < 2:
+            return None
+        return cls(file_paths, max_files, budget_mb * 1024 * 1024, reorder)
+
+    def _run(self):
+        buffer = bytearray(READ_CHUNK_SIZE)
+        for file_path in self.queue:
+            try:
+                size = os.path.getsize(file_path)
+            except OSError:
+                continue
+            with self.condition:
+                # A file larger than the whole budget is warmed on its own
+                while not self.closed and self.warmed and (
+                        len(self.warmed) >= self.max_files
+                        or self.outstanding_bytes + size > self.budget_bytes):
+                    self.condition.wait()
+                if self.closed:
+                    return
+                if file_path in self.consumed:
+                    continue
+            start = time.perf_counter()
+            try:
+                size = warm_file(file_path, buffer)
+            except OSError as e:
+                logging.debug(f"Could not prefetch {file_path}: {str(e)}")
+                with self.condition:
+                    self.stats["errors"] += 1
+                continue
+            seconds = time.perf_counter() - start
+            with self.condition:
+                self.stats["files"] += 1
+                self.stats["bytes"] += size
+                self.stats["io_seconds"] += seconds
+                if file_path in self.consumed:
+                    continue
+                self.warmed[file_path] = (size, seconds)
+                self.outstanding_bytes += size
+
+    def consume(self, file_paths):
+        """Tell the prefetcher that the sender is about to read these files"""
+        with self.condition:
+            for file_path in file_paths:
+                self.consumed.add(file_path)
+                warmed = self.warmed.pop(file_path, None)
+                if warmed:
+                    size, seconds = warmed
+                    self.outstanding_bytes -= size
+                    self.stats["hits"] += 1
+                    self.stats["hidden_seconds"] += seconds
+                else:
+                    self.stats["misses"] += 1
+            self.condition.notify_all()
+
+    def summary(self):
+        """Return a copy of the counters"""
+        with self.condition:
+            summary = dict(self.stats)
+        summary["io_seconds"] = round(summary["io_seconds"], 3)
+        summary["hidden_seconds"] = round(summary["hidden_seconds"], 3)
+        return summary
+
+    def close(self):
+        """Stop prefetching and log the counters"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join(timeout=5)
+        summary = self.summary()
+        if summary["files"]:
+            logging.info(f"Prefetched {summary['files']} files ({summary['bytes'] / (1024 * 1024):.1f} MB); "
+                         f"{summary['hits']} of {summary['hits'] + summary['misses']} files were warm when sent, "
+                         f"hiding {summary['hidden_seconds']:.2f}s of disk reads")
+        return summary
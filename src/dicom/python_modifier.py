@@ -0,0 +1,200 @@
+"""
+In-process tag modification with pydicom, for edits too simple to be worth starting a DicomModifier JVM
+"""
+
+import os
+import shutil
+import logging
+from pydicom.datadict import dictionary_VR
+from pydicom.errors import InvalidDicomError
+from pydicom.tag import Tag
+from pydicom.uid import UID
+from src.dicom.header_splice import PIXEL_DATA_TAGS, read_header, write_spliced
+
+# Tag modifier backends ("tag_modifier_backend"); "auto" uses Python for simple edits
+MODIFIER_BACKENDS = ("auto", "java", "python")
+DEFAULT_MODIFIER_BACKEND = "auto"
+
+# Value representations that take the edit string as it is
+STRING_VRS = {"AE", "AS", "CS", "DA", "DS", "DT", "IS", "LO", "LT", "PN", "SH", "ST", "TM", "UC", "UI", "UR", "UT"}
+
+# Binary numeric value representations and the type their edit strings are converted to
+NUMERIC_VRS = {"US": int, "SS": int, "UL": int, "SL": int, "UV": int, "SV": int, "FL": float, "FD": float}
+
+DEFLATED_EXPLICIT_VR_LITTLE_ENDIAN = "1.2.840.10008.1.2.1.99"
+SOP_INSTANCE_UID = 0x00080018
+
+class UnsupportedFile(Exception):
+    """The file cannot be modified by passing its pixel data through unchanged"""
+
+def _parse_tag(tag_name):
+    return Tag(int(tag_name, 16))
+
+def is_simple_edit(dicom_tags):
+    """
+    Check whether an edit set can be applied in Python without surprises.
+
+    Simple edits set top level data elements of the standard dictionary whose VR is a
+    string VR, such as PatientID, PatientName and the instance UIDs, to ASCII values.
+    Private tags, file meta information, numeric and binary VRs and elements at or
+    after the pixel data are left to DicomModifier.
+    """
+    if not dicom_tags or not isinstance(dicom_tags, dict):
+        return False
+    for tag_name, tag_value in dicom_tags.items():
+        if not tag_value:
+            continue
+        try:
+            tag = _parse_tag(tag_name)
+            vr = dictionary_VR(tag)
+        except (ValueError, KeyError):
+            return False
+        if tag.is_private or tag.group == 0x0002 or tag.element == 0 or tag >= 0x7FE00000:
+            return False
+        if vr not in STRING_VRS or not str(tag_value).isascii():
+            return False
+    return True
+
+def _edit_vr(ds, tag, tag_name):
+    """VR for an edited element: the one in the file, else the dictionary's, else DicomModifier's guess"""
+    if tag in ds:
+        return ds[tag].VR
+    try:
+        vr = dictionary_VR(tag)
+        if vr in STRING_VRS or vr in NUMERIC_VRS:
+            return vr
+    except KeyError:
+        pass
+    return "UI" if tag_name.upper().endswith("UID") else "LO"
+
+def _edit_value(vr, value):
+    """Convert an edit string to the value type of its VR; backslashes separate multiple values"""
+    if vr in STRING_VRS:
+        return value
+    if vr not in NUMERIC_VRS:
+        raise ValueError(f"Cannot set an element with VR {vr} from text")
+    values = [NUMERIC_VRS[vr](part) for part in value.split("\\")]
+    return values[0] if len(values) == 1 else values
+
+def parse_edits(dicom_tags):
+    """
+    Parse an edit set, skipping tags without a value.
+
+    Returns:
+    - List of (tag, tag_name, value)
+
+    Raises:
+    - ValueError for a tag that is not 8 hexadecimal digits
+    """
+    return [(_parse_tag(tag_name), tag_name, str(tag_value))
+            for tag_name, tag_value in (dicom_tags or {}).items() if tag_value]
+
+def apply_edits(ds, edits):
+    """
+    Apply parsed edits to a dataset read by header_splice.read_header.
+
+    The Media Storage SOP Instance UID follows an edited SOP Instance UID, and group
+    length elements are dropped, since the edits would make them wrong.
+    """
+    for tag, tag_name, tag_value in edits:
+        vr = _edit_vr(ds, tag, tag_name)
+        if tag in ds:
+            ds[tag].value = _edit_value(vr, tag_value)
+        else:
+            ds.add_new(tag, vr, _edit_value(vr, tag_value))
+        if tag == SOP_INSTANCE_UID and getattr(ds, "file_meta", None) is not None:
+            ds.file_meta.MediaStorageSOPInstanceUID = UID(tag_value)
+    for tag in [tag for tag in ds.keys() if tag.element == 0]:
+        del ds[tag]
+
+def check_spliceable(ds):
+    """Raise UnsupportedFile unless the rest of the file can follow the edited header unchanged"""
+    file_meta = getattr(ds, "file_meta", None)
+    transfer_syntax = file_meta.get("TransferSyntaxUID") if file_meta is not None else None
+    if not transfer_syntax:
+        raise UnsupportedFile("File has no file meta information")
+    if transfer_syntax == DEFLATED_EXPLICIT_VR_LITTLE_ENDIAN:
+        raise UnsupportedFile("Dataset is deflated")
+    return UID(transfer_syntax)
+
+def read_for_edits(src, edits):
+    """
+    Read the part of an open file that the edits touch.
+
+    Returns:
+    - Tuple of (dataset, splice offset, transfer syntax UID)
+
+    Raises:
+    - UnsupportedFile if the file cannot be spliced or an edit is at or after the pixel data
+    """
+    last_tag = max(tag for tag, _, _ in edits)
+    if last_tag >= min(PIXEL_DATA_TAGS):
+        raise UnsupportedFile("Edits at or after the pixel data")
+    try:
+        ds, splice_offset = read_header(src, last_tag)
+    except InvalidDicomError as e:
+        raise UnsupportedFile(str(e))
+    return ds, splice_offset, check_spliceable(ds)
+
+def _save(ds, f):
+    try:
+        ds.save_as(f, enforce_file_format=True)
+    except TypeError:
+        # pydicom 2 takes the encoding from the dataset, as it was read
+        ds.save_as(f, write_like_original=False)
+
+def modify_dicom_tags_python(input_file, dicom_tags, output_file):
+    """
+    Modify DICOM tags of a file with pydicom, copying its pixel data unchanged.
+
+    Only the elements up to the last edited tag are read, edited and written in the
+    transfer syntax of the input; the rest of the file, pixel data included, is spliced
+    in behind them by header_splice with copy_file_range or sendfile, so neither the
+    time nor the memory a small edit takes depends on the size of the object. Group
+    length elements of the rewritten part are dropped, since the edits would make them
+    wrong.
+
+    Parameters:
+    - input_file: Path to the input DICOM file
+    - dicom_tags: Dictionary of DICOM tags to modify (e.g., {"00100020": "12345"})
+    - output_file: Path of the modified file
+
+    Returns:
+    - output_file
+
+    Raises:
+    - UnsupportedFile for files without file meta information, with a deflated dataset,
+      or for edits at or after the pixel data
+    """
+    edits = parse_edits(dicom_tags)
+    if not edits:
+        shutil.copyfile(input_file, output_file)
+        return output_file
+
+    with open(input_file, "rb") as src:
+        ds, splice_offset, _ = read_for_edits(src, edits)
+        apply_edits(ds, edits)
+        write_spliced(lambda dst: _save(ds, dst), src, splice_offset, output_file)
+    logging.info(f"Modified {len(dicom_tags)} tags of {input_file} in Python, output saved to: {output_file}")
+    return output_file
+
+def modifier_backend_for(dicom_tags, backend=DEFAULT_MODIFIER_BACKEND):
+    """
+    Resolve the configured tag modifier backend for an edit set.
+
+    Returns:
+    - "python" or "java"
+    """
+    if backend not in MODIFIER_BACKENDS:
+        logging.warning(f"Unknown tag modifier backend {backend!r}, using {DEFAULT_MODIFIER_BACKEND}")
+        backend = DEFAULT_MODIFIER_BACKEND
+    if backend == "auto":
+        return "python" if is_simple_edit(dicom_tags) else "java"
+    return backend
+
+def remove_partial_output(output_file):
+    """Remove what a failed modification left behind"""
+    try:
+        os.remove(output_file)
+    except OSError:
+        pass
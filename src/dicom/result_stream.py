@@ -0,0 +1,224 @@
+"""
+Bounded-memory streaming of send results: compact per-file records, failure logs spilled to disk, aggregate counters
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import Counter
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from src.dicom.storescu_batch import DEFAULT_BATCH_SIZE
+from src.dicom.concurrent_send import DEFAULT_MAX_ASSOCIATIONS, get_destination_limiter, send_chunk
+from src.dicom.storescu_output import throughput
+from src.dicom.retry import with_retries
+from src.utils.config import destination_key
+
+# Log text kept in memory for a failed file when no spill file is used
+MAX_FAILURE_LOG_CHARS = 2000
+
+# Result fields copied into the compact record
+_COMPACT_FIELDS = ("success", "status", "bytes", "association_ms", "transfer_ms",
+                   "attempts", "failure_class", "skipped", "coerced")
+
+def _tail(text, limit):
+    return text if len(text) <= limit else "..." + text[-limit:]
+
+class FailureLog:
+    """
+    Append-only file holding the full log text of failed sends.
+
+    Compact records refer to their entry by byte offset, so the text can be read back on demand.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = open(path, "a", encoding="utf-8", errors="replace")
+
+    def write(self, file_path, text):
+        """Append the log text of one file and return its offset"""
+        with self.lock:
+            offset = self.file.tell()
+            self.file.write(f"==== {file_path}\n{text.rstrip()}\n")
+            self.file.flush()
+            return offset
+
+    def read(self, offset):
+        """Read back the entry written at offset"""
+        with open(self.path, "r", encoding="utf-8", errors="replace") as f:
+            f.seek(offset)
+            lines = [f.readline()]
+            for line in f:
+                if line.startswith("==== "):
+                    break
+                lines.append(line)
+        return "".join(lines)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+def compact_result(file_path, result, failure_log=None, max_log_chars=MAX_FAILURE_LOG_CHARS):
+    """
+    Reduce a per-file send result to a small record.
+
+    Log output is dropped for successful files. For failures the full output and error
+    go to failure_log when given (the record keeps its offset in "log_offset"), otherwise
+    the error is kept, truncated to its last max_log_chars characters.
+
+    Returns:
+    - Dictionary with file, error and whichever of success, status, bytes, association_ms,
+      transfer_ms, attempts, failure_class and skipped the result had
+    """
+    record = {"file": file_path, "error": ""}
+    for field in _COMPACT_FIELDS:
+        if result.get(field) is not None:
+            record[field] = result[field]
+    record["success"] = bool(result.get("success"))
+    if not record["success"]:
+        error = result.get("error") or ""
+        if failure_log is not None:
+            record["log_offset"] = failure_log.write(file_path, f"{result.get('output') or ''}\n{error}")
+            record["error"] = _tail(error, 200)
+        else:
+            record["error"] = _tail(error, max_log_chars)
+    return record
+
+class SendCounters:
+    """Aggregate counters over a stream of compact records, without keeping the records"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+        self.total = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.skipped = 0
+        self.bytes = 0
+        self.retried = 0
+        self.statuses = Counter()
+        self.failure_classes = Counter()
+
+    def add(self, record):
+        with self.lock:
+            self.total += 1
+            if record.get("skipped"):
+                self.skipped += 1
+            elif record["success"]:
+                self.succeeded += 1
+                self.bytes += record.get("bytes") or 0
+            else:
+                self.failed += 1
+                self.failure_classes[record.get("failure_class", "unknown")] += 1
+            if record.get("status") is not None:
+                self.statuses[f"{record['status']:04X}H"] += 1
+            if record.get("attempts", 1) > 1:
+                self.retried += 1
+
+    def summary(self):
+        """Return the counters and the throughput of the successfully sent files so far"""
+        with self.lock:
+            return {
+                "total": self.total,
+                "success": self.succeeded,
+                "failed": self.failed,
+                "skipped": self.skipped,
+                "retried": self.retried,
+                "statuses": dict(self.statuses),
+                "failure_classes": dict(self.failure_classes),
+                "throughput": throughput(self.succeeded, self.bytes, time.time() - self.start_time)
+            }
+
+def iter_send_results(file_paths, host, port, ae_title, dicom_tags=None, batch_size=DEFAULT_BATCH_SIZE,
+                      max_associations=DEFAULT_MAX_ASSOCIATIONS, backend="dcm4che", retry_policy=None,
+                      failure_log=None, counters=None):
+    """
+    Send files and yield one compact record per file as its association completes.
+
+    file_paths may be any iterable, including a generator; it is consumed lazily, so
+    only the chunks in flight (at most two per association) are held in memory.
+    Records are yielded in completion order.
+
+    Parameters:
+    - file_paths: Iterable of paths to the DICOM files
+    - host, port, ae_title: Destination
+    - dicom_tags: Dictionary of DICOM tags to modify
+    - batch_size: Maximum number of files sent over one association
+    - max_associations: Maximum parallel associations to this destination
+    - backend: "dcm4che", "daemon" or "native"
+    - retry_policy: Optional RetryPolicy; transient failures are retried before their record is yielded
+    - failure_log: Optional FailureLog receiving the full log text of failures
+    - counters: Optional SendCounters updated with every record
+
+    Yields:
+    - Compact records as returned by compact_result
+    """
+    max_associations = max(1, int(max_associations or 1))
+    batch_size = max(1, int(batch_size or DEFAULT_BATCH_SIZE))
+    limiter = get_destination_limiter(host, port, ae_title, max_associations)
+
+    def send_files(chunk, host, port, ae_title, progress_callback=None):
+        with limiter:
+            return send_chunk(backend, chunk, host, port, ae_title, dicom_tags)
+    send_function = with_retries(send_files, retry_policy) if retry_policy else send_files
+
+    def run_chunk(chunk):
+        try:
+            chunk_results = send_function(chunk, host, port, ae_title)
+        except Exception as e:
+            logging.error(f"Failed to send chunk of {len(chunk)} files: {str(e)}")
+            chunk_results = {}
+        missing = {"success": False, "output": "", "error": "No result reported for this file"}
+        return [compact_result(path, chunk_results.get(path, missing), failure_log) for path in chunk]
+
+    logging.info(f"Streaming send to {destination_key(host, port, ae_title)}, "
+                 f"up to {max_associations} associations in parallel")
+    paths = iter(file_paths)
+    in_flight = set()
+    with ThreadPoolExecutor(max_workers=max_associations) as executor:
+        while True:
+            while len(in_flight) < 2 * max_associations:
+                chunk = list(islice(paths, batch_size))
+                if not chunk:
+                    break
+                in_flight.add(executor.submit(run_chunk, chunk))
+            if not in_flight:
+                break
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                for record in future.result():
+                    if counters is not None:
+                        counters.add(record)
+                    yield record
+
+def send_streaming(file_paths, host, port, ae_title, progress_callback=None, failure_log_path=None, **kwargs):
+    """
+    Send files with bounded memory and return only the aggregate counters and failed records.
+
+    Parameters:
+    - file_paths: Iterable of paths to the DICOM files
+    - progress_callback: Optional callback(completed, total, current_file); total is None
+      when file_paths has no length
+    - failure_log_path: Optional path of a file receiving the full log text of failures
+    - kwargs: Passed on to iter_send_results
+
+    Returns:
+    - (summary, failures) with the SendCounters summary and the compact records of failed files
+    """
+    total = len(file_paths) if hasattr(file_paths, "__len__") else None
+    counters = SendCounters()
+    failure_log = FailureLog(failure_log_path) if failure_log_path else None
+    failures = []
+    try:
+        for record in iter_send_results(file_paths, host, port, ae_title, failure_log=failure_log,
+                                        counters=counters, **kwargs):
+            if not record["success"]:
+                failures.append(record)
+            if progress_callback:
+                progress_callback(counters.total, total, os.path.basename(record["file"]))
+    finally:
+        if failure_log:
+            failure_log.close()
+    return counters.summary(), failures
@@ -0,0 +1,196 @@
+"""
+Failure classification and retries with jittered exponential backoff for the send functions
+"""
+
+import re
+import time
+import heapq
+import random
+import logging
+import threading
+
+TRANSIENT = "transient"
+PERMANENT = "permanent"
+
+DEFAULT_MAX_ATTEMPTS = 4
+DEFAULT_BASE_DELAY = 2.0
+DEFAULT_MAX_DELAY = 60.0
+
+# DIMSE statuses worth retrying: Refused - Out of Resources (A7xx) and Resource Limitation (0213H)
+TRANSIENT_STATUS_MASKS = ((0xFF00, 0xA700), (0xFFFF, 0x0213))
+
+STATUS_IN_TEXT_PATTERN = re.compile(r"status[ =]([0-9A-Fa-f]{1,4})H")
+
+# Failures without a DIMSE status are classified from the error text, permanent patterns first
+PERMANENT_ERROR_PATTERNS = re.compile(
+    r"rejected-permanent|result=1,|No accepted presentation context|not supported|"
+    r"Not a DICOM Part 10 file|No such file|Failed to transcode|does not support SOP Class|"
+    r"accepts no transfer syntax",
+    re.IGNORECASE
+)
+TRANSIENT_ERROR_PATTERNS = re.compile(
+    r"timed? ?out|Connection refused|Connection reset|Broken pipe|abort|Association rejected|"
+    r"rejected-transient|AAssociateRJ|Association failed|Association closed|No C-STORE response|"
+    r"No result reported|Unexpected end|released by peer",
+    re.IGNORECASE
+)
+
+def classify_failure(result):
+    """
+    Decide whether a failed send result is worth retrying.
+
+    The DIMSE status decides when known: A7xx and 0213H are transient, every other
+    failure status (e.g. C000H, 0122H SOP Class not supported) is permanent. Without
+    a status the error text is matched against known connection and negotiation errors.
+
+    Returns:
+    - TRANSIENT or PERMANENT
+    """
+    status = result.get("status")
+    if status is None:
+        match = STATUS_IN_TEXT_PATTERN.search(result.get("error", ""))
+        status = int(match.group(1), 16) if match else None
+    if status is not None and status >= 0:
+        return TRANSIENT if any(status & mask == value for mask, value in TRANSIENT_STATUS_MASKS) else PERMANENT
+
+    error = result.get("error", "")
+    if PERMANENT_ERROR_PATTERNS.search(error):
+        return PERMANENT
+    if TRANSIENT_ERROR_PATTERNS.search(error):
+        return TRANSIENT
+    return PERMANENT
+
+class RetryPolicy:
+    """How often and how long to wait before a transient failure is retried"""
+
+    def __init__(self, max_attempts=DEFAULT_MAX_ATTEMPTS, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY):
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @classmethod
+    def from_config(cls, config_manager):
+        """Build the policy from the retry_* configuration values"""
+        return cls(
+            config_manager.get_value("retry_max_attempts", DEFAULT_MAX_ATTEMPTS),
+            config_manager.get_value("retry_base_delay", DEFAULT_BASE_DELAY),
+            config_manager.get_value("retry_max_delay", DEFAULT_MAX_DELAY)
+        )
+
+    def delay(self, attempt):
+        """Seconds to wait after the given failed attempt, with full jitter"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+def with_retries(send_function, policy=None):
+    """
+    Wrap a send function so that transient failures are retried.
+
+    The wrapped function has the signature of send_function,
+    (file_paths, host, port, ae_title, progress_callback=None, **kwargs). All files are
+    sent in the first round; transient failures are then resent in later rounds once
+    their backoff has expired, grouping every file that is due into one call so the
+    send function keeps its batching and parallelism. No thread sleeps while other
+    files are ready to send.
+
+    Each result gets "attempts" and, when it failed, "failure_class".
+    """
+    policy = policy or RetryPolicy()
+
+    def send(file_paths, host, port, ae_title, progress_callback=None, **kwargs):
+        total_files = len(file_paths)
+        attempts = {file_path: 0 for file_path in file_paths}
+        results = {}
+        due = [(0.0, file_path) for file_path in file_paths]
+        first_round = True
+
+        while due:
+            wait = due[0][0] - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            now = time.monotonic()
+            batch = []
+            while due and due[0][0] <= now:
+                batch.append(heapq.heappop(due)[1])
+
+            if first_round:
+                round_results = send_function(batch, host, port, ae_title, progress_callback, **kwargs)
+                first_round = False
+            else:
+                logging.info(f"Retrying {len(batch)} files to {ae_title}@{host}:{port}")
+                round_results = send_function(batch, host, port, ae_title, None, **kwargs)
+
+            for file_path in batch:
+                result = round_results.get(file_path) or {
+                    "success": False, "output": "", "error": "No result reported for this file"
+                }
+                attempts[file_path] += 1
+                result["attempts"] = attempts[file_path]
+                if not result["success"]:
+                    result["failure_class"] = classify_failure(result)
+                    if result["failure_class"] == TRANSIENT and attempts[file_path] < policy.max_attempts:
+                        heapq.heappush(due, (now + policy.delay(attempts[file_path]), file_path))
+                results[file_path] = result
+
+            if progress_callback and due:
+                progress_callback(total_files - len(due), total_files, f"Retrying {len(due)} files")
+
+        retried = sum(1 for result in results.values() if result["attempts"] > 1)
+        if retried:
+            logging.info(f"Retried {retried} of {total_files} files to {ae_title}@{host}:{port}")
+        if progress_callback:
+            progress_callback(total_files, total_files, "Completed")
+        return {file_path: results[file_path] for file_path in file_paths}
+
+    return send
+
+class RetryScheduler:
+    """
+    Retries transient failures of per-file work queue items after their backoff delay.
+
+    Used by worker threads that take one file at a time: a transient failure is handed
+    back through requeue once its backoff expires, on a timer, so the worker moves on
+    to the next file instead of sleeping. Safe to use from several threads.
+    """
+
+    def __init__(self, policy, requeue):
+        self.policy = policy
+        self.requeue = requeue
+        self.attempts = {}
+        self.pending = 0
+        self.lock = threading.Lock()
+
+    def schedule(self, file_path, result):
+        """
+        Count an attempt at a file and schedule a retry if it failed transiently.
+
+        Sets "attempts" and, when the result failed, "failure_class" on the result.
+
+        Returns:
+        - True if the file will be requeued, False if the result is final
+        """
+        with self.lock:
+            attempts = self.attempts[file_path] = self.attempts.get(file_path, 0) + 1
+        result["attempts"] = attempts
+        if result["success"] or not self.policy:
+            return False
+        result["failure_class"] = classify_failure(result)
+        if result["failure_class"] != TRANSIENT or attempts >= self.policy.max_attempts:
+            return False
+
+        def requeue():
+            self.requeue(file_path)
+            with self.lock:
+                self.pending -= 1
+
+        with self.lock:
+            self.pending += 1
+        logging.info(f"Retrying {file_path} after attempt {attempts}: {result.get('error', '')}")
+        timer = threading.Timer(self.policy.delay(attempts), requeue)
+        timer.daemon = True
+        timer.start()
+        return True
+
+    def waiting(self):
+        """Return True while a retry is still waiting for its backoff"""
+        with self.lock:
+            return self.pending > 0
@@ -0,0 +1,205 @@
+"""
+Client for the resident DicomSendDaemon Java helper process
+"""
+
+import os
+import logging
+import threading
+import subprocess
+from src.utils.file_helpers import get_lib_dir
+from src.dicom.dicom_modifier import build_dicom_modifier
+from src.dicom.storescu_output import is_success_status
+from src.dicom.coercion import coercion_edits, report_coercion
+
+# Number of consecutive times a crashed helper is restarted before giving up
+MAX_RESTARTS = 3
+
+# Keeps helpers started at the same time from running the build script concurrently
+_build_lock = threading.Lock()
+
+class SendDaemonError(Exception):
+    """Raised when the send daemon reports an error or cannot be (re)started"""
+
+class SendDaemonClient:
+    """
+    Starts the DicomSendDaemon helper once and talks to it over stdin/stdout.
+
+    The helper keeps the dcm4che classes loaded between calls, so only the first
+    request pays for JVM startup. If the helper crashes it is restarted and the
+    interrupted request is retried once; a send is retried with only the files it
+    had not reported on.
+
+    A helper answers one request at a time, so a client serializes its callers;
+    SendDaemonPool gives concurrent callers a helper each.
+    """
+
+    def __init__(self, max_restarts=MAX_RESTARTS):
+        self.max_restarts = max_restarts
+        self.restart_count = 0
+        self.process = None
+        self.lock = threading.Lock()
+
+    def _java_dir(self):
+        return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "java")
+
+    def _log_stderr(self, stream):
+        """Drain the helper's log output so its pipe never fills up"""
+        for line in stream:
+            logging.debug(f"DicomSendDaemon: {line.rstrip()}")
+
+    def is_running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        """Start the helper process if it is not already running"""
+        if self.is_running():
+            return
+        java_dir = self._java_dir()
+        with _build_lock:
+            if not os.path.exists(os.path.join(java_dir, "DicomSendDaemon.class")) and not build_dicom_modifier():
+                raise SendDaemonError("DicomSendDaemon is not built and the build failed")
+
+        classpath = os.pathsep.join([java_dir, os.path.join(get_lib_dir(), "*")])
+        cmd = ["java", "-cp", classpath, "DicomSendDaemon"]
+        logging.info(f"Starting send daemon: {' '.join(cmd)}")
+        self.process = subprocess.Popen(
+            cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            text=True, encoding="utf-8", bufsize=1
+        )
+        threading.Thread(target=self._log_stderr, args=(self.process.stderr,), daemon=True).start()
+
+        ready = self.process.stdout.readline().strip()
+        if ready != "READY":
+            self.stop()
+            raise SendDaemonError(f"Send daemon failed to start: {ready or 'no output'}")
+
+    def stop(self):
+        """Ask the helper to exit, killing it if it does not respond"""
+        if self.process is None:
+            return
+        try:
+            if self.process.poll() is None:
+                self.process.stdin.write("QUIT\n")
+                self.process.stdin.flush()
+                self.process.wait(timeout=5)
+        except Exception:
+            self.process.kill()
+        self.process = None
+
+    def _restart(self):
+        if self.restart_count >= self.max_restarts:
+            raise SendDaemonError(f"Send daemon crashed {self.restart_count} times, giving up")
+        self.restart_count += 1
+        logging.warning(f"Send daemon is not running, restarting (attempt {self.restart_count})")
+        self.process = None
+        self.start()
+
+    def _exchange(self, fields, results):
+        """Write one request and append its RESULT rows to results until DONE/ERROR"""
+        if any("\t" in str(f) or "\n" in str(f) for f in fields):
+            raise SendDaemonError("Request fields must not contain tabs or newlines")
+        self.process.stdin.write("\t".join(str(f) for f in fields) + "\n")
+        self.process.stdin.flush()
+
+        while True:
+            line = self.process.stdout.readline()
+            if not line:
+                raise BrokenPipeError("Send daemon closed its output")
+            parts = line.rstrip("\n").split("\t")
+            if parts[0] == "RESULT":
+                results.append(parts[1:])
+            elif parts[0] == "DONE":
+                return results
+            elif parts[0] == "ERROR":
+                raise SendDaemonError(parts[1] if len(parts) > 1 else "Unknown error")
+
+    def request(self, fields, retry_fields=None):
+        """
+        Send a request, restarting the helper and retrying once if it has crashed.
+
+        Parameters:
+        - fields: The request fields
+        - retry_fields: Optional function given the rows received before the crash, returning
+          the fields of the request to retry, or None to not retry (default: retry fields)
+
+        Returns:
+        - The RESULT rows of the request and of its retry
+        """
+        with self.lock:
+            if not self.is_running():
+                if self.process is None:
+                    self.start()
+                else:
+                    self._restart()
+            results = []
+            try:
+                self._exchange(fields, results)
+            except (BrokenPipeError, OSError):
+                self._restart()
+                fields = retry_fields(results) if retry_fields else fields
+                if fields is not None:
+                    self._exchange(fields, results)
+            # Only consecutive crashes count towards the restart limit
+            self.restart_count = 0
+            return results
+
+    def echo(self, host, port, ae_title):
+        """
+        Send a C-ECHO through the helper.
+
+        Returns:
+        - Dictionary with success, status, association_ms and echo_ms
+        """
+        rows = self.request(["ECHO", ae_title, host, port])
+        if not rows or len(rows[0]) < 4:
+            return {"success": False, "status": None, "association_ms": None, "echo_ms": None,
+                    "error": "No C-ECHO result reported by send daemon"}
+        status, association_ms, echo_ms = rows[0][1:4]
+        return {
+            "success": int(status, 16) == 0,
+            "status": int(status, 16),
+            "association_ms": int(association_ms),
+            "echo_ms": int(echo_ms)
+        }
+
+    def send(self, file_paths, host, port, ae_title, dicom_tags=None):
+        """
+        Send files over one association through the helper.
+
+        If the helper crashes part way, only the files it had not reported on are sent
+        again, so no file is stored twice.
+
+        Returns:
+        - Dictionary with results for each file
+        """
+        file_paths = list(file_paths)
+        coerced = coercion_edits(dicom_tags)
+        tags = [f"{k}={v}" for k, v in coerced.items()]
+
+        def remaining(rows):
+            reported = {row[0] for row in rows if row}
+            rest = [file_path for file_path in file_paths if file_path not in reported]
+            return ["SEND", ae_title, host, port, len(tags)] + tags + rest if rest else None
+
+        try:
+            rows = self.request(["SEND", ae_title, host, port, len(tags)] + tags + file_paths, remaining)
+        except (SendDaemonError, OSError) as e:
+            return {file_path: {"success": False, "output": "", "error": str(e)} for file_path in file_paths}
+
+        results = {}
+        for file_path, status, iuid, message in (row[:4] for row in rows):
+            status = int(status, 16) if status != "-1" else -1
+            success = status >= 0 and is_success_status(status)
+            results[file_path] = report_coercion({
+                "success": success,
+                "status": status if status >= 0 else None,
+                "output": f"iuid={iuid} status={status:04X}H" if status >= 0 else "",
+                "error": "" if success else (message or f"C-STORE failed with status {status:04X}H")
+            }, coerced)
+        return results
+
+    def modify(self, input_file, output_file, dicom_tags):
+        """Modify tags through the helper, returning True on success"""
+        tags = [f"{k}={v}" for k, v in dicom_tags.items() if v]
+        rows = self.request(["MODIFY", input_file, output_file] + tags)
+        return bool(rows) and rows[0][1] == "0"
@@ -0,0 +1,115 @@
+"""
+Send daemon helpers shared by the application session, one per concurrent request
+"""
+
+import atexit
+import logging
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from src.utils.config import ConfigManager
+from src.dicom.send_daemon import SendDaemonClient
+from src.dicom.storescu_batch import DEFAULT_BATCH_SIZE
+
+# Helper processes started at most, one per concurrent request ("send_daemon_helpers")
+DEFAULT_SEND_DAEMON_HELPERS = 4
+
+class SendDaemonPool:
+    """
+    Send daemon helpers shared by concurrent callers, each request on a helper of its own.
+
+    A caller takes an idle helper, or starts a new one while fewer than max_helpers
+    exist, and otherwise waits until another caller's request completes. Helpers stay
+    running between requests, so each JVM starts only once.
+    """
+
+    def __init__(self, max_helpers=DEFAULT_SEND_DAEMON_HELPERS):
+        self.max_helpers = max(1, int(max_helpers))
+        self.helpers = []
+        self.idle = []
+        self.condition = threading.Condition()
+
+    @contextmanager
+    def helper(self):
+        """Borrow a helper client for the duration of one request"""
+        with self.condition:
+            while not self.idle and len(self.helpers) >= self.max_helpers:
+                self.condition.wait()
+            if self.idle:
+                client = self.idle.pop()
+            else:
+                client = SendDaemonClient()
+                self.helpers.append(client)
+        try:
+            yield client
+        finally:
+            with self.condition:
+                self.idle.append(client)
+                self.condition.notify()
+
+    def echo(self, host, port, ae_title):
+        """Send a C-ECHO through a helper, as SendDaemonClient.echo"""
+        with self.helper() as client:
+            return client.echo(host, port, ae_title)
+
+    def send(self, file_paths, host, port, ae_title, dicom_tags=None):
+        """Send files over one association through a helper, as SendDaemonClient.send"""
+        with self.helper() as client:
+            return client.send(file_paths, host, port, ae_title, dicom_tags)
+
+    def modify(self, input_file, output_file, dicom_tags):
+        """Modify tags through a helper, as SendDaemonClient.modify"""
+        with self.helper() as client:
+            return client.modify(input_file, output_file, dicom_tags)
+
+    def stop(self):
+        """Stop every helper"""
+        with self.condition:
+            for client in self.helpers:
+                client.stop()
+
+_daemon = None
+_daemon_lock = threading.Lock()
+
+def get_send_daemon():
+    """Return the send daemon helpers shared by the whole application session"""
+    global _daemon
+    with _daemon_lock:
+        if _daemon is None:
+            _daemon = SendDaemonPool(ConfigManager().get_value("send_daemon_helpers", DEFAULT_SEND_DAEMON_HELPERS))
+            atexit.register(_daemon.stop)
+        return _daemon
+
+def send_multiple_dicom_using_daemon(file_paths, host, port, ae_title, progress_callback=None,
+                                     dicom_tags=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Send multiple DICOM files through the shared send daemon, one association per batch.
+
+    Returns:
+    - Dictionary with results for each file
+    """
+    daemon = get_send_daemon()
+    results = {}
+    total_files = len(file_paths)
+    batch_size = max(1, int(batch_size or DEFAULT_BATCH_SIZE))
+
+    for start in range(0, total_files, batch_size):
+        batch = file_paths[start:start + batch_size]
+        if progress_callback:
+            progress_callback(start, total_files, Path(batch[0]).name)
+        try:
+            batch_results = daemon.send(batch, host, port, ae_title, dicom_tags)
+        except Exception as e:
+            batch_results = {}
+            logging.error(f"Send daemon failed: {str(e)}")
+        for file_path in batch:
+            results[file_path] = batch_results.get(file_path, {
+                "success": False,
+                "output": "",
+                "error": "No result reported by send daemon"
+            })
+
+    if progress_callback:
+        progress_callback(total_files, total_files, "Completed")
+
+    return results
@@ -0,0 +1,281 @@
+"""
+Crash-safe SQLite journal of sent instances, so that interrupted sends can resume without resending
+"""
+
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+from src.dicom.native.dimse import read_part10_header
+from src.dicom.coercion import coercion_edits
+from src.utils.config import ConfigManager, destination_key
+
+ACKNOWLEDGED = "acknowledged"
+FAILED = "failed"
+
+# Buffered journal entries are written once this many are pending...
+DEFAULT_FLUSH_SIZE = 500
+# ...or once the oldest pending entry is this many seconds old
+DEFAULT_FLUSH_INTERVAL = 2.0
+
+# Files handed to the send function at a time by send_with_journal
+DEFAULT_JOURNAL_CHUNK_SIZE = 1000
+
+# SQLite limits the number of parameters in one statement
+_QUERY_CHUNK = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sends (
+    destination TEXT NOT NULL,
+    instance_key TEXT NOT NULL,
+    file_path TEXT,
+    status TEXT NOT NULL,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 1,
+    first_attempt REAL NOT NULL,
+    last_attempt REAL NOT NULL,
+    acknowledged_at REAL,
+    PRIMARY KEY (destination, instance_key)
+)
+"""
+
+_UPSERT = """
+INSERT INTO sends (destination, instance_key, file_path, status, error, attempts,
+                   first_attempt, last_attempt, acknowledged_at)
+VALUES (?, ?, ?, ?, ?, 1, ?, ?, ?)
+ON CONFLICT (destination, instance_key) DO UPDATE SET
+    file_path = excluded.file_path,
+    status = excluded.status,
+    error = excluded.error,
+    attempts = sends.attempts + 1,
+    last_attempt = excluded.last_attempt,
+    acknowledged_at = COALESCE(excluded.acknowledged_at, sends.acknowledged_at)
+"""
+
+def instance_key(file_path, dicom_tags=None):
+    """
+    Identify the instance stored in a file, as sent with the given tag edits.
+
+    The same file sent with different edits, such as another coerced SOP Instance UID,
+    is a different instance to the destination, so the edits are part of the key.
+
+    Returns:
+    - The SOP Instance UID from the file meta information, or "sha1:<hex>" of the
+      file content when the file has no readable meta header, followed by
+      "#edits:<hex>" when dicom_tags edit any tag
+    """
+    return _file_key(file_path) + _edits_suffix(coercion_edits(dicom_tags))
+
+def _file_key(file_path):
+    try:
+        uid = read_part10_header(file_path).sop_instance_uid
+        if uid:
+            return uid
+    except Exception:
+        pass
+    digest = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return f"sha1:{digest.hexdigest()}"
+
+def _edits_suffix(edits):
+    if not edits:
+        return ""
+    text = "\n".join(f"{tag_name}={tag_value}" for tag_name, tag_value in sorted(edits.items()))
+    return f"#edits:{hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]}"
+
+class SendJournal:
+    """
+    Journal of send outcomes keyed by destination and instance.
+
+    Writes are buffered and committed in batches to an SQLite database in WAL mode.
+    A crash loses at most the last flush interval of entries, whose instances are
+    then sent again on resume. Safe to use from several threads.
+    """
+
+    def __init__(self, path, flush_size=DEFAULT_FLUSH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.path = path
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.pending = []
+        self.oldest_pending = None
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(_SCHEMA)
+        self.connection.commit()
+
+    def record(self, destination, key, file_path, result):
+        """Buffer the outcome of sending one instance, flushing when the buffer is due"""
+        now = time.time()
+        acknowledged = bool(result.get("success"))
+        entry = (destination, key, file_path, ACKNOWLEDGED if acknowledged else FAILED,
+                 "" if acknowledged else result.get("error", ""), now, now, now if acknowledged else None)
+        with self.lock:
+            self.pending.append(entry)
+            if self.oldest_pending is None:
+                self.oldest_pending = now
+            if len(self.pending) >= self.flush_size or now - self.oldest_pending >= self.flush_interval:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if not self.pending:
+            return
+        with self.connection:
+            self.connection.executemany(_UPSERT, self.pending)
+        self.pending = []
+        self.oldest_pending = None
+
+    def flush(self):
+        """Write all buffered entries"""
+        with self.lock:
+            self._flush_locked()
+
+    def acknowledged_keys(self, destination, keys):
+        """Return the subset of keys already acknowledged by the destination"""
+        self.flush()
+        keys = list(keys)
+        found = set()
+        with self.lock:
+            for start in range(0, len(keys), _QUERY_CHUNK):
+                chunk = keys[start:start + _QUERY_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.connection.execute(
+                    f"SELECT instance_key FROM sends WHERE destination = ? AND status = ? "
+                    f"AND instance_key IN ({placeholders})",
+                    [destination, ACKNOWLEDGED] + chunk
+                )
+                found.update(row[0] for row in rows)
+        return found
+
+    def summary(self, destination=None):
+        """Count journal entries by status, for one destination or all of them"""
+        self.flush()
+        query = "SELECT status, COUNT(*) FROM sends"
+        params = []
+        if destination:
+            query += " WHERE destination = ?"
+            params.append(destination)
+        with self.lock:
+            return dict(self.connection.execute(query + " GROUP BY status", params).fetchall())
+
+    def close(self):
+        """Flush buffered entries and close the database"""
+        with self.lock:
+            self._flush_locked()
+            self.connection.close()
+
+def open_send_journal(config_manager=None):
+    """Open the send journal configured by "send_journal_path" (default: send_journal.db beside config.json)"""
+    config_manager = config_manager or ConfigManager()
+    return SendJournal(config_manager.get_send_journal_path())
+
+def split_acknowledged(journal, destination, file_paths, dicom_tags=None):
+    """
+    Split files into those still to send and those the destination already acknowledged
+    with the same tag edits.
+
+    Returns:
+    - (pending, skipped, keys) where keys maps each file path to its instance key
+    """
+    keys = {}
+    for file_path in file_paths:
+        try:
+            keys[file_path] = instance_key(file_path, dicom_tags)
+        except OSError as e:
+            logging.warning(f"Could not identify {file_path} for the send journal: {str(e)}")
+    acknowledged = journal.acknowledged_keys(destination, set(keys.values()))
+    pending = [path for path in file_paths if keys.get(path) not in acknowledged]
+    skipped = [path for path in file_paths if path in keys and keys[path] in acknowledged]
+    return pending, skipped, keys
+
+class JournalRecorder:
+    """
+    Records the sends to one destination, all with the same tag edits, in a send journal.
+
+    Used by senders that hand files out one at a time, such as the batch processor's
+    workers, where send_with_journal cannot wrap a single send function.
+
+    Parameters:
+    - journal: SendJournal to record into
+    - destination: Destination key, as from destination_key
+    - dicom_tags: Tag edits the files are sent with, which are part of each instance key
+    """
+
+    def __init__(self, journal, destination, dicom_tags=None):
+        self.journal = journal
+        self.destination = destination
+        self.dicom_tags = dicom_tags
+        self.keys = {}
+
+    def split_acknowledged(self, file_paths):
+        """Split files into those still to send and those already acknowledged, as split_acknowledged"""
+        pending, skipped, self.keys = split_acknowledged(self.journal, self.destination, file_paths, self.dicom_tags)
+        return pending, skipped
+
+    def record(self, file_path, result):
+        """Record a send result; a file that cannot be identified is only logged"""
+        try:
+            key = self.keys.get(file_path) or instance_key(file_path, self.dicom_tags)
+            self.journal.record(self.destination, key, file_path, result)
+        except Exception as e:
+            logging.warning(f"Failed to record {file_path} in the send journal: {str(e)}")
+
+    def summary(self):
+        """Count the journal entries of the destination by status"""
+        return self.journal.summary(self.destination)
+
+def send_with_journal(send_function, file_paths, host, port, ae_title, journal, resume=False,
+                      progress_callback=None, chunk_size=DEFAULT_JOURNAL_CHUNK_SIZE, **kwargs):
+    """
+    Send files with any send function, recording every outcome in the journal.
+
+    Files are handed to send_function in chunks of chunk_size and each chunk's results
+    are journaled as soon as it completes, so an interruption loses at most one chunk.
+
+    Parameters:
+    - send_function: Function with the signature of send_multiple_dicom_concurrently
+    - journal: SendJournal to record into
+    - resume: Skip instances the destination has already acknowledged with the same dicom_tags
+    - kwargs: Passed on to send_function
+
+    Returns:
+    - Dictionary with results for each file; skipped files have "skipped": True
+    """
+    destination = destination_key(host, port, ae_title)
+    total_files = len(file_paths)
+
+    if resume:
+        pending, skipped, keys = split_acknowledged(journal, destination, file_paths, kwargs.get("dicom_tags"))
+        logging.info(f"Resuming send to {destination}: skipping {len(skipped)} acknowledged instances")
+    else:
+        pending, skipped, keys = list(file_paths), [], {}
+
+    results = {path: {"success": True, "output": "Already acknowledged", "error": "", "skipped": True}
+               for path in skipped}
+    for start in range(0, len(pending), max(1, chunk_size)):
+        chunk = pending[start:start + chunk_size]
+        done = len(skipped) + start
+
+        def chunk_progress(current, total, current_file, done=done):
+            if progress_callback and current_file != "Completed":
+                progress_callback(done + current, total_files, current_file)
+
+        chunk_results = send_function(chunk, host, port, ae_title, chunk_progress, **kwargs)
+        for file_path, result in chunk_results.items():
+            key = keys.get(file_path)
+            if key is None:
+                try:
+                    key = keys[file_path] = instance_key(file_path, kwargs.get("dicom_tags"))
+                except OSError:
+                    continue
+            journal.record(destination, key, file_path, result)
+        results.update(chunk_results)
+    journal.flush()
+
+    if progress_callback:
+        progress_callback(total_files, total_files, "Completed")
+    return {file_path: results[file_path] for file_path in file_paths if file_path in results}
@@ -0,0 +1,239 @@
+"""
+Spool for intermediate files: unique per-job files, in RAM when there is room, under a byte budget
+"""
+
+import os
+import time
+import atexit
+import shutil
+import logging
+import tempfile
+import threading
+from src.utils.config import ConfigManager
+
+DEFAULT_SPOOL_BUDGET_MB = 512
+
+# RAM-backed file system used when "spool_dir" is not set and it can hold the whole budget
+SHM_DIR = "/dev/shm"
+
+# Directory of the spool under its base directory; every run has its own directory inside it
+SPOOL_DIR_NAME = "alexamon-spool"
+
+# Where the liveness of a run's process cannot be checked, its directory is an orphan after this long
+ORPHAN_AGE_SECONDS = 24 * 3600
+
+def _pid_alive(pid):
+    """True if a process with this PID exists (POSIX only)"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # It exists but belongs to another user
+        return True
+    return True
+
+def _is_orphan(run_dir):
+    """A run directory is an orphan once the process that made it is gone"""
+    try:
+        pid = int(os.path.basename(run_dir).split("-")[0])
+    except ValueError:
+        return False
+    if pid == os.getpid():
+        return False
+    if os.name == "posix":
+        return not _pid_alive(pid)
+    # os.kill cannot probe a process on Windows, so fall back to the age of the directory
+    try:
+        return time.time() - os.path.getmtime(run_dir) > ORPHAN_AGE_SECONDS
+    except OSError:
+        return False
+
+def remove_orphans(spool_root):
+    """
+    Remove the run directories left under spool_root by runs that crashed or were killed.
+
+    Returns:
+    - Number of bytes freed
+    """
+    freed = 0
+    try:
+        entries = os.listdir(spool_root)
+    except OSError:
+        return 0
+    for entry in entries:
+        run_dir = os.path.join(spool_root, entry)
+        if not os.path.isdir(run_dir) or not _is_orphan(run_dir):
+            continue
+        for dir_path, _, file_names in os.walk(run_dir):
+            for file_name in file_names:
+                try:
+                    freed += os.path.getsize(os.path.join(dir_path, file_name))
+                except OSError:
+                    pass
+        shutil.rmtree(run_dir, ignore_errors=True)
+        logging.info(f"Removed orphaned spool directory {run_dir}")
+    return freed
+
+def default_spool_base(budget_bytes):
+    """/dev/shm if it exists and has room for the whole budget, otherwise the system temporary directory"""
+    if os.name == "posix" and os.path.isdir(SHM_DIR) and os.access(SHM_DIR, os.W_OK):
+        try:
+            if shutil.disk_usage(SHM_DIR).free >= budget_bytes:
+                return SHM_DIR
+        except OSError:
+            pass
+    return tempfile.gettempdir()
+
+class Spool:
+    """
+    Unique intermediate files for modified, transcoded and compressed copies.
+
+    Every file is created with a unique name in a directory of its own for this run,
+    so concurrent jobs on files with the same name never overwrite each other. Each
+    file reserves an expected size against budget_bytes; create() blocks until the
+    consumers of earlier files have released enough of the budget. A file larger than
+    the whole budget is let through once nothing else is spooled. Producers that hold
+    spooled files while creating more, and so could wait on themselves, pass
+    block=False: when the budget is used up their files go to the overflow directory
+    on disk instead.
+
+    Run directories are named after the process, so those of crashed runs are removed
+    when the next spool starts.
+    """
+
+    def __init__(self, base_dir, budget_bytes=DEFAULT_SPOOL_BUDGET_MB * 1024 * 1024, overflow_dir=None):
+        self.budget_bytes = max(1, int(budget_bytes))
+        self.condition = threading.Condition()
+        self.reserved = {}
+        self.used_bytes = 0
+        self.stats = {"files": 0, "overflow": 0, "waits": 0, "wait_seconds": 0.0, "peak_bytes": 0}
+        run_name = f"{os.getpid()}-{int(time.time())}"
+        roots = [os.path.join(base_dir, SPOOL_DIR_NAME)]
+        overflow_root = os.path.join(overflow_dir or tempfile.gettempdir(), SPOOL_DIR_NAME)
+        if overflow_root not in roots:
+            roots.append(overflow_root)
+        for root in roots:
+            remove_orphans(root)
+        self.directory = os.path.join(roots[0], run_name)
+        self.overflow_directory = os.path.join(roots[-1], run_name)
+        os.makedirs(self.directory, exist_ok=True)
+
+    @classmethod
+    def for_config(cls, config_manager=None):
+        """Create a spool as configured by "spool_dir" and "spool_budget_mb\""""
+        config_manager = config_manager or ConfigManager()
+        budget_bytes = config_manager.get_value("spool_budget_mb", DEFAULT_SPOOL_BUDGET_MB) * 1024 * 1024
+        base_dir = config_manager.get_value("spool_dir", "") or default_spool_base(budget_bytes)
+        return cls(base_dir, budget_bytes)
+
+    def _reserve(self, size, block):
+        """Reserve size bytes, returning the directory to create the file in"""
+        with self.condition:
+            if self.used_bytes and self.used_bytes + size > self.budget_bytes:
+                if not block:
+                    self.stats["overflow"] += 1
+                    os.makedirs(self.overflow_directory, exist_ok=True)
+                    return self.overflow_directory, 0
+                self.stats["waits"] += 1
+                start = time.perf_counter()
+                logging.debug(f"Spool budget of {self.budget_bytes} bytes used up, waiting to spool {size} bytes")
+                while self.used_bytes and self.used_bytes + size > self.budget_bytes:
+                    self.condition.wait()
+                self.stats["wait_seconds"] += time.perf_counter() - start
+            self.used_bytes += size
+            self.stats["files"] += 1
+            self.stats["peak_bytes"] = max(self.stats["peak_bytes"], self.used_bytes)
+            return self.directory, size
+
+    def _unreserve(self, size):
+        with self.condition:
+            self.used_bytes -= size
+            self.condition.notify_all()
+
+    def create(self, prefix="", suffix="", size=0, block=True):
+        """
+        Create an empty spool file.
+
+        Parameters:
+        - prefix, suffix: Parts of the file name around its unique part
+        - size: Bytes the file is expected to grow to, reserved until it is released
+        - block: Wait for room in the budget, or else put the file in the overflow directory
+
+        Returns:
+        - Path of the file, to be passed to release() when it is no longer needed
+        """
+        directory, size = self._reserve(max(0, int(size)), block)
+        try:
+            fd, path = tempfile.mkstemp(prefix=prefix, suffix=suffix, dir=directory)
+        except OSError:
+            self._unreserve(size)
+            raise
+        os.close(fd)
+        with self.condition:
+            self.reserved[path] = size
+        return path
+
+    def mkdtemp(self, prefix="", size=0, block=True):
+        """Create an empty spool directory, like create(); release() removes it with its contents"""
+        directory, size = self._reserve(max(0, int(size)), block)
+        try:
+            path = tempfile.mkdtemp(prefix=prefix, dir=directory)
+        except OSError:
+            self._unreserve(size)
+            raise
+        with self.condition:
+            self.reserved[path] = size
+        return path
+
+    def release(self, path):
+        """
+        Delete a spool file or directory and free its share of the budget.
+
+        Returns:
+        - True if the path belonged to the spool, False otherwise
+        """
+        with self.condition:
+            size = self.reserved.pop(path, None)
+        if size is None:
+            return False
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except OSError as e:
+                if os.path.exists(path):
+                    logging.warning(f"Failed to remove spool file {path}: {str(e)}")
+        self._unreserve(size)
+        return True
+
+    def summary(self):
+        """Return a copy of the counters with the bytes in use"""
+        with self.condition:
+            summary = dict(self.stats, used_bytes=self.used_bytes, budget_bytes=self.budget_bytes)
+        summary["wait_seconds"] = round(summary["wait_seconds"], 3)
+        return summary
+
+    def close(self):
+        """Remove the spool directories of this run with everything still in them"""
+        with self.condition:
+            self.reserved.clear()
+            self.used_bytes = 0
+            self.condition.notify_all()
+        for directory in {self.directory, self.overflow_directory}:
+            shutil.rmtree(directory, ignore_errors=True)
+
+_spool = None
+_spool_lock = threading.Lock()
+
+def get_spool():
+    """Return the spool shared by the whole application session, removing orphans of earlier runs when it is created"""
+    global _spool
+    with _spool_lock:
+        if _spool is None:
+            _spool = Spool.for_config()
+            atexit.register(_spool.close)
+            logging.info(f"Spooling intermediate files in {_spool.directory} "
+                         f"with a budget of {_spool.budget_bytes // (1024 * 1024)} MB")
+        return _spool
@@ -0,0 +1,207 @@
+"""
+Batched DICOM sending - one StoreSCU invocation (and one association) per batch of files
+"""
+
+import os
+import time
+import logging
+from pathlib import Path
+import pydicom
+from src.utils.file_helpers import get_lib_dir
+from src.dicom.jvm import run_java
+from src.dicom.storescu_output import parse_storescu_output, summarize_throughput, format_throughput
+from src.dicom.prefetch import Prefetcher
+from src.dicom.transport import get_transport_tuner, storescu_transport_options
+from src.dicom.coercion import coercion_edits, storescu_coercion_options, coerced_sop_instance_uid, report_coercion
+
+# Default number of files handed to a single StoreSCU invocation
+DEFAULT_BATCH_SIZE = 100
+
+def get_storescu_classpath():
+    """Build the classpath with all JARs needed to run StoreSCU"""
+    lib_dir = get_lib_dir()
+    return os.pathsep.join([
+        os.path.join(lib_dir, "dcm4che-core-5.33.1.jar"),
+        os.path.join(lib_dir, "dcm4che-net-5.33.1.jar"),
+        os.path.join(lib_dir, "dcm4che-tool-common-5.33.1.jar"),
+        os.path.join(lib_dir, "commons-cli-1.9.0.jar"),
+        os.path.join(lib_dir, "slf4j-api-2.0.16.jar"),
+        os.path.join(lib_dir, "logback-core-1.5.12.jar"),
+        os.path.join(lib_dir, "logback-classic-1.5.12.jar"),
+        os.path.join(lib_dir, "dcm4che-tool-storescu-5.33.1.jar")
+    ])
+
+def read_sop_instance_uid(file_path):
+    """Read the SOP Instance UID from a DICOM file header, or None if it cannot be read"""
+    try:
+        ds = pydicom.dcmread(file_path, stop_before_pixels=True, specific_tags=["SOPInstanceUID"])
+        return str(ds.SOPInstanceUID)
+    except Exception as e:
+        logging.warning(f"Could not read SOP Instance UID from {file_path}: {str(e)}")
+        return None
+
+def build_storescu_command(file_paths, host, port, ae_title, dicom_tags=None, transport=None):
+    """
+    Build the StoreSCU command that sends a batch of files over one association.
+
+    Parameters:
+    - file_paths: List of paths to the DICOM files
+    - host, port, ae_title: Destination
+    - dicom_tags: Dictionary of DICOM tags to modify (e.g., {"00100020": "12345"})
+    - transport: Transport settings from TransportTuner.settings()
+
+    Returns:
+    - The plain ["java", ...] command
+    """
+    cmd = [
+        "java", "-cp", get_storescu_classpath(),
+        "org.dcm4che3.tool.storescu.StoreSCU",
+        "-c", f"{ae_title}@{host}:{port}"
+    ] + storescu_transport_options(transport or {})
+
+    # Tag coercion is applied by StoreSCU itself, so no temporary files are needed
+    cmd += storescu_coercion_options(dicom_tags)
+    cmd.append("--")
+    cmd.extend(file_paths)
+    return cmd
+
+def batch_results_from_output(file_paths, host, port, ae_title, stdout, stderr, elapsed, transport=None,
+                              dicom_tags=None):
+    """
+    Turn the output of one StoreSCU batch into per-file results.
+
+    Responses are mapped back to their files through the SOP Instance UID, and the
+    association is reported to the transport tuner. When dicom_tags coerce the SOP
+    Instance UID, StoreSCU reports the same coerced one for every file, so responses
+    are matched to the files in the order they were sent instead.
+
+    Returns:
+    - Dictionary with results for each file
+    """
+    report = parse_storescu_output(stdout + "\n" + stderr)
+    # Opening the association takes about two round trips: the TCP handshake and A-ASSOCIATE
+    if report.association_ms and report.sent_bytes and report.sent_seconds:
+        get_transport_tuner().observe(host, port, ae_title, report.association_ms / 2 / 1000,
+                                      report.sent_bytes, report.sent_seconds, transport or {})
+
+    coerced = coercion_edits(dicom_tags)
+    coerced_iuid = coerced_sop_instance_uid(dicom_tags)
+    in_order = None
+    missing_error = stderr or "No C-STORE response received for this file"
+    if coerced_iuid:
+        in_order = [record for record in report.responses if record.sop_instance_uid == coerced_iuid]
+        if len(in_order) != len(file_paths):
+            # With a response missing, it cannot be told which file it belonged to
+            if len(file_paths) > 1:
+                missing_error = stderr or (f"{len(in_order)} C-STORE responses for {len(file_paths)} files "
+                                           f"coerced to SOP Instance UID {coerced_iuid}; cannot match them to the files")
+                logging.warning(missing_error)
+            in_order = [None] * len(file_paths)
+    results = {}
+    for index, file_path in enumerate(file_paths):
+        if in_order is not None:
+            record = in_order[index]
+        else:
+            iuid = read_sop_instance_uid(file_path)
+            record = report.records.get(iuid) if iuid else None
+        if record is None:
+            results[file_path] = {
+                "success": False,
+                "status": None,
+                "output": stdout,
+                "error": missing_error
+            }
+            continue
+        try:
+            record.bytes = os.path.getsize(file_path)
+        except OSError:
+            pass
+        results[file_path] = report_coercion(record.as_result(stdout), coerced)
+
+    # StoreSCU's own figure excludes JVM startup; the wall-clock one includes it
+    reported = report.throughput()
+    logging.info(
+        f"Batch to {ae_title}@{host}:{port}: {format_throughput(summarize_throughput(results, elapsed))} "
+        f"wall clock" + (f", {format_throughput(reported)} on the association" if reported else "")
+    )
+    return results
+
+def send_dicom_batch_using_dcm4che(file_paths, host, port, ae_title, dicom_tags=None):
+    """
+    Send a batch of DICOM files with a single StoreSCU invocation over one association.
+
+    Parameters:
+    - file_paths: List of paths to the DICOM files
+    - host: PACS server hostname/IP
+    - port: PACS server port
+    - ae_title: AE Title of the PACS server
+    - dicom_tags: Dictionary of DICOM tags to modify (e.g., {"00100020": "12345"})
+
+    Returns:
+    - Dictionary with results for each file
+    """
+    transport = get_transport_tuner().settings(host, port, ae_title)
+    cmd = build_storescu_command(file_paths, host, port, ae_title, dicom_tags, transport)
+
+    logging.info(f"Executing StoreSCU for a batch of {len(file_paths)} files to {ae_title}@{host}:{port}")
+    start = time.perf_counter()
+    result = run_java("storescu", cmd, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    return batch_results_from_output(file_paths, host, port, ae_title, result.stdout, result.stderr,
+                                     elapsed, transport, dicom_tags)
+
+def send_multiple_dicom_in_batches(file_paths, host, port, ae_title, progress_callback=None,
+                                   dicom_tags=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Send multiple DICOM files, handing StoreSCU up to batch_size files per invocation.
+
+    Parameters:
+    - file_paths: List of paths to the DICOM files
+    - host: PACS server hostname/IP
+    - port: PACS server port
+    - ae_title: AE Title of the PACS server
+    - progress_callback: Optional callback function to update progress
+    - dicom_tags: Dictionary of DICOM tags to modify
+    - batch_size: Maximum number of files sent over one association
+
+    When prefetching is configured ("prefetch_files", "prefetch_budget_mb"), files are sent
+    in directory and inode order and the next batches are read into the page cache while
+    StoreSCU sends the current one.
+
+    Returns:
+    - Dictionary with results for each file, in the order of file_paths
+    """
+    results = {}
+    total_files = len(file_paths)
+    batch_size = max(1, int(batch_size or DEFAULT_BATCH_SIZE))
+    prefetcher = Prefetcher.for_files(file_paths)
+    send_order = prefetcher.queue if prefetcher else file_paths
+
+    try:
+        for start in range(0, total_files, batch_size):
+            batch = send_order[start:start + batch_size]
+
+            # Update progress if callback provided
+            if progress_callback:
+                progress_callback(start, total_files, Path(batch[0]).name)
+
+            if prefetcher:
+                prefetcher.consume(batch)
+            try:
+                results.update(send_dicom_batch_using_dcm4che(batch, host, port, ae_title, dicom_tags))
+            except Exception as e:
+                for file_path in batch:
+                    results[file_path] = {
+                        "success": False,
+                        "output": "",
+                        "error": str(e)
+                    }
+    finally:
+        if prefetcher:
+            prefetcher.close()
+
+    # Final progress update
+    if progress_callback:
+        progress_callback(total_files, total_files, "Completed")
+
+    return {file_path: results[file_path] for file_path in file_paths}
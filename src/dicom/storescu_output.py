@@ -0,0 +1,293 @@
+"""
+Parsing of dcm4che StoreSCU log output into per-instance records, and throughput figures for send results
+"""
+
+import os
+import re
+import logging
+
+# Matches one C-STORE-RSP block in the StoreSCU log output, up to the next DIMSE message
+STORE_RSP_PATTERN = re.compile(
+    r"C-STORE-RSP\[pcid=\d+, status=([0-9A-Fa-f]+)H(.*?)(?=C-STORE-R[QS]P\[|\Z)",
+    re.DOTALL
+)
+IUID_PATTERN = re.compile(r"iuid=([0-9.]+)")
+
+# First lines of a DIMSE message, e.g. "<< 3:C-STORE-RQ[pcid=1, ..." and ">> 3:C-STORE-RSP[pcid=1, status=0H"
+STORE_RQ_LINE_PATTERN = re.compile(r"(\d+):C-STORE-RQ\[pcid=\d+")
+STORE_RSP_LINE_PATTERN = re.compile(r"(\d+):C-STORE-RSP\[pcid=\d+, status=([0-9A-Fa-f]+)H")
+
+# StoreSCU prints this once the association is established
+CONNECTED_PATTERN = re.compile(r"Connected to \S+ in (\d+)ms")
+ECHO_RSP_PATTERN = re.compile(r"C-ECHO-RSP\[pcid=\d+, status=([0-9A-Fa-f]+)H")
+# ...and this once all files are sent, e.g. "Sent 10 objects (=5.12MB) in 0.35s (=14.63MB/s)";
+# the numbers are formatted for the JVM's locale, so they may be grouped, e.g. "=1,024.5MB"
+LOCALE_NUMBER = r"\d[\d.,'\u00a0\u202f]*"
+SENT_PATTERN = re.compile(rf"Sent ({LOCALE_NUMBER}) objects \(=({LOCALE_NUMBER})\s*MB\) in ({LOCALE_NUMBER})\s*s")
+# Timestamp at the start of a logback line, e.g. 12:34:56.789
+LOG_TIME_PATTERN = re.compile(r"^(\d{2}):(\d{2}):(\d{2})[.,](\d{3})")
+
+MB = 1024 * 1024
+
+def is_success_status(status):
+    """Return True for a DIMSE Success (0000H) or Warning (Bxxx) status"""
+    return status == 0 or (status & 0xF000) == 0xB000
+
+def _log_time_ms(line):
+    """Milliseconds since midnight of a log line's timestamp, or None if it has none"""
+    match = LOG_TIME_PATTERN.match(line)
+    if not match:
+        return None
+    hours, minutes, seconds, millis = (int(group) for group in match.groups())
+    return ((hours * 60 + minutes) * 60 + seconds) * 1000 + millis
+
+def _number(text):
+    """
+    Parse a number formatted for any locale, e.g. "1,024.5", "1.024,5", "1 024,5" or "0,35".
+
+    The last separator is the decimal one, unless it is repeated or, as the only kind
+    of separator, followed by exactly three digits; then it groups thousands.
+    """
+    text = re.sub(r"['\u00a0\u202f]", "", text)
+    separators = [char for char in text if char in ".,"]
+    if not separators:
+        return float(text)
+    decimal = separators[-1]
+    position = text.rfind(decimal)
+    if separators.count(decimal) > 1 or (len(set(separators)) == 1 and len(text) - position - 1 == 3):
+        return float(text.replace(",", "").replace(".", ""))
+    integer = text[:position].replace(",", "").replace(".", "")
+    return float(f"{integer}.{text[position + 1:]}")
+
+class StoreRecord:
+    """Outcome of storing one instance"""
+
+    __slots__ = ("sop_instance_uid", "status", "bytes", "association_ms", "transfer_ms")
+
+    def __init__(self, sop_instance_uid, status, bytes=None, association_ms=None, transfer_ms=None):
+        self.sop_instance_uid = sop_instance_uid
+        self.status = status
+        self.bytes = bytes
+        self.association_ms = association_ms
+        self.transfer_ms = transfer_ms
+
+    @property
+    def success(self):
+        return is_success_status(self.status)
+
+    def as_result(self, output=""):
+        """Convert the record into the per-file result dictionary used by the send functions"""
+        return {
+            "success": self.success,
+            "status": self.status,
+            "output": output,
+            "error": "" if self.success else f"C-STORE failed with status {self.status:04X}H",
+            "bytes": self.bytes,
+            "association_ms": self.association_ms,
+            "transfer_ms": self.transfer_ms
+        }
+
+class StoreSCUReport:
+    """Everything parsed from the output of one StoreSCU run"""
+
+    def __init__(self):
+        self.records = {}
+        # Every record in the order of the responses, including ones sharing an iuid
+        self.responses = []
+        self.association_ms = None
+        self.sent_objects = None
+        self.sent_bytes = None
+        self.sent_seconds = None
+        self.errors = []
+
+    def throughput(self):
+        """Throughput of the run as reported by StoreSCU, or None if it did not report one"""
+        if self.sent_objects is None:
+            return None
+        return throughput(self.sent_objects, self.sent_bytes, self.sent_seconds)
+
+def parse_storescu_output(output):
+    """
+    Parse the combined stdout/stderr of a StoreSCU run.
+
+    Each C-STORE-RSP carrying an iuid becomes a StoreRecord. Its transfer time runs from
+    the C-STORE-RQ log line to the matching C-STORE-RSP line (millisecond resolution) and
+    its association time is the one StoreSCU reported for the run. Byte counts are not
+    logged per instance; the caller fills them in from the file sizes.
+
+    Returns:
+    - StoreSCUReport
+    """
+    report = StoreSCUReport()
+    request_times = {}
+    response = None
+    for line in output.splitlines():
+        time_ms = _log_time_ms(line)
+        request = STORE_RQ_LINE_PATTERN.search(line)
+        if request:
+            request_times[request.group(1)] = time_ms
+            response = None
+            continue
+        rsp = STORE_RSP_LINE_PATTERN.search(line)
+        if rsp:
+            request_time = request_times.pop(rsp.group(1), None)
+            transfer_ms = None
+            if request_time is not None and time_ms is not None:
+                transfer_ms = float((time_ms - request_time) % 86400000)
+            response = (int(rsp.group(2), 16), transfer_ms)
+            continue
+        iuid = IUID_PATTERN.search(line)
+        if iuid and response is not None:
+            status, transfer_ms = response
+            record = StoreRecord(iuid.group(1), status, transfer_ms=transfer_ms)
+            report.records[record.sop_instance_uid] = record
+            report.responses.append(record)
+            response = None
+            continue
+        connected = CONNECTED_PATTERN.search(line)
+        sent = SENT_PATTERN.search(line)
+        if connected:
+            report.association_ms = float(connected.group(1))
+        elif sent:
+            # An unreadable summary only loses the run's throughput, never the per-instance records
+            try:
+                sent_objects, sent_mb, sent_seconds = (_number(group) for group in sent.groups())
+            except ValueError:
+                logging.debug(f"Could not parse StoreSCU summary: {line.strip()}")
+                continue
+            report.sent_objects = int(sent_objects)
+            report.sent_bytes = int(sent_mb * MB)
+            report.sent_seconds = sent_seconds
+        elif " ERROR " in line or line.startswith("ERROR"):
+            report.errors.append(line.strip())
+
+    for record in report.responses:
+        record.association_ms = report.association_ms
+    return report
+
+def parse_store_responses(output):
+    """
+    Extract the C-STORE-RSP statuses from StoreSCU log output.
+
+    Parameters:
+    - output: Combined stdout/stderr text of a StoreSCU run
+
+    Returns:
+    - Dictionary mapping SOP Instance UID to the integer DIMSE status
+    """
+    statuses = {}
+    for match in STORE_RSP_PATTERN.finditer(output):
+        iuid_match = IUID_PATTERN.search(match.group(2))
+        if iuid_match:
+            statuses[iuid_match.group(1)] = int(match.group(1), 16)
+    return statuses
+
+def store_result_from_output(file_path, stdout, stderr, returncode):
+    """
+    Build the per-file result dictionary of a StoreSCU run that sent a single file.
+
+    The C-STORE status decides success when StoreSCU logged a response; otherwise
+    the exit code does.
+    """
+    output = f"{stdout}\n{stderr}"
+    report = parse_storescu_output(output)
+    if report.records:
+        record = next(iter(report.records.values()))
+        try:
+            record.bytes = os.path.getsize(file_path)
+        except OSError:
+            pass
+        result = record.as_result(stdout)
+        if not result["success"] and stderr:
+            result["error"] += f": {stderr}"
+        return result
+    error = stderr or "\n".join(report.errors) or ("" if returncode == 0 else "No C-STORE response received")
+    return {"success": returncode == 0 and not report.errors, "output": stdout, "error": error}
+
+def parse_echo_output(output):
+    """
+    Extract the C-ECHO outcome from the log output of StoreSCU run without files.
+
+    The association time is the one StoreSCU reports; the echo round trip is taken
+    from the timestamps of the C-ECHO-RQ and C-ECHO-RSP log lines (millisecond resolution).
+
+    Returns:
+    - Dictionary with success, status, association_ms, echo_ms and error
+    """
+    status = None
+    association_ms = None
+    request_time = None
+    response_time = None
+    for line in output.splitlines():
+        connected = CONNECTED_PATTERN.search(line)
+        response = ECHO_RSP_PATTERN.search(line)
+        if connected:
+            association_ms = float(connected.group(1))
+        elif response:
+            status = int(response.group(1), 16)
+            response_time = _log_time_ms(line)
+        elif "C-ECHO-RQ[" in line and request_time is None:
+            request_time = _log_time_ms(line)
+
+    echo_ms = None
+    if request_time is not None and response_time is not None:
+        echo_ms = float((response_time - request_time) % 86400000)
+    if status is None:
+        error = "No C-ECHO response received"
+    else:
+        error = "" if status == 0 else f"C-ECHO failed with status {status:04X}H"
+    return {
+        "success": status == 0,
+        "status": status if status is not None else -1,
+        "association_ms": association_ms,
+        "echo_ms": echo_ms,
+        "error": error
+    }
+
+def throughput(instances, total_bytes, seconds):
+    """
+    Compute throughput figures.
+
+    Returns:
+    - Dictionary with instances, bytes, seconds, mb_per_s and instances_per_s
+    """
+    return {
+        "instances": instances,
+        "bytes": total_bytes,
+        "seconds": round(seconds, 3),
+        "mb_per_s": round(total_bytes / MB / seconds, 2) if seconds > 0 else None,
+        "instances_per_s": round(instances / seconds, 2) if seconds > 0 else None
+    }
+
+def summarize_throughput(results, seconds):
+    """
+    Throughput of the successfully sent files among send results.
+
+    Parameters:
+    - results: Dictionary mapping file paths to per-file results; files skipped
+      as already sent are not counted
+    - seconds: Wall-clock time the send took
+
+    Returns:
+    - Dictionary as returned by throughput()
+    """
+    instances = 0
+    total_bytes = 0
+    for file_path, result in results.items():
+        if not result.get("success") or result.get("skipped"):
+            continue
+        instances += 1
+        size = result.get("bytes")
+        if size is None:
+            try:
+                size = os.path.getsize(file_path)
+            except OSError:
+                size = 0
+        total_bytes += size
+    return throughput(instances, total_bytes, seconds)
+
+def format_throughput(summary):
+    """Format a throughput summary for display, e.g. "12.34 MB/s, 56.7 instances/s" """
+    if summary["mb_per_s"] is None:
+        return "no throughput measured"
+    return f"{summary['mb_per_s']:.2f} MB/s, {summary['instances_per_s']:.1f} instances/s"
@@ -0,0 +1,49 @@
+"""
+Conversion of DICOM files to an uncompressed transfer syntax before sending
+"""
+
+import os
+import logging
+import pydicom
+from pydicom.uid import UID
+from src.dicom.native.dimse import IMPLICIT_VR_LITTLE_ENDIAN
+from src.dicom.spool import get_spool
+
+def transcode_file(file_path, transfer_syntax_uid, block=True):
+    """
+    Write a copy of a DICOM file in an uncompressed little endian transfer syntax.
+
+    Compressed pixel data is decompressed with the installed pydicom pixel data handlers.
+    The copy is a spool file sized for the decompressed pixel data.
+
+    Parameters:
+    - file_path: Path to the source DICOM file
+    - transfer_syntax_uid: Explicit or Implicit VR Little Endian
+    - block: Wait for room in the spool budget (see Spool.create)
+
+    Returns:
+    - Path to the transcoded spool file, or None if transcoding failed; release it with
+      cleanup_temp_files
+    """
+    output_path = None
+    try:
+        ds = pydicom.dcmread(file_path)
+        if UID(ds.file_meta.TransferSyntaxUID).is_compressed:
+            ds.decompress()
+        output_path = get_spool().create(prefix="transcoded_", suffix=".dcm", block=block,
+                                         size=os.path.getsize(file_path) + len(ds.get("PixelData") or b""))
+        ds.file_meta.TransferSyntaxUID = UID(transfer_syntax_uid)
+        try:
+            # pydicom 3 encodes the dataset according to the transfer syntax
+            ds.save_as(output_path, enforce_file_format=True)
+        except TypeError:
+            ds.is_implicit_VR = transfer_syntax_uid == IMPLICIT_VR_LITTLE_ENDIAN
+            ds.is_little_endian = True
+            ds.save_as(output_path, write_like_original=False)
+        logging.info(f"Transcoded {file_path} to {transfer_syntax_uid}")
+        return output_path
+    except Exception as e:
+        logging.error(f"Failed to transcode {file_path} to {transfer_syntax_uid}: {str(e)}")
+        if output_path:
+            get_spool().release(output_path)
+        return None
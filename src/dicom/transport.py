@@ -0,0 +1,195 @@
+"""
+Per-destination transport tuning: maximum PDU length and TCP socket buffer sizes, optionally auto-tuned to the bandwidth-delay product
+"""
+
+import sys
+import time
+import socket
+import asyncio
+import logging
+import threading
+from src.utils.config import ConfigManager, destination_key
+
+# Keys of a transport settings dictionary; 0 leaves the backend or OS default in place
+TRANSPORT_KEYS = ("max_pdu", "send_buffer", "receive_buffer")
+
+MIN_PDU = 16384
+MAX_PDU = 1024 * 1024
+MIN_BUFFER = 64 * 1024
+MAX_BUFFER = 32 * 1024 * 1024
+
+# An association must carry at least this much data to count as a throughput sample
+MIN_SAMPLE_BYTES = 8 * 1024 * 1024
+
+# A larger buffer is kept only if it raised throughput by at least this factor
+MIN_IMPROVEMENT = 1.1
+
+# Auto-tuning stops after this many trials per destination
+MAX_TRIALS = 6
+
+def _power_of_two(value, low, high):
+    """Smallest power of two not below value, clamped to [low, high]"""
+    size = low
+    while size < value and size < high:
+        size *= 2
+    return min(size, high)
+
+def apply_socket_buffers(sock, send_buffer=0, receive_buffer=0):
+    """
+    Set SO_SNDBUF/SO_RCVBUF on a socket that is not connected yet.
+
+    Setting a buffer turns off the kernel's automatic sizing for that direction, and
+    Linux caps the value at net.core.wmem_max/rmem_max, so a warning is logged when
+    the kernel granted less than requested.
+    """
+    for option, size, name in ((socket.SO_SNDBUF, send_buffer, "send"), (socket.SO_RCVBUF, receive_buffer, "receive")):
+        if not size:
+            continue
+        sock.setsockopt(socket.SOL_SOCKET, option, int(size))
+        # Linux reports twice the granted size to account for its bookkeeping overhead
+        granted = sock.getsockopt(socket.SOL_SOCKET, option)
+        if granted < (2 * size if sys.platform.startswith("linux") else size):
+            logging.warning(f"Kernel limited the TCP {name} buffer to {granted} bytes instead of {size}; "
+                            f"raise net.core.{'wmem' if name == 'send' else 'rmem'}_max to allow more")
+
+async def open_buffered_connection(host, port, send_buffer=0, receive_buffer=0):
+    """
+    Open an asyncio stream connection with the given socket buffer sizes, set before
+    connecting so they affect the TCP window.
+
+    Returns:
+    - (reader, writer)
+    """
+    loop = asyncio.get_running_loop()
+    family, kind, proto, _, address = (await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM))[0]
+    sock = socket.socket(family, kind, proto)
+    try:
+        sock.setblocking(False)
+        apply_socket_buffers(sock, send_buffer, receive_buffer)
+        await loop.sock_connect(sock, address)
+        return await asyncio.open_connection(sock=sock)
+    except BaseException:
+        sock.close()
+        raise
+
+class TransportTuner:
+    """
+    Chooses the max PDU length and socket buffer sizes used for each destination.
+
+    Values configured in "destination_transport" always win. With "transport_auto_tune"
+    on, each association of at least MIN_SAMPLE_BYTES is a sample: its round-trip time
+    and throughput give the bandwidth-delay product, and the next associations use
+    buffers of twice that size. While throughput is limited by the window, each step
+    roughly doubles the buffers; once a step gains less than MIN_IMPROVEMENT, the best
+    settings seen are kept and tuning stops for that destination. The chosen values are
+    stored in transport_tuning.json beside config.json, so later runs start from them.
+    """
+
+    def __init__(self, config_manager=None):
+        self.config_manager = config_manager or ConfigManager()
+        self.entries = self.config_manager.load_transport_tuning()
+        self.lock = threading.Lock()
+
+    @property
+    def auto_tune(self):
+        return bool(self.config_manager.get_value("transport_auto_tune", False))
+
+    def settings(self, host, port, ae_title):
+        """
+        Return the transport settings for a destination.
+
+        Returns:
+        - Dictionary with max_pdu, send_buffer and receive_buffer in bytes (0 for the default)
+        """
+        key = destination_key(host, port, ae_title)
+        settings = dict.fromkeys(TRANSPORT_KEYS, 0)
+        if self.auto_tune:
+            with self.lock:
+                tuned = self.entries.get(key, {})
+                settings.update({name: tuned.get(name, 0) for name in TRANSPORT_KEYS})
+        configured = (self.config_manager.get_value("destination_transport", {}) or {}).get(key, {})
+        settings.update({name: int(configured[name]) for name in TRANSPORT_KEYS if configured.get(name)})
+        return settings
+
+    def observe(self, host, port, ae_title, rtt_seconds, total_bytes, seconds, settings):
+        """
+        Record the outcome of one association and pick the settings for the next ones.
+
+        Parameters:
+        - rtt_seconds: Round-trip time measured when connecting
+        - total_bytes, seconds: Data sent over the association and the time it took
+        - settings: The settings the association used, as returned by settings()
+        """
+        if not self.auto_tune or total_bytes < MIN_SAMPLE_BYTES or seconds <= 0 or not rtt_seconds:
+            return
+        key = destination_key(host, port, ae_title)
+        mbps = total_bytes * 8 / seconds / 1e6
+        with self.lock:
+            state = self.entries.setdefault(key, {})
+            state["rtt_ms"] = round(rtt_seconds * 1000, 2)
+            state["mbps"] = round(mbps, 1)
+            state["updated"] = time.time()
+            if state.get("converged"):
+                self.config_manager.save_transport_tuning(self.entries)
+                return
+
+            tried = {name: settings.get(name, 0) for name in TRANSPORT_KEYS}
+            best = state.get("best")
+            if best is None or mbps > best["mbps"]:
+                improved = best is None or mbps >= best["mbps"] * MIN_IMPROVEMENT
+                best = state["best"] = dict(tried, mbps=round(mbps, 1))
+            else:
+                improved = False
+            state["trials"] = state.get("trials", 0) + 1
+
+            if (state["trials"] > 1 and not improved) or state["trials"] >= MAX_TRIALS \
+                    or tried["send_buffer"] >= MAX_BUFFER:
+                state.update({name: best[name] for name in TRANSPORT_KEYS}, converged=True)
+                logging.info(f"Transport tuning for {key} settled on {self._describe(state)} "
+                             f"({best['mbps']} Mbit/s, RTT {state['rtt_ms']} ms)")
+            else:
+                # The measured rate underestimates the link while the window is the limit,
+                # so doubling the bandwidth-delay product probes for more
+                bdp = mbps * 1e6 / 8 * rtt_seconds
+                buffer = _power_of_two(max(2 * bdp, 2 * tried["send_buffer"]), MIN_BUFFER, MAX_BUFFER)
+                state.update(send_buffer=buffer, receive_buffer=buffer,
+                             max_pdu=_power_of_two(buffer // 16, MIN_PDU, MAX_PDU))
+                logging.info(f"Transport tuning for {key}: {mbps:.1f} Mbit/s at RTT {rtt_seconds * 1000:.1f} ms, "
+                             f"trying {self._describe(state)}")
+            self.config_manager.save_transport_tuning(self.entries)
+
+    @staticmethod
+    def _describe(settings):
+        return (f"max PDU {settings.get('max_pdu') or 'default'}, "
+                f"buffers {settings.get('send_buffer') or 'default'}/{settings.get('receive_buffer') or 'default'}")
+
+    def clear(self, destination=None):
+        """Forget tuned values for one destination, or for all of them"""
+        with self.lock:
+            if destination is None:
+                self.entries = {}
+            else:
+                self.entries.pop(destination, None)
+            self.config_manager.save_transport_tuning(self.entries)
+
+def storescu_transport_options(settings):
+    """StoreSCU command line options for transport settings"""
+    options = []
+    if settings.get("max_pdu"):
+        options += ["--max-pdulen-snd", str(settings["max_pdu"]), "--max-pdulen-rcv", str(settings["max_pdu"])]
+    if settings.get("send_buffer"):
+        options += ["--sosndbuf", str(settings["send_buffer"])]
+    if settings.get("receive_buffer"):
+        options += ["--sorcvbuf", str(settings["receive_buffer"])]
+    return options
+
+_tuner = None
+_tuner_lock = threading.Lock()
+
+def get_transport_tuner():
+    """Return the transport tuner shared by every send in this process"""
+    global _tuner
+    with _tuner_lock:
+        if _tuner is None:
+            _tuner = TransportTuner()
+        return _tuner
@@ -1,21 +1,54 @@
 import org.dcm4che3.data.Attributes;
 import org.dcm4che3.data.Tag;
+import org.dcm4che3.data.UID;
 import org.dcm4che3.data.VR;
 import org.dcm4che3.io.DicomInputStream;
 import org.dcm4che3.io.DicomOutputStream;
+import org.dcm4che3.util.StreamUtils;
 
+import java.io.BufferedReader;
 import java.io.File;
+import java.io.FileInputStream;
 import java.io.IOException;
+import java.io.InputStream;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.nio.charset.StandardCharsets;
+import java.util.Arrays;
 import java.util.HashMap;
 import java.util.Map;
+import java.util.concurrent.ArrayBlockingQueue;
+import java.util.concurrent.ThreadPoolExecutor;
+import java.util.concurrent.TimeUnit;
+import java.util.concurrent.atomic.AtomicInteger;
 
 /**
  * A utility class to modify DICOM attributes using dcm4che3 library
+ *
+ * Single file:  DicomModifier input-file output-file [tag=value ...]
+ * Batch:        DicomModifier --manifest manifest-file|- [--threads n]
+ *
+ * A manifest has one tab-separated line per file:
+ *   inputFile outputFile [tag=value ...]
+ *
+ * In batch mode every file is answered on stdout as soon as it is done with
+ *   RESULT inputFile outputFile 0 millis
+ *   RESULT inputFile outputFile -1 millis error
+ * followed by a single "DONE total failed" line. Log output goes to stderr.
  */
 public class DicomModifier {
 
+    private static final int DEFAULT_THREADS = 4;
+
+    // Per-tag messages are only printed by the single file tool
+    private static volatile boolean verbose = true;
+
     /**
-     * Modifies DICOM tags in a file and saves to a new file
+     * Modifies DICOM tags in a file and saves to a new file.
+     *
+     * Only the attributes before the pixel data are parsed; the pixel data and
+     * anything after it are copied through unchanged, so memory use does not
+     * depend on the size of the image.
      * 
      * @param inputPath  Path to the input DICOM file
      * @param outputPath Path where the modified DICOM file will be saved
@@ -24,49 +57,7 @@ public class DicomModifier {
      */
     public static boolean modifyDicom(String inputPath, String outputPath, String[] tagModifications) {
         try {
-            // Read the DICOM file
-            DicomInputStream dis = new DicomInputStream(new File(inputPath));
-            Attributes attributes = dis.readDataset();
-            
-            // Store original file meta information
-            Attributes fileMetaInfo = dis.getFileMetaInformation();
-            dis.close();
-            
-            // Apply tag modifications
-            for (String modification : tagModifications) {
-                String[] parts = modification.split("=", 2);
-                if (parts.length == 2) {
-                    String tagStr = parts[0];
-                    String value = parts[1];
-                    
-                    // Parse tag to integer value (assuming format like 00100010)
-                    int tag = Integer.parseInt(tagStr, 16);
-                    
-                    // Get VR for the tag from the existing attributes if possible
-                    VR vr = attributes.getVR(tag);
-                    if (vr == null) {
-                        // Handle special cases for different types of tags
-                        if (tag == Tag.PatientName) {
-                            vr = VR.PN;  // Person Name
-                        } else if (tag == Tag.StudyInstanceUID || tag == Tag.SeriesInstanceUID || 
-                                  tag == Tag.SOPInstanceUID || tagStr.endsWith("UID")) {
-                            vr = VR.UI;  // UID type
-                        } else {
-                            vr = VR.LO;  // Default to Long String
-                        }
-                    }
-                    
-                    // Set the new value
-                    attributes.setString(tag, vr, value);
-                    System.out.println("Modified tag " + tagStr + " to: " + value);
-                }
-            }
-            
-            // Write the modified dataset to the output file
-            DicomOutputStream dos = new DicomOutputStream(new File(outputPath));
-            dos.writeDataset(fileMetaInfo, attributes);
-            dos.close();
-            
+            modify(inputPath, outputPath, tagModifications);
             System.out.println("DICOM file successfully modified and saved to: " + outputPath);
             return true;
             
@@ -76,13 +67,165 @@ public class DicomModifier {
             return false;
         }
     }
+
+    /**
+     * Modifies DICOM tags in a file and saves to a new file, throwing on failure
+     *
+     * @param inputPath  Path to the input DICOM file
+     * @param outputPath Path where the modified DICOM file will be saved
+     * @param tagModifications Array of tag modifications (format: "00100010=NEWNAME")
+     */
+    public static void modify(String inputPath, String outputPath, String[] tagModifications) throws IOException {
+        try (DicomInputStream dis = new DicomInputStream(new File(inputPath))) {
+            // Read the DICOM file up to the pixel data
+            Attributes fileMetaInfo = dis.readFileMetaInformation();
+            // Files without file meta information or with a deflated dataset are read whole
+            boolean streamable = fileMetaInfo != null
+                    && !UID.DeflatedExplicitVRLittleEndian.equals(fileMetaInfo.getString(Tag.TransferSyntaxUID));
+            Attributes attributes = streamable ? dis.readDatasetUntilPixelData() : dis.readDataset();
+            
+            // Apply tag modifications
+            applyModifications(attributes, tagModifications);
+            
+            // Write the modified dataset to the output file
+            try (DicomOutputStream dos = new DicomOutputStream(new File(outputPath))) {
+                if (streamable) {
+                    dos.writeFileMetaInformation(fileMetaInfo);
+                    writeWithPixelData(dis, attributes, dos);
+                } else {
+                    dos.writeDataset(fileMetaInfo, attributes);
+                }
+            }
+        }
+    }
+
+    /**
+     * Modifies every file listed in a manifest on a pool of worker threads, in one JVM
+     *
+     * Lines are read as the workers take them, so the manifest may be streamed
+     * through stdin. Results are printed as each file completes, in completion order.
+     *
+     * @param manifest The manifest lines
+     * @param threads Number of worker threads
+     * @param out Stream receiving the RESULT and DONE lines
+     * @return Number of files that failed
+     */
+    public static int modifyManifest(BufferedReader manifest, int threads, PrintStream out)
+            throws IOException, InterruptedException {
+        // A bounded queue keeps a long manifest from being read into memory; when it is
+        // full the reading thread modifies a file itself
+        ThreadPoolExecutor executor = new ThreadPoolExecutor(threads, threads, 0L, TimeUnit.MILLISECONDS,
+                new ArrayBlockingQueue<>(threads * 4), new ThreadPoolExecutor.CallerRunsPolicy());
+        AtomicInteger total = new AtomicInteger();
+        AtomicInteger failed = new AtomicInteger();
+        String line;
+        while ((line = manifest.readLine()) != null) {
+            if (line.isEmpty()) {
+                continue;
+            }
+            String[] fields = line.split("\t", -1);
+            total.incrementAndGet();
+            executor.execute(() -> {
+                long start = System.nanoTime();
+                String input = fields[0];
+                String output = fields.length > 1 ? fields[1] : "";
+                try {
+                    if (output.isEmpty()) {
+                        throw new IllegalArgumentException("Manifest line has no output file");
+                    }
+                    modify(input, output, Arrays.copyOfRange(fields, 2, fields.length));
+                    out.println("RESULT\t" + input + "\t" + output + "\t0\t" + (System.nanoTime() - start) / 1000000);
+                } catch (Exception e) {
+                    failed.incrementAndGet();
+                    out.println("RESULT\t" + input + "\t" + output + "\t-1\t" + (System.nanoTime() - start) / 1000000
+                            + "\t" + String.valueOf(e.getMessage()).replace('\n', ' ').replace('\t', ' '));
+                }
+            });
+        }
+        executor.shutdown();
+        executor.awaitTermination(Long.MAX_VALUE, TimeUnit.DAYS);
+        out.println("DONE\t" + total.get() + "\t" + failed.get());
+        return failed.get();
+    }
+
+    /**
+     * Writes attributes read with readDatasetUntilPixelData, followed by the pixel data
+     * element and the rest of the input copied as-is in small buffers
+     *
+     * @param dis The input stream positioned after the pixel data element header
+     * @param attributes The attributes before the pixel data
+     * @param dos The output stream, using the transfer syntax of the input
+     */
+    public static void writeWithPixelData(DicomInputStream dis, Attributes attributes, DicomOutputStream dos)
+            throws IOException {
+        attributes.writeTo(dos);
+        if (dis.tag() == Tag.PixelData) {
+            dos.writeHeader(Tag.PixelData, dis.vr(), dis.length());
+            StreamUtils.copy(dis, dos);
+        }
+    }
+    
+    /**
+     * Applies tag modifications to a dataset in place
+     * 
+     * @param attributes The dataset to modify
+     * @param tagModifications Array of tag modifications (format: "00100010=NEWNAME")
+     */
+    public static void applyModifications(Attributes attributes, String[] tagModifications) {
+        for (String modification : tagModifications) {
+            String[] parts = modification.split("=", 2);
+            if (parts.length == 2) {
+                String tagStr = parts[0];
+                String value = parts[1];
+                
+                // Parse tag to integer value (assuming format like 00100010)
+                int tag = Integer.parseInt(tagStr, 16);
+                
+                // Get VR for the tag from the existing attributes if possible
+                VR vr = attributes.getVR(tag);
+                if (vr == null) {
+                    // Handle special cases for different types of tags
+                    if (tag == Tag.PatientName) {
+                        vr = VR.PN;  // Person Name
+                    } else if (tag == Tag.StudyInstanceUID || tag == Tag.SeriesInstanceUID || 
+                              tag == Tag.SOPInstanceUID || tagStr.endsWith("UID")) {
+                        vr = VR.UI;  // UID type
+                    } else {
+                        vr = VR.LO;  // Default to Long String
+                    }
+                }
+                
+                // Set the new value
+                attributes.setString(tag, vr, value);
+                if (verbose) {
+                    System.out.println("Modified tag " + tagStr + " to: " + value);
+                }
+            }
+        }
+    }
     
     /**
      * Main method to run the DICOM modifier from command line
      */
-    public static void main(String[] args) {
+    public static void main(String[] args) throws Exception {
+        if (args.length >= 2 && "--manifest".equals(args[0])) {
+            int threads = DEFAULT_THREADS;
+            if (args.length >= 4 && "--threads".equals(args[2])) {
+                threads = Math.max(1, Integer.parseInt(args[3]));
+            }
+            // Keep stdout for the RESULT lines
+            PrintStream protocol = new PrintStream(System.out, true, "UTF-8");
+            System.setOut(System.err);
+            verbose = false;
+            InputStream in = "-".equals(args[1]) ? System.in : new FileInputStream(args[1]);
+            try (BufferedReader manifest = new BufferedReader(new InputStreamReader(in, StandardCharsets.UTF_8))) {
+                int failed = modifyManifest(manifest, threads, protocol);
+                System.exit(failed == 0 ? 0 : 1);
+            }
+        }
         if (args.length < 2) {
             System.err.println("Usage: java DicomModifier <input-file> <output-file> [tag=value] [tag=value] ...");
+            System.err.println("       java DicomModifier --manifest <manifest-file|-> [--threads n]");
             System.exit(1);
         }
         
@@ -0,0 +1,249 @@
+import org.dcm4che3.data.Attributes;
+import org.dcm4che3.data.Tag;
+import org.dcm4che3.data.UID;
+import org.dcm4che3.io.DicomInputStream;
+import org.dcm4che3.io.DicomOutputStream;
+import org.dcm4che3.net.ApplicationEntity;
+import org.dcm4che3.net.Association;
+import org.dcm4che3.net.Connection;
+import org.dcm4che3.net.DataWriter;
+import org.dcm4che3.net.DataWriterAdapter;
+import org.dcm4che3.net.Device;
+import org.dcm4che3.net.DimseRSP;
+import org.dcm4che3.net.InputStreamDataWriter;
+import org.dcm4che3.net.Priority;
+import org.dcm4che3.net.pdu.AAssociateRQ;
+import org.dcm4che3.net.pdu.PresentationContext;
+
+import java.io.BufferedReader;
+import java.io.File;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.nio.charset.StandardCharsets;
+import java.util.Arrays;
+import java.util.LinkedHashMap;
+import java.util.Map;
+import java.util.concurrent.ExecutorService;
+import java.util.concurrent.Executors;
+import java.util.concurrent.ScheduledExecutorService;
+
+/**
+ * A resident helper process that keeps the dcm4che classes loaded and executes
+ * send, echo and modify commands read line by line from stdin.
+ *
+ * Requests are tab-separated lines:
+ *   ECHO    calledAET host port
+ *   SEND    calledAET host port tagCount [tag=value ...] file [file ...]
+ *   MODIFY  inputFile outputFile [tag=value ...]
+ *   QUIT
+ *
+ * Every request is answered with zero or more "RESULT" lines followed by a
+ * single "DONE" or "ERROR" line on stdout. Log output goes to stderr.
+ */
+public class DicomSendDaemon {
+
+    private static final String CALLING_AET = "DICOM_SENDER";
+
+    private final PrintStream out;
+    private final Device device = new Device("dicom-send-daemon");
+    private final ApplicationEntity ae = new ApplicationEntity(CALLING_AET);
+    private final Connection conn = new Connection();
+    private final ExecutorService executor = Executors.newCachedThreadPool();
+    private final ScheduledExecutorService scheduledExecutor = Executors.newSingleThreadScheduledExecutor();
+
+    public DicomSendDaemon(PrintStream out) {
+        this.out = out;
+        device.addConnection(conn);
+        device.addApplicationEntity(ae);
+        ae.addConnection(conn);
+        device.setExecutor(executor);
+        device.setScheduledExecutor(scheduledExecutor);
+    }
+
+    /**
+     * Writes one protocol line. Tabs and line breaks inside a field, as in exception
+     * messages or error comments, are replaced with spaces so they cannot split the line.
+     */
+    private void reply(String... fields) {
+        StringBuilder line = new StringBuilder();
+        for (int i = 0; i < fields.length; i++) {
+            if (i > 0) {
+                line.append('\t');
+            }
+            if (fields[i] != null) {
+                line.append(fields[i].replace('\t', ' ').replace('\r', ' ').replace('\n', ' '));
+            }
+        }
+        out.println(line);
+    }
+
+    /**
+     * Opens an association to the remote AE proposing the given presentation contexts
+     */
+    private Association connect(String calledAET, String host, int port, Map<String, String[]> contexts)
+            throws Exception {
+        Connection remote = new Connection();
+        remote.setHostname(host);
+        remote.setPort(port);
+
+        AAssociateRQ rq = new AAssociateRQ();
+        rq.setCallingAET(CALLING_AET);
+        rq.setCalledAET(calledAET);
+        int pcid = 1;
+        for (String[] context : contexts.values()) {
+            rq.addPresentationContext(new PresentationContext(pcid, context[0], context[1]));
+            pcid += 2;
+        }
+        return ae.connect(conn, remote, rq);
+    }
+
+    /**
+     * Handles ECHO: sends a C-ECHO and reports association time and round trip time
+     */
+    private void echo(String[] fields) throws Exception {
+        Map<String, String[]> contexts = new LinkedHashMap<>();
+        contexts.put(UID.Verification, new String[] { UID.Verification, UID.ImplicitVRLittleEndian });
+
+        long start = System.nanoTime();
+        Association as = connect(fields[1], fields[2], Integer.parseInt(fields[3]), contexts);
+        long connected = System.nanoTime();
+        try {
+            DimseRSP rsp = as.cecho();
+            rsp.next();
+            long done = System.nanoTime();
+            int status = rsp.getCommand().getInt(Tag.Status, -1);
+            reply("RESULT", "echo", Integer.toHexString(status),
+                    String.valueOf((connected - start) / 1000000), String.valueOf((done - connected) / 1000000));
+        } finally {
+            as.release();
+            as.waitForSocketClose();
+        }
+        reply("DONE", "1");
+    }
+
+    /**
+     * Handles SEND: stores all files over a single association, one RESULT line per file
+     */
+    private void send(String[] fields) throws Exception {
+        int tagCount = Integer.parseInt(fields[4]);
+        String[] tags = Arrays.copyOfRange(fields, 5, 5 + tagCount);
+        String[] files = Arrays.copyOfRange(fields, 5 + tagCount, fields.length);
+
+        // Read the file meta information of every file to build the presentation contexts
+        Map<String, String[]> contexts = new LinkedHashMap<>();
+        String[][] fileInfo = new String[files.length][];
+        for (int i = 0; i < files.length; i++) {
+            try (DicomInputStream in = new DicomInputStream(new File(files[i]))) {
+                Attributes fmi = in.readFileMetaInformation();
+                if (fmi == null) {
+                    continue;
+                }
+                String cuid = fmi.getString(Tag.MediaStorageSOPClassUID);
+                String tsuid = fmi.getString(Tag.TransferSyntaxUID);
+                fileInfo[i] = new String[] { cuid, fmi.getString(Tag.MediaStorageSOPInstanceUID), tsuid };
+                contexts.put(cuid + "|" + tsuid, new String[] { cuid, tsuid });
+            } catch (Exception e) {
+                fileInfo[i] = null;
+            }
+        }
+
+        Association as = connect(fields[1], fields[2], Integer.parseInt(fields[3]), contexts);
+        try {
+            for (int i = 0; i < files.length; i++) {
+                if (fileInfo[i] == null) {
+                    reply("RESULT", files[i], "-1", "", "Not a DICOM Part 10 file");
+                    continue;
+                }
+                storeFile(as, files[i], fileInfo[i], tags);
+            }
+        } finally {
+            as.release();
+            as.waitForSocketClose();
+        }
+        reply("DONE", String.valueOf(files.length));
+    }
+
+    /**
+     * Sends one file with C-STORE, applying tag modifications in memory when requested
+     */
+    private void storeFile(Association as, String file, String[] info, String[] tags) {
+        String iuid = info[1];
+        try (DicomInputStream in = new DicomInputStream(new File(file))) {
+            in.readFileMetaInformation();
+            DataWriter writer;
+            if (tags.length > 0 && UID.DeflatedExplicitVRLittleEndian.equals(info[2])) {
+                Attributes data = in.readDataset();
+                DicomModifier.applyModifications(data, tags);
+                iuid = data.getString(Tag.SOPInstanceUID, iuid);
+                writer = new DataWriterAdapter(data);
+            } else if (tags.length > 0) {
+                // Parse up to the pixel data only and stream the pixel data from the file
+                Attributes data = in.readDatasetUntilPixelData();
+                DicomModifier.applyModifications(data, tags);
+                iuid = data.getString(Tag.SOPInstanceUID, iuid);
+                writer = (out, tsuid) -> {
+                    DicomOutputStream dos = new DicomOutputStream(out, tsuid);
+                    DicomModifier.writeWithPixelData(in, data, dos);
+                    dos.finish();
+                };
+            } else {
+                writer = new InputStreamDataWriter(in);
+            }
+            DimseRSP rsp = as.cstore(info[0], iuid, Priority.NORMAL, writer, info[2]);
+            rsp.next();
+            int status = rsp.getCommand().getInt(Tag.Status, -1);
+            String error = rsp.getCommand().getString(Tag.ErrorComment, "");
+            reply("RESULT", file, Integer.toHexString(status), iuid, error);
+        } catch (Exception e) {
+            reply("RESULT", file, "-1", iuid, e.getMessage() != null ? e.getMessage() : e.toString());
+        }
+    }
+
+    /**
+     * Handles MODIFY using the same code path as the DicomModifier command line tool
+     */
+    private void modify(String[] fields) {
+        String[] modifications = Arrays.copyOfRange(fields, 3, fields.length);
+        boolean success = DicomModifier.modifyDicom(fields[1], fields[2], modifications);
+        reply("RESULT", fields[1], success ? "0" : "-1", "", fields[2]);
+        reply("DONE", "1");
+    }
+
+    /**
+     * Reads requests from stdin until QUIT or end of input
+     */
+    public void run() throws Exception {
+        BufferedReader reader = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        reply("READY");
+        String line;
+        while ((line = reader.readLine()) != null) {
+            String[] fields = line.split("\t", -1);
+            try {
+                if ("QUIT".equals(fields[0])) {
+                    break;
+                } else if ("ECHO".equals(fields[0])) {
+                    echo(fields);
+                } else if ("SEND".equals(fields[0])) {
+                    send(fields);
+                } else if ("MODIFY".equals(fields[0])) {
+                    modify(fields);
+                } else {
+                    reply("ERROR", "Unknown command: " + fields[0]);
+                }
+            } catch (Exception e) {
+                reply("ERROR", String.valueOf(e.getMessage()));
+            }
+        }
+        executor.shutdown();
+        scheduledExecutor.shutdown();
+    }
+
+    /**
+     * Main method - keeps stdout for the protocol and sends all logging to stderr
+     */
+    public static void main(String[] args) throws Exception {
+        PrintStream protocol = new PrintStream(System.out, true, "UTF-8");
+        System.setOut(System.err);
+        new DicomSendDaemon(protocol).run();
+    }
+}
@@ -4,6 +4,7 @@ setlocal
 REM Get the current directory 
 set JAVA_DIR=%~dp0
 set SOURCE_FILE=%JAVA_DIR%DicomModifier.java
+set DAEMON_SOURCE_FILE=%JAVA_DIR%DicomSendDaemon.java
 
 REM Get the lib directory from the environment or use a default
 set LIB_DIR=%JAVA_DIR%..\..\lib\dcm4che\lib
@@ -21,14 +22,14 @@ if not exist "%SOURCE_FILE%" (
 )
 
 REM Compile using wildcard classpath
-echo Building DicomModifier...
-javac -cp "%LIB_DIR%\*" "%SOURCE_FILE%"
+echo Building DicomModifier and DicomSendDaemon...
+javac -cp "%LIB_DIR%\*" "%SOURCE_FILE%" "%DAEMON_SOURCE_FILE%"
 
 if %ERRORLEVEL% NEQ 0 (
     echo Compilation failed.
     exit /b 1
 ) else (
-    echo Compilation successful. DicomModifier.class created.
+    echo Compilation successful. DicomModifier.class and DicomSendDaemon.class created.
 )
 
 exit /b 0 
\ No newline at end of file
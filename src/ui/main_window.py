@@ -8,6 +8,7 @@ import pydicom
 import os
 import logging
 import threading
+import time
 import tkinter as tk
 from tkinter import ttk
 from pathlib import Path
@@ -17,11 +18,18 @@ from src.utils.config import ConfigManager
 from src.utils.file_helpers import find_dicom_files_in_folder
 from src.dicom.dcm4che import (
     send_dicom_using_dcm4che, 
-    echo_dicom_using_dcm4che, 
     send_multiple_dicom_using_dcm4che,
-    send_dicom_using_dcm4che_alt,
-    send_multiple_dicom_using_dcm4che_alt
+    send_dicom_using_dcm4che_alt
 )
+from src.dicom.storescu_batch import DEFAULT_BATCH_SIZE
+from src.dicom.backends import get_send_backend
+from src.dicom.health import probe_destinations, LatencyHistory
+from src.dicom.concurrent_send import send_multiple_dicom_concurrently, get_max_associations
+from src.dicom.send_journal import open_send_journal, send_with_journal
+from src.dicom.grouping import sort_by_study
+from src.dicom.storescu_output import summarize_throughput, format_throughput
+from src.dicom.retry import with_retries, RetryPolicy
+from src.dicom.spool import get_spool
 
 
 class DicomSenderApp(ctk.CTk):
@@ -30,10 +38,14 @@ class DicomSenderApp(ctk.CTk):
 
         # Load configuration
         self.config_manager = ConfigManager()
+        self.echo_history = LatencyHistory()
+
+        # Set up the spool now, which removes intermediate files left by crashed runs
+        get_spool()
 
         # Configure window
         self.title("Alexamon DICOM Sender")
-        self.geometry("600x650")  # Increased height for tag modification UI
+        self.geometry("600x690")  # Increased height for tag modification UI
         
         # Configure grid
         self.grid_columnconfigure(1, weight=1)
@@ -83,6 +95,12 @@ class DicomSenderApp(ctk.CTk):
         self.folder_button = ctk.CTkButton(file_frame, text="Select DICOM Folder", command=self.select_folder)
         self.folder_button.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
 
+        # Resume: skip instances the destination already acknowledged according to the send journal
+        self.resume_var = tk.BooleanVar(value=self.config_manager.get_value("resume_sends", False))
+        self.resume_check = ctk.CTkCheckBox(file_frame, text="Skip files already sent to this server",
+                                            variable=self.resume_var, onvalue=True, offvalue=False)
+        self.resume_check.grid(row=1, column=0, columnspan=2, padx=5, pady=5, sticky="w")
+
         self.file_label = ctk.CTkLabel(self, text="No file selected")
         self.file_label.grid(row=6, column=0, columnspan=2, padx=10, pady=5)
 
@@ -182,11 +200,13 @@ class DicomSenderApp(ctk.CTk):
         logging.info("Alexamon DICOM Sender application started")
 
     def save_settings(self):
-        config = {
+        # Keep any other settings (e.g. send_batch_size) that are not edited in the UI
+        config = dict(self.config_manager.config)
+        config.update({
             "default_ip": self.ip_entry.get(),
             "default_port": self.port_entry.get(),
             "default_ae_title": self.ae_title_entry.get()
-        }
+        })
         
         if self.config_manager.save_config(config):
             self.status_label.configure(text="Settings saved as default!", text_color="green")
@@ -196,34 +216,45 @@ class DicomSenderApp(ctk.CTk):
             logging.error("Failed to save settings")
 
     def send_echo(self):
+        """Send a DICOM echo in a background thread so the window stays responsive"""
+        # Get connection parameters
+        ip = self.ip_entry.get()
+        port = self.port_entry.get()
+        ae_title = self.ae_title_entry.get()
+        logging.info(f"Attempting DICOM echo to {ip}:{port} with AE Title: {ae_title}")
+
+        # Update status
+        self.status_label.configure(text="Sending DICOM echo...", text_color="orange")
+        self.echo_button.configure(state="disabled")
+        backend = get_send_backend(self.config_manager)
+        threading.Thread(target=lambda: self.send_echo_thread(backend, ip, port, ae_title), daemon=True).start()
+
+    def send_echo_thread(self, backend, ip, port, ae_title):
+        """Thread function to send a DICOM echo and report the result on the UI thread"""
         try:
-            # Get connection parameters
-            ip = self.ip_entry.get()
-            port = self.port_entry.get()
-            ae_title = self.ae_title_entry.get()
-            logging.info(f"Attempting DICOM echo to {ip}:{port} with AE Title: {ae_title}")
+            # Run echo command using the configured backend
+            result = probe_destinations([(ip, port, ae_title)], backend)[0]
+            self.echo_history.add(result)
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+            logging.error(f"Exception occurred: {str(e)}", exc_info=True)
 
-            # Update status
-            self.status_label.configure(text="Sending DICOM echo...", text_color="orange")
-            
-            # Run echo command using dcm4che
-            result = echo_dicom_using_dcm4che(ip, port, ae_title)
-            
-            # Process result
-            if result.returncode == 0:
+        def update_ui():
+            self.echo_button.configure(state="normal")
+            if result["success"]:
                 success_msg = "DICOM echo successful!"
+                if result["echo_ms"] is not None:
+                    echo_stats = self.echo_history.summary(result["destination"])["echo_ms"]
+                    success_msg = (f"DICOM echo successful! ({result['association_ms']} ms association, "
+                                   f"{result['echo_ms']} ms echo, median {echo_stats['p50']} ms)")
                 self.status_label.configure(text=success_msg, text_color="green")
                 logging.info(success_msg)
-                logging.info(f"Echo output: {result.stdout}")
             else:
-                error_msg = f"DICOM echo failed: {result.stderr}"
+                error_msg = f"DICOM echo failed: {result['error']}"
                 self.status_label.configure(text="DICOM echo failed!", text_color="red")
                 logging.error(error_msg)
 
-        except Exception as e:
-            error_msg = f"Error: {str(e)}"
-            self.status_label.configure(text=error_msg, text_color="red")
-            logging.error(f"Exception occurred: {str(e)}", exc_info=True)
+        self.after(0, update_ui)
 
     def select_folder(self):
         """Handle folder selection to get all DICOM files from a directory"""
@@ -268,6 +299,7 @@ class DicomSenderApp(ctk.CTk):
         self.send_button.configure(state="disabled")
         
         # Send the files
+        start_time = time.time()
         results = send_multiple_dicom_using_dcm4che(
             self.dicom_files, 
             ip, 
@@ -276,6 +308,7 @@ class DicomSenderApp(ctk.CTk):
             self.update_progress,
             dicom_tags
         )
+        elapsed = time.time() - start_time
         
         # Count successes and failures
         successes = sum(1 for result in results.values() if result["success"])
@@ -285,6 +318,8 @@ class DicomSenderApp(ctk.CTk):
         status_text = f"Sent {successes}/{len(results)} files successfully"
         if failures > 0:
             status_text += f", {failures} failed"
+        if successes > 0:
+            status_text += f" ({format_throughput(summarize_throughput(results, elapsed))})"
         
         # Log results
         logging.info(status_text)
@@ -371,7 +406,8 @@ class DicomSenderApp(ctk.CTk):
         try:
             # Basic validation - verify it's a DICOM file
             try:
-                ds = pydicom.dcmread(self.file_path)
+                # Header only: validation must not load the pixel data of large objects
+                ds = pydicom.dcmread(self.file_path, stop_before_pixels=True)
                 logging.info(f"Reading DICOM file: {self.file_path}")
                 logging.info(f"File transfer syntax: {ds.file_meta.TransferSyntaxUID}")
                 
@@ -435,24 +471,45 @@ class DicomSenderApp(ctk.CTk):
         # Disable send button during sending
         self.send_button.configure(state="disabled")
         
-        # Send the files using the alternative implementation
-        results = send_multiple_dicom_using_dcm4che_alt(
-            self.dicom_files, 
-            ip, 
-            port, 
-            ae_title, 
-            self.update_progress,
-            dicom_tags
-        )
+        # Send the files using the configured backend over parallel associations,
+        # recording each acknowledged instance in the send journal
+        group_by_study = self.config_manager.get_value("group_by_study", True)
+        file_paths = sort_by_study(self.dicom_files) if group_by_study else self.dicom_files
+        journal = open_send_journal(self.config_manager)
+        start_time = time.time()
+        try:
+            results = send_with_journal(
+                with_retries(send_multiple_dicom_concurrently, RetryPolicy.from_config(self.config_manager)),
+                file_paths, 
+                ip, 
+                port, 
+                ae_title, 
+                journal,
+                resume=self.resume_var.get(),
+                progress_callback=self.update_progress,
+                dicom_tags=dicom_tags,
+                batch_size=self.config_manager.get_value("send_batch_size", DEFAULT_BATCH_SIZE),
+                max_associations=get_max_associations(self.config_manager, ip, port, ae_title),
+                backend=get_send_backend(self.config_manager),
+                group_by_study=group_by_study
+            )
+        finally:
+            journal.close()
+        elapsed = time.time() - start_time
         
         # Count successes and failures
-        successes = sum(1 for result in results.values() if result["success"])
-        failures = len(results) - successes
+        skipped = sum(1 for result in results.values() if result.get("skipped"))
+        successes = sum(1 for result in results.values() if result["success"]) - skipped
+        failures = len(results) - successes - skipped
         
         # Update status
-        status_text = f"Sent {successes}/{len(results)} files successfully"
+        status_text = f"Sent {successes}/{len(results) - skipped} files successfully"
+        if skipped > 0:
+            status_text += f", {skipped} already sent"
         if failures > 0:
             status_text += f", {failures} failed"
+        if successes > 0:
+            status_text += f" ({format_throughput(summarize_throughput(results, elapsed))})"
         
         # Log results
         logging.info(status_text)
@@ -460,7 +517,7 @@ class DicomSenderApp(ctk.CTk):
             if result["success"]:
                 logging.info(f"Successfully sent: {file_path}")
             else:
-                logging.error(f"Failed to send: {file_path}. Error: {result['error']}")
+                logging.error(f"Failed to send: {file_path} after {result.get('attempts', 1)} attempt(s). Error: {result['error']}")
         
         # Update UI in the main thread
         def update_ui():
@@ -0,0 +1,106 @@
+"""
+Command line options of the batch processor, and the settings derived from them
+"""
+import argparse
+from src.dicom.backends import DCM4CHE_BACKEND, DAEMON_BACKEND, NATIVE_BACKEND
+from src.dicom.retry import RetryPolicy
+from src.dicom.health import parse_destination
+
+def build_batch_parser():
+    """Build the argument parser of the batch processor"""
+    parser = argparse.ArgumentParser(description="Batch process DICOM files")
+
+    # Input options
+    input_group = parser.add_mutually_exclusive_group(required=True)
+    input_group.add_argument("--folder", help="Process all DICOM files in the specified folder")
+    input_group.add_argument("--file", help="Process a single DICOM file")
+
+    # Operation options
+    operation_group = parser.add_mutually_exclusive_group(required=True)
+    operation_group.add_argument("--anonymize", action="store_true", help="Anonymize DICOM files")
+    operation_group.add_argument("--send", action="store_true", help="Send DICOM files to a server")
+    operation_group.add_argument("--modify-and-send", action="store_true", help="Modify tags and send DICOM files")
+
+    # Server arguments (required for send and modify-and-send)
+    server_group = parser.add_argument_group("Server options (required for --send and --modify-and-send)")
+    server_group.add_argument("--ip", help="DICOM server IP address")
+    server_group.add_argument("--port", help="DICOM server port")
+    server_group.add_argument("--ae-title", help="DICOM AE Title")
+    server_group.add_argument("--dest", action="append", default=[],
+                              help="Additional destination as AE@host:port; repeat to send to several destinations in one pass")
+
+    # Anonymization options
+    anonymize_group = parser.add_argument_group("Anonymization options")
+    anonymize_group.add_argument("--output-dir", help="Directory to save anonymized files")
+    anonymize_group.add_argument("--randomize", action="store_true", help="Use random values instead of fixed 'ANONYMOUS' values")
+
+    # Tag modification options
+    modify_group = parser.add_argument_group("Tag modification options")
+    modify_group.add_argument("--tag", action="append", help="Tag to modify in format TagNumber=Value (e.g., '00100020=ANONYMOUS')", default=[])
+
+    # Other options
+    parser.add_argument("--workers", type=int, default=4, help="Number of worker threads (default: 4)")
+    send_mode_group = parser.add_mutually_exclusive_group()
+    send_mode_group.add_argument("--daemon", action="store_true", help="Send through the resident send daemon instead of one JVM per file")
+    send_mode_group.add_argument("--native", action="store_true", help="Send with the native backend, reusing pooled associations between files")
+    parser.add_argument("--resume", action="store_true", help="Skip files the destination already acknowledged according to the send journal")
+    parser.add_argument("--no-journal", action="store_true", help="Do not record sends in the send journal")
+    parser.add_argument("--group-by-study", action="store_true", help="Send files study by study, in series and Instance Number order")
+    parser.add_argument("--failure-log", help="Write the full StoreSCU output of failed files to this file instead of keeping it in memory")
+    parser.add_argument("--retries", type=int, help="Maximum send attempts per file for transient failures (default: retry_max_attempts from config)")
+    return parser
+
+def parse_tag_options(tag_specs):
+    """
+    Build the tag modifications dictionary from --tag options.
+
+    Parameters:
+    - tag_specs: Strings in the format TagNumber=Value; specs without "=" are ignored
+
+    Returns:
+    - Dictionary of DICOM tags to modify, e.g. {"00100020": "ANONYMOUS"}
+    """
+    dicom_tags = {}
+    for tag_spec in tag_specs:
+        parts = tag_spec.split('=', 1)
+        if len(parts) == 2:
+            tag, value = parts
+            # Convert tag format from 0010,0020 to 00100020 if needed
+            dicom_tags[tag.replace(',', '')] = value
+    return dicom_tags
+
+def check_send_options(args):
+    """
+    Check the options a send needs.
+
+    Returns:
+    - None if the options are complete, otherwise an error message
+    """
+    if not args.dest and not (args.ip and args.port and args.ae_title):
+        return "--ip, --port, and --ae-title are required for sending DICOM files"
+    if args.modify_and_send and not args.tag:
+        return "At least one --tag is required for modify-and-send operation"
+    return None
+
+def send_backend_from_options(args):
+    """The send backend selected by --daemon or --native, dcm4che otherwise"""
+    return DAEMON_BACKEND if args.daemon else NATIVE_BACKEND if args.native else DCM4CHE_BACKEND
+
+def retry_policy_from_options(args, config_manager):
+    """The configured retry policy, with at most --retries attempts per file when given"""
+    retry_policy = RetryPolicy.from_config(config_manager)
+    if args.retries is not None:
+        retry_policy.max_attempts = max(1, args.retries)
+    return retry_policy
+
+def destinations_from_options(args):
+    """
+    The fan-out destinations: the --ip, --port and --ae-title server, if given, then each --dest.
+
+    Raises:
+    - ValueError: If a --dest is not in the format AE@host:port
+    """
+    destinations = [parse_destination(dest) for dest in args.dest]
+    if args.ip and args.port and args.ae_title:
+        destinations.insert(0, (args.ip, int(args.port), args.ae_title))
+    return destinations
@@ -13,20 +13,61 @@ class ConfigManager:
         self.default_config = {
             "default_ip": "127.0.0.1",
             "default_port": "11112",
-            "default_ae_title": "STORE_SCP"
+            "default_ae_title": "STORE_SCP",
+            "send_batch_size": 100,
+            "send_backend": "dcm4che",
+            "send_daemon_helpers": 4,
+            "max_associations": 4,
+            "destination_max_associations": {},
+            "association_idle_timeout": 60,
+            "context_cache_ttl": 86400,
+            "health_check_destinations": [],
+            "health_check_interval": 60,
+            "send_journal_path": "",
+            "resume_sends": False,
+            "retry_max_attempts": 4,
+            "retry_base_delay": 2.0,
+            "retry_max_delay": 60.0,
+            "group_by_study": True,
+            "wan_compression": "",
+            "destination_wan_compression": {},
+            "compression_workers": 2,
+            "compression_backend": "dcm4che",
+            "use_cds": True,
+            "jvm_flags": ["-XX:TieredStopAtLevel=1", "-XX:+UseSerialGC", "-XX:-UsePerfData", "-Xshare:auto"],
+            "jvm_max_heap": "512m",
+            "jvm_tool_max_heap": {},
+            "prefetch_files": 200,
+            "prefetch_budget_mb": 256,
+            "large_object_threshold_mb": 64,
+            "destination_transport": {},
+            "transport_auto_tune": False,
+            "modifier_threads": 4,
+            "tag_modifier_backend": "auto",
+            "spool_dir": "",
+            "spool_budget_mb": 512
         }
         self.config = self.load_config()
     
-    def load_config(self):
-        """Load configuration from file or create default if not found"""
-        # First try to find the config file in the project root
-        possible_paths = [
+    def _possible_paths(self):
+        """Locations searched for config.json, in order"""
+        return [
             'config.json',  # Current directory
             os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'config.json'),  # Project root if running from src
             os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'config.json')  # Src directory
         ]
-        
-        for config_path in possible_paths:
+    
+    def get_config_path(self):
+        """Get the path of the existing config file, or the project root path if there is none"""
+        for path in self._possible_paths():
+            if os.path.exists(path):
+                return path
+        return os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'config.json')
+    
+    def load_config(self):
+        """Load configuration from file or create default if not found"""
+        # First try to find the config file in the project root
+        for config_path in self._possible_paths():
             try:
                 if os.path.exists(config_path):
                     with open(config_path, 'r') as f:
@@ -54,22 +95,7 @@ class ConfigManager:
 
     def save_config(self, config):
         """Save configuration to the file"""
-        # Try to find the existing config file
-        possible_paths = [
-            'config.json',  # Current directory
-            os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'config.json'),  # Project root if running from src
-            os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'config.json')  # Src directory
-        ]
-        
-        config_path = None
-        for path in possible_paths:
-            if os.path.exists(path):
-                config_path = path
-                break
-        
-        # If not found, save to project root
-        if config_path is None:
-            config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'config.json')
+        config_path = self.get_config_path()
         
         try:
             with open(config_path, 'w') as f:
@@ -92,4 +118,89 @@ class ConfigManager:
     
     def get_value(self, key, default=None):
         """Get a configuration value by key"""
-        return self.config.get(key, default) 
\ No newline at end of file
+        return self.config.get(key, default)
+    
+    def get_context_cache_path(self):
+        """Get the path of the presentation context cache, stored beside config.json"""
+        return os.path.join(os.path.dirname(self.get_config_path()), 'presentation_contexts.json')
+    
+    def get_send_journal_path(self):
+        """Get the path of the send journal database, beside config.json unless configured"""
+        return self.get_value("send_journal_path") or os.path.join(
+            os.path.dirname(self.get_config_path()), 'send_journal.db'
+        )
+    
+    def load_context_cache(self):
+        """Load the presentation context cache, returning an empty cache if there is none"""
+        cache_path = self.get_context_cache_path()
+        if not os.path.exists(cache_path):
+            return {}
+        try:
+            with open(cache_path, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            logging.warning(f"Error reading presentation context cache from {cache_path}: {str(e)}")
+            return {}
+    
+    def save_context_cache(self, cache):
+        """Save the presentation context cache"""
+        cache_path = self.get_context_cache_path()
+        try:
+            temp_path = f"{cache_path}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(cache, f, indent=4)
+            os.replace(temp_path, cache_path)
+            return True
+        except Exception as e:
+            logging.error(f"Error saving presentation context cache: {str(e)}")
+            return False
+    
+    def clear_context_cache(self, destination=None):
+        """
+        Clear the presentation context cache for one destination, or entirely
+        
+        Returns:
+            int: Number of destinations cleared
+        """
+        cache = self.load_context_cache()
+        if destination is None:
+            cleared = len(cache)
+            cache = {}
+        else:
+            cleared = 1 if cache.pop(destination, None) is not None else 0
+        self.save_context_cache(cache)
+        logging.info(f"Cleared presentation context cache for {cleared} destination(s)")
+        return cleared
+
+    def get_transport_tuning_path(self):
+        """Get the path of the auto-tuned transport settings, stored beside config.json"""
+        return os.path.join(os.path.dirname(self.get_config_path()), 'transport_tuning.json')
+    
+    def load_transport_tuning(self):
+        """Load the auto-tuned transport settings, returning an empty dictionary if there are none"""
+        tuning_path = self.get_transport_tuning_path()
+        if not os.path.exists(tuning_path):
+            return {}
+        try:
+            with open(tuning_path, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            logging.warning(f"Error reading transport tuning from {tuning_path}: {str(e)}")
+            return {}
+    
+    def save_transport_tuning(self, tuning):
+        """Save the auto-tuned transport settings"""
+        tuning_path = self.get_transport_tuning_path()
+        try:
+            temp_path = f"{tuning_path}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(tuning, f, indent=4)
+            os.replace(temp_path, tuning_path)
+            return True
+        except Exception as e:
+            logging.error(f"Error saving transport tuning: {str(e)}")
+            return False
+
+def destination_key(host, port, ae_title):
+    """Key identifying a destination in config and in per-destination caches"""
+    return f"{ae_title}@{host}:{port}"
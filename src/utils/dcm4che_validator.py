@@ -3,6 +3,7 @@ import logging
 import subprocess
 from pathlib import Path
 from src.utils.file_helpers import get_lib_dir
+from src.dicom.dicom_modifier import is_dicom_modifier_current
 
 def validate_dcm4che_setup():
     """
@@ -105,8 +106,9 @@ def check_build_dicom_modifier():
     if not os.path.exists(source_file):
         return "\nWarning: DicomModifier.java source file not found!\n"
     
-    # If the class file exists and is newer than the source file, no need to rebuild
-    if os.path.exists(class_file) and os.path.getmtime(class_file) > os.path.getmtime(source_file):
+    # If the class file is newer than the source file and has the manifest mode, no need to rebuild
+    if (os.path.exists(class_file) and os.path.getmtime(class_file) > os.path.getmtime(source_file)
+            and is_dicom_modifier_current(java_dir)):
         return "\nDicomModifier utility is already built.\n"
     
     # Otherwise, build the utility
@@ -3,6 +3,7 @@ File and path helper utilities for the Alexamon DICOM Sender
 """
 
 import os
+import shutil
 import logging
 import datetime
 import glob
@@ -69,4 +70,21 @@ def find_dicom_files_in_folder(folder_path):
                 # Not a DICOM file, skip
                 pass
     
-    return dicom_files 
\ No newline at end of file
+    return dicom_files 
+
+def link_or_copy(source_path, target_path):
+    """
+    Make a file available under another name without copying its data when possible
+
+    A hard link is used when source and target are on the same file system;
+    otherwise the file is copied (with sendfile/copy_file_range where the
+    platform supports it).
+
+    Args:
+        source_path: Existing file
+        target_path: New path, which must not exist yet
+    """
+    try:
+        os.link(source_path, target_path)
+    except OSError:
+        shutil.copy2(source_path, target_path)
@@ -0,0 +1,87 @@
+"""
+Start the bundled dcm4che storescp or the Python loopback SCP as a local stand-in PACS for testing and benchmarks
+"""
+
+import os
+import sys
+import time
+import socket
+import logging
+import subprocess
+
+def get_dcm4che_bin_dir():
+    """Get the path to the bin directory of the bundled dcm4che distribution"""
+    root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+    return os.path.join(root_dir, "dcm4che", "dcm4che-5.33.1", "bin")
+
+def wait_for_port(host, port, timeout=30):
+    """Wait until a TCP port accepts connections, returning True if it did within the timeout"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection((host, int(port)), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+def start_storescp(port, ae_title="STORESCP", directory=None, timeout=30):
+    """
+    Start dcm4che storescp listening on localhost.
+
+    Parameters:
+    - port: Port to listen on
+    - ae_title: AE title of the SCP
+    - directory: Where received objects are stored (the working directory if None)
+    - timeout: Seconds to wait for the listener to come up
+
+    Returns:
+    - subprocess.Popen of the running storescp
+
+    Raises:
+    - RuntimeError if storescp does not start listening in time
+    """
+    script = "storescp.bat" if sys.platform.startswith("win") else "storescp"
+    cmd = [os.path.join(get_dcm4che_bin_dir(), script), "-b", f"{ae_title}:{port}", "--accept-unknown"]
+    if directory:
+        cmd.extend(["--directory", directory])
+
+    logging.info(f"Starting local storescp: {' '.join(cmd)}")
+    process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                               shell=sys.platform.startswith("win"))
+    if not wait_for_port("127.0.0.1", port, timeout):
+        stop_storescp(process)
+        raise RuntimeError(f"storescp did not start listening on port {port} within {timeout} seconds")
+    return process
+
+def start_python_scp(port, ae_title="STORESCP", timeout=30):
+    """
+    Start the Python loopback SCP (src.dicom.native.scp) in its own process.
+
+    It accepts every presentation context and discards what it receives, so it
+    needs no Java and does not write to disk.
+
+    Returns:
+    - subprocess.Popen of the running SCP, to be stopped with stop_storescp
+
+    Raises:
+    - RuntimeError if the SCP does not start listening in time
+    """
+    root_dir = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+    cmd = [sys.executable, "-m", "src.dicom.native.scp", "--port", str(port), "--ae-title", ae_title]
+
+    logging.info(f"Starting local Python SCP: {' '.join(cmd)}")
+    process = subprocess.Popen(cmd, cwd=root_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if not wait_for_port("127.0.0.1", port, timeout):
+        stop_storescp(process)
+        raise RuntimeError(f"Python SCP did not start listening on port {port} within {timeout} seconds")
+    return process
+
+def stop_storescp(process):
+    """Stop an SCP process started with start_storescp or start_python_scp"""
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()